@@ -0,0 +1,214 @@
+"""Server-side target-price alerts
+
+After each ingestion run the engine evaluates the price changes against all
+active users in one pass. Users are registered in every grid cell their search
+circle overlaps, and per cell their ``target_price`` thresholds are kept
+sorted. A price drop from ``old`` to ``new`` can only cross targets in
+``[new, old)``, so each change is a bisect into one cell plus an exact distance
+check for the few users in that range. Cost scales with price changes, not
+users x stations.
+
+Alerts are de-duplicated per (user, station) with a cooldown and handed to
+pluggable sinks (log, in-memory queue, web-push stub).
+"""
+import logging
+import math
+import os
+import time
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .geo import haversine_km, bounding_box
+from .station_store import display_price
+
+logger = logging.getLogger(__name__)
+
+ALERT_COOLDOWN = float(os.getenv("ALERT_COOLDOWN", "3600"))  # seconds per user and station
+ALERT_SINKS = os.getenv("ALERT_SINKS", "log,queue")
+
+_CELL_DEG = 0.1
+
+# --- Sinks ---
+
+class LogSink:
+    """Writes alerts to the log"""
+
+    def emit(self, alert: dict):
+        logger.info("Price alert", extra={
+            "username": alert["username"], "station": alert["station_name"],
+            "price": round(alert["price"], 3), "target_price": round(alert["target_price"], 3),
+        })
+
+class QueueSink:
+    """Keeps the most recent alerts in memory (admin view, tests, consumers)"""
+
+    def __init__(self, maxlen: int = 500):
+        self.alerts = deque(maxlen=maxlen)
+
+    def emit(self, alert: dict):
+        self.alerts.append(alert)
+
+    def drain(self) -> List[dict]:
+        alerts = list(self.alerts)
+        self.alerts.clear()
+        return alerts
+
+class WebPushSink:
+    """Placeholder for Web Push delivery; no push subscriptions are stored yet"""
+
+    def __init__(self):
+        self.pending = 0
+
+    def emit(self, alert: dict):
+        self.pending += 1
+
+def sinks_from_config(config: str = ALERT_SINKS) -> list:
+    available = {"log": LogSink, "queue": QueueSink, "webpush": WebPushSink}
+    return [available[name.strip()]() for name in config.split(",") if name.strip() in available]
+
+# --- Engine ---
+
+class _Watcher:
+    __slots__ = ("user_id", "username", "lat", "lng", "radius", "target_price")
+
+    def __init__(self, user_id, username, lat, lng, radius, target_price):
+        self.user_id = user_id
+        self.username = username
+        self.lat = lat
+        self.lng = lng
+        self.radius = radius
+        self.target_price = target_price
+
+def _cell(lat: float, lng: float) -> Tuple[int, int]:
+    return math.floor(lat / _CELL_DEG), math.floor(lng / _CELL_DEG)
+
+class AlertEngine:
+    def __init__(self, sinks: Optional[list] = None, cooldown: float = ALERT_COOLDOWN):
+        self.sinks = sinks if sinks is not None else sinks_from_config()
+        self.cooldown = cooldown
+        # cell -> (sorted targets, watchers in the same order)
+        self._cells: Dict[Tuple[int, int], Tuple[List[float], List[_Watcher]]] = {}
+        self._last_sent: Dict[Tuple[int, str], Tuple[float, float]] = {}
+        self.users = 0
+        self.evaluations = 0
+        self.changes_evaluated = 0
+        self.candidates_checked = 0
+        self.alerts_sent = 0
+        self.suppressed = 0
+
+    def rebuild(self, db: Session):
+        """Index all active users with a location and a target price"""
+        rows = db.query(
+            models.User.id, models.User.username, models.UserSettings.latitude,
+            models.UserSettings.longitude, models.UserSettings.radius, models.UserSettings.target_price
+        ).join(models.UserSettings, models.UserSettings.user_id == models.User.id).filter(
+            models.UserSettings.is_active == True,
+            models.UserSettings.target_price != None,
+            models.UserSettings.latitude != None,
+            models.UserSettings.longitude != None
+        ).all()
+
+        cells: Dict[Tuple[int, int], List[_Watcher]] = {}
+        for user_id, username, lat, lng, radius, target in rows:
+            watcher = _Watcher(user_id, username, lat, lng, min(radius or 5.0, 25.0), target)
+            min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, watcher.radius)
+            min_i, min_j = _cell(min_lat, min_lng)
+            max_i, max_j = _cell(max_lat, max_lng)
+            for i in range(min_i, max_i + 1):
+                for j in range(min_j, max_j + 1):
+                    cells.setdefault((i, j), []).append(watcher)
+
+        self._cells = {}
+        for key, watchers in cells.items():
+            watchers.sort(key=lambda w: w.target_price)
+            self._cells[key] = ([w.target_price for w in watchers], watchers)
+        self.users = len(rows)
+
+        # Forget cooldowns that have expired anyway
+        now = time.monotonic()
+        self._last_sent = {k: v for k, v in self._last_sent.items() if now - v[0] < self.cooldown}
+
+    def evaluate(self, changes: List[dict]) -> List[dict]:
+        """Emit alerts for every user whose target a price drop just crossed
+
+        Only a drop from a known price counts; first readings never alert. Per
+        user and pass only the cheapest crossing station is alerted.
+        """
+        self.evaluations += 1
+        now = time.monotonic()
+        best: Dict[int, dict] = {}
+        for change in changes:
+            self.changes_evaluated += 1
+            if not change.get("is_open", True) or change.get("lat") is None:
+                continue
+            new = display_price(change["new"])
+            old = display_price(change.get("old") or {})
+            # A first reading (or one after a gap without prices) has no baseline to cross from
+            if new is None or old is None or new >= old:
+                continue
+
+            entry = self._cells.get(_cell(change["lat"], change["lng"]))
+            if entry is None:
+                continue
+            targets, watchers = entry
+            # Crossed: new <= target < old
+            lo = bisect_left(targets, new)
+            hi = bisect_left(targets, old)
+            for watcher in watchers[lo:hi]:
+                self.candidates_checked += 1
+                if haversine_km(watcher.lat, watcher.lng, change["lat"], change["lng"]) > watcher.radius:
+                    continue
+                last_sent = self._last_sent.get((watcher.user_id, change["station_id"]))
+                if last_sent is not None and now - last_sent[0] < self.cooldown:
+                    self.suppressed += 1
+                    continue
+                current = best.get(watcher.user_id)
+                if current is None or new < current["price"]:
+                    best[watcher.user_id] = {
+                        "user_id": watcher.user_id,
+                        "username": watcher.username,
+                        "station_id": change["station_id"],
+                        "station_name": change.get("name"),
+                        "lat": change["lat"],
+                        "lng": change["lng"],
+                        "price": new,
+                        "previous_price": old,
+                        "target_price": watcher.target_price,
+                        "created_at": datetime.utcnow().isoformat(),
+                    }
+
+        for alert in best.values():
+            self._last_sent[(alert["user_id"], alert["station_id"])] = (now, alert["price"])
+            for sink in self.sinks:
+                try:
+                    sink.emit(alert)
+                except Exception:
+                    logger.exception("Alert sink failed", extra={"sink": type(sink).__name__})
+        self.alerts_sent += len(best)
+        return list(best.values())
+
+    def recent(self) -> List[dict]:
+        for sink in self.sinks:
+            if isinstance(sink, QueueSink):
+                return list(sink.alerts)
+        return []
+
+    def stats(self) -> dict:
+        return {
+            "users_indexed": self.users,
+            "cells": len(self._cells),
+            "evaluations": self.evaluations,
+            "changes_evaluated": self.changes_evaluated,
+            "candidates_checked": self.candidates_checked,
+            "alerts_sent": self.alerts_sent,
+            "suppressed_by_cooldown": self.suppressed,
+            "cooldown_seconds": self.cooldown,
+            "sinks": [type(sink).__name__ for sink in self.sinks],
+        }
+
+alert_engine = AlertEngine()
@@ -4,16 +4,21 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from . import models, database
+from .principal_cache import principal_cache
+import logging
 import os
 import secrets
 
+logger = logging.getLogger(__name__)
+
 # Generate a secure secret key if not set in environment
 # In production, set this via environment variable!
 SECRET_KEY = os.getenv("SECRET_KEY", secrets.token_urlsafe(32))
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 30  # 30 days for better UX
+STREAM_TICKET_EXPIRE_SECONDS = int(os.getenv("STREAM_TICKET_EXPIRE_SECONDS", "60"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -45,8 +50,26 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_stream_ticket(username: str) -> str:
+    """Short-lived token that only opens the price stream
+
+    EventSource cannot send an Authorization header, so the ticket travels in
+    the query string (and in access logs) instead of the 30-day bearer token.
+    """
+    now = datetime.utcnow()
+    return jwt.encode({"sub": username, "type": "stream", "iat": now,
+                       "exp": now + timedelta(seconds=STREAM_TICKET_EXPIRE_SECONDS)}, SECRET_KEY, algorithm=ALGORITHM)
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
     """Get the current authenticated user from token"""
+    return user_from_token(token, db)
+
+def user_from_stream_ticket(ticket: str, db: Session) -> models.User:
+    """Resolve a ticket from ``create_stream_ticket`` to its user"""
+    return user_from_token(ticket, db, token_type="stream")
+
+def user_from_token(token: str, db: Session, token_type: str = "access") -> models.User:
+    """Resolve a bearer token (or another ``token_type``) to its user"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -56,19 +79,27 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        token_type: str = payload.get("type")
         
-        if username is None or token_type != "access":
+        if username is None or payload.get("type") != token_type:
             raise credentials_exception
             
     except JWTError as e:
-        print(f"JWT Error: {e}")
+        logger.debug("Rejected token", extra={"error": str(e)})
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.username == username).first()
+    user = principal_cache.get(username)
+    if user is not None:
+        return user
+    
+    # Miss: user and settings in one query
+    version = principal_cache.version(username)
+    user = db.query(models.User).options(joinedload(models.User.settings)).filter(
+        models.User.username == username
+    ).first()
     if user is None:
         raise credentials_exception
     
+    principal_cache.put(user, version)
     return user
 
 async def get_current_admin(current_user: models.User = Depends(get_current_user)):
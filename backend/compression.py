@@ -0,0 +1,193 @@
+"""Response compression: brotli when the optional ``brotli`` package is installed, else gzip
+
+* ``CompressionMiddleware`` compresses JSON/text responses (including
+  streamed CSV/NDJSON exports) of at least ``COMPRESS_MIN_BYTES`` on the fly.
+  It passes through server-sent events (every event has to reach the client
+  right away), images, 304s and anything that already has a
+  Content-Encoding. The ETag of an encoded response (and of a 304 to a
+  client that negotiated an encoding) is made weak, because its bytes
+  differ from the identity response's.
+* ``PrecompressedStaticFiles`` compresses the frontend once, at the highest
+  levels, when the app starts. It then serves those bytes from memory. A
+  file that changed on disk since then is served normally, and the
+  middleware compresses it.
+"""
+import gzip
+import mimetypes
+import os
+import zlib
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+from .http_cache import weak
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))  # 11 is too slow per request
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/x-ndjson",
+                      "application/manifest+json", "application/xml", "image/svg+xml")
+
+def compressible(content_type: str) -> bool:
+    content_type = content_type.split(";")[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) and content_type != "text/event-stream"
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """``br`` (if available) or ``gzip``, whichever the client accepts first in that order"""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    for encoding in ("br", "gzip") if brotli else ("gzip",):
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+class Compressor:
+    """Incremental gzip/brotli stream"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip header
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+class CompressionMiddleware:
+    """Pure ASGI middleware, so streamed responses stay streamed"""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor: Optional[Compressor] = None
+
+        async def send_compressed(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                start = message  # held back until the first body chunk decides
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                initial, start = start, None
+                headers = MutableHeaders(raw=initial["headers"])
+                if initial["status"] == 304 and "etag" in headers:
+                    headers["ETag"] = weak(headers["etag"])
+                if (initial["status"] in (204, 304) or "content-encoding" in headers
+                        or "no-transform" in headers.get("cache-control", "")
+                        or not compressible(headers.get("content-type", ""))
+                        or (not more_body and len(body) < self.minimum_size)):
+                    await send(initial)
+                    await send(message)
+                    return
+                compressor = Compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                if "etag" in headers:
+                    headers["ETag"] = weak(headers["etag"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body:
+                    data = compressor.compress(body) + compressor.finish()
+                    headers["Content-Length"] = str(len(data))
+                    await send(initial)
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                del headers["Content-Length"]
+                await send(initial)
+
+            if compressor is None:
+                await send(message)
+                return
+            data = compressor.compress(body)
+            if not more_body:
+                data += compressor.finish()
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles serving in-memory gzip/brotli variants built at startup"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # real path -> (mtime_ns, size, {encoding: bytes})
+        self._variants: Dict[str, Tuple[int, int, Dict[str, bytes]]] = {}
+        self.precompress()
+
+    def precompress(self):
+        self._variants.clear()
+        if self.directory is None:
+            return
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.realpath(os.path.join(root, name))
+                content_type = mimetypes.guess_type(path)[0] or ""
+                stat = os.stat(path)
+                if not compressible(content_type) or stat.st_size < COMPRESS_MIN_BYTES:
+                    continue
+                with open(path, "rb") as f:
+                    data = f.read()
+                variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+                if brotli:
+                    variants["br"] = brotli.compress(data, quality=11)
+                self._variants[path] = (stat.st_mtime_ns, stat.st_size, {
+                    encoding: body for encoding, body in variants.items() if len(body) < len(data)
+                })
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        if not isinstance(response, FileResponse) or response.status_code != 200:
+            return response
+        cached = self._variants.get(os.path.realpath(response.path))
+        stat = response.stat_result
+        if cached is None or stat is None or (stat.st_mtime_ns, stat.st_size) != cached[:2]:
+            return response
+        response.headers.add_vary_header("Accept-Encoding")
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding not in cached[2]:
+            return response
+        headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+        headers["Content-Encoding"] = encoding
+        if "etag" in headers:
+            headers["etag"] = weak(headers["etag"])
+        return Response(content=cached[2][encoding], headers=headers)
@@ -0,0 +1,170 @@
+"""Kilometers driven and consumption of fuel logs
+
+A log's ``kilometers_driven`` is its odometer minus the odometer of the
+previous log (by date, then id) that has one; ``consumption`` is its liters
+per 100 km over that distance.
+
+Inserting, editing or deleting a log only changes the log itself and the next
+log with an odometer after its old and new position. ``after_insert``,
+``after_update`` and ``after_delete`` recompute exactly those rows and move
+their statistics rollups in the caller's transaction; each neighbour is one
+lookup on the partial index ``ix_fuel_logs_user_odometer``. ``rebuild``
+recomputes a whole history:
+
+    python -m backend.consumption rebuild [--user USERNAME]
+"""
+import argparse
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from . import models, fuel_stats
+
+UPDATE_BATCH_SIZE = 1000
+
+_SNAPSHOT_FIELDS = ("id", "user_id", "date", "fuel_type", "liters", "total_price", "price_per_liter",
+                    "odometer", "kilometers_driven", "consumption")
+
+def has_odometer(odometer: Optional[float]) -> bool:
+    return odometer is not None and odometer > 0
+
+def derive(liters: Optional[float], odometer: Optional[float], previous_odometer: Optional[float]):
+    """(kilometers_driven, consumption) of one log given the previous odometer"""
+    if not has_odometer(odometer) or not has_odometer(previous_odometer):
+        return None, None
+    kilometers_driven = odometer - previous_odometer
+    consumption = (liters / kilometers_driven) * 100 if kilometers_driven > 0 else None
+    return kilometers_driven, consumption
+
+def snapshot(log) -> SimpleNamespace:
+    """Detached copy of a log's values (for stats deltas and old positions)"""
+    return SimpleNamespace(**{field: getattr(log, field) for field in _SNAPSHOT_FIELDS})
+
+# --- Neighbour lookups ---
+
+def _with_odometer(db: Session, user_id: int):
+    return db.query(models.FuelLog).filter(
+        models.FuelLog.user_id == user_id,
+        models.FuelLog.odometer > 0
+    )
+
+def _previous_odometer(db: Session, user_id: int, date: datetime, log_id: int) -> Optional[float]:
+    previous = _with_odometer(db, user_id).with_entities(models.FuelLog.odometer).filter(or_(
+        models.FuelLog.date < date,
+        and_(models.FuelLog.date == date, models.FuelLog.id < log_id)
+    )).order_by(models.FuelLog.date.desc(), models.FuelLog.id.desc()).first()
+    return previous.odometer if previous else None
+
+def _next_with_odometer(db: Session, user_id: int, date: datetime, log_id: int) -> Optional[models.FuelLog]:
+    return _with_odometer(db, user_id).filter(or_(
+        models.FuelLog.date > date,
+        and_(models.FuelLog.date == date, models.FuelLog.id > log_id)
+    )).order_by(models.FuelLog.date, models.FuelLog.id).first()
+
+# --- Incremental recomputation ---
+
+def _recompute(db: Session, log: models.FuelLog) -> bool:
+    """Set the log's derived values from its current neighbour; returns True if they changed"""
+    previous = _previous_odometer(db, log.user_id, log.date, log.id)
+    kilometers_driven, consumption = derive(log.liters, log.odometer, previous)
+    if (kilometers_driven, consumption) == (log.kilometers_driven, log.consumption):
+        return False
+    log.kilometers_driven = kilometers_driven
+    log.consumption = consumption
+    return True
+
+def _refresh_following(db: Session, user_id: int, date: datetime, log_id: int, skip_id: Optional[int] = None):
+    """Recompute the next log with an odometer after (date, id) and move its stats"""
+    following = _next_with_odometer(db, user_id, date, log_id)
+    if following is None or following.id == skip_id:
+        return
+    before = snapshot(following)
+    if _recompute(db, following):
+        db.flush()
+        fuel_stats.replace_log(db, before, following)
+
+def after_insert(db: Session, log: models.FuelLog):
+    """Call after the new log is flushed; also updates the statistics rollups. Does not commit"""
+    _recompute(db, log)
+    db.flush()
+    fuel_stats.apply_log(db, log)
+    _refresh_following(db, log.user_id, log.date, log.id)
+
+def after_update(db: Session, log: models.FuelLog, before: SimpleNamespace):
+    """Call after the edit is flushed with the log's previous snapshot; does not commit"""
+    _recompute(db, log)
+    db.flush()
+    fuel_stats.replace_log(db, before, log)
+    # The follower at the old position lost this log as its baseline,
+    # the follower at the new position gained it
+    _refresh_following(db, log.user_id, before.date, before.id, skip_id=log.id)
+    _refresh_following(db, log.user_id, log.date, log.id)
+
+def after_delete(db: Session, before: SimpleNamespace):
+    """Call after the delete is flushed with the deleted log's snapshot; does not commit"""
+    fuel_stats.apply_log(db, before, sign=-1)
+    _refresh_following(db, before.user_id, before.date, before.id)
+
+# --- Bulk rebuild ---
+
+def rebuild(db: Session, user_id: int) -> int:
+    """Recompute a user's whole history in one ordered pass; does not commit
+
+    Streams the logs ordered by (date, id) and writes back only rows whose
+    values changed, in bulk batches. Statistics rollups are not touched; run
+    ``fuel_stats.rebuild`` afterwards. Returns the number of updated rows.
+    """
+    logs = db.query(
+        models.FuelLog.id, models.FuelLog.liters, models.FuelLog.odometer,
+        models.FuelLog.kilometers_driven, models.FuelLog.consumption
+    ).filter(models.FuelLog.user_id == user_id).order_by(
+        models.FuelLog.date, models.FuelLog.id
+    ).execution_options(yield_per=UPDATE_BATCH_SIZE)
+
+    updates = []
+    updated = 0
+    previous_odometer = None
+    for log in logs:
+        kilometers_driven, consumption = derive(log.liters, log.odometer, previous_odometer)
+        if (kilometers_driven, consumption) != (log.kilometers_driven, log.consumption):
+            updates.append({"id": log.id, "kilometers_driven": kilometers_driven, "consumption": consumption})
+        if has_odometer(log.odometer):
+            previous_odometer = log.odometer
+        if len(updates) >= UPDATE_BATCH_SIZE:
+            db.bulk_update_mappings(models.FuelLog, updates)
+            updated += len(updates)
+            updates = []
+    if updates:
+        db.bulk_update_mappings(models.FuelLog, updates)
+        updated += len(updates)
+    db.flush()
+    return updated
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute fuel-log kilometers and consumption")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--user", help="Only rebuild this username")
+    args = parser.parse_args()
+
+    from .database import SessionLocal
+    db = SessionLocal()
+    try:
+        query = db.query(models.User.id)
+        if args.user:
+            query = query.filter(models.User.username == args.user)
+        user_ids = [user_id for (user_id,) in query]
+        if args.user and not user_ids:
+            parser.error(f"Unknown user: {args.user}")
+        updated = 0
+        for user_id in user_ids:
+            updated += rebuild(db, user_id)
+            fuel_stats.rebuild(db, user_id)  # commits
+        print(f"✅ Consumption recomputed for {len(user_ids)} users ({updated} logs changed)")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Server-Sent Events fan-out of price changes
+
+Subscribers are grouped by area (rounded center + radius). After every
+ingestion run the broadcaster computes each area's current dashboard stations
+once, diffs them against the previous state and pushes only the delta to all
+subscribers of that area, plus an ``alert`` event to each subscriber whose
+``target_price`` a station just crossed. Idle tabs only hold an open
+connection; nothing is queried on their behalf until prices change.
+"""
+import asyncio
+import json
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .station_store import dashboard_station
+
+SUBSCRIBER_QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 15
+
+AreaKey = Tuple[float, float, float]
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class Subscription:
+    def __init__(self, area: "Area", target_price: Optional[float]):
+        self.area = area
+        self.target_price = target_price
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.needs_resync = False
+
+    def send(self, event: str, data: dict):
+        try:
+            self.queue.put_nowait((event, data))
+        except asyncio.QueueFull:
+            # Slow client: drop the backlog and send a fresh snapshot instead
+            self.needs_resync = True
+
+    def snapshot(self) -> dict:
+        return {"stations": list(self.area.stations.values()), "target_price": self.target_price}
+
+class Area:
+    def __init__(self, lat: float, lng: float, radius: float, stations: List[dict]):
+        self.lat = lat
+        self.lng = lng
+        self.radius = radius
+        self.stations: Dict[str, dict] = {s["id"]: s for s in stations if s.get("id")}
+        self.subscribers: Set[Subscription] = set()
+
+class PriceBroadcaster:
+    def __init__(self):
+        self._areas: Dict[AreaKey, Area] = {}
+        self.events_sent = 0
+        self.publishes = 0
+
+    @staticmethod
+    def area_key(lat: float, lng: float, radius: float) -> AreaKey:
+        return round(lat, 3), round(lng, 3), round(radius, 1)
+
+    def has_area(self, lat: float, lng: float, radius: float) -> bool:
+        return self.area_key(lat, lng, radius) in self._areas
+
+    def subscribe(self, lat: float, lng: float, radius: float, target_price: Optional[float],
+                  stations: Optional[List[dict]] = None) -> Subscription:
+        """Join the area's subscriber group; ``stations`` (raw) seed a new area"""
+        key = self.area_key(lat, lng, radius)
+        area = self._areas.get(key)
+        if area is None:
+            entries = [entry for entry in map(dashboard_station, stations or []) if entry]
+            area = self._areas[key] = Area(key[0], key[1], key[2], entries)
+        subscription = Subscription(area, target_price)
+        area.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        area = subscription.area
+        area.subscribers.discard(subscription)
+        if not area.subscribers:
+            self._areas.pop((area.lat, area.lng, area.radius), None)
+
+    @staticmethod
+    def _current(areas: List[Area], query: Callable[[float, float, float], List[dict]]) -> List[Dict[str, dict]]:
+        result = []
+        for area in areas:
+            current = {}
+            for entry in map(dashboard_station, query(area.lat, area.lng, area.radius)):
+                if entry and entry.get("id"):
+                    current[entry["id"]] = entry
+            result.append(current)
+        return result
+
+    async def publish(self, query: Callable[[float, float, float], List[dict]]):
+        """Diff every subscribed area against fresh data from ``query(lat, lng, radius)``
+
+        The queries run in a worker thread; the diffs and sends stay on the event loop.
+        """
+        self.publishes += 1
+        areas = list(self._areas.values())
+        if not areas:
+            return
+        fresh = await asyncio.to_thread(self._current, areas, query)
+        for area, current in zip(areas, fresh):
+            previous = area.stations
+            changed = [entry for station_id, entry in current.items()
+                       if station_id not in previous or previous[station_id]["price"] != entry["price"]]
+            removed = [station_id for station_id in previous if station_id not in current]
+            area.stations = current
+            if not changed and not removed:
+                continue
+
+            for subscription in list(area.subscribers):
+                subscription.send("delta", {"changed": changed, "removed": removed})
+                self.events_sent += 1
+                target = subscription.target_price
+                if target is None:
+                    continue
+                for entry in changed:
+                    # Only a drop through the target is a crossing; a station that
+                    # just appeared (reopened, new in range) has no previous price
+                    old = previous.get(entry["id"])
+                    if old is not None and old["price"] > target >= entry["price"]:
+                        subscription.send("alert", {"station": entry, "target_price": target})
+                        self.events_sent += 1
+
+    def stats(self) -> dict:
+        return {
+            "areas": len(self._areas),
+            "subscribers": sum(len(area.subscribers) for area in self._areas.values()),
+            "publishes": self.publishes,
+            "events_sent": self.events_sent,
+        }
+
+price_broadcaster = PriceBroadcaster()
@@ -0,0 +1,112 @@
+"""Local fake of the Tankerkoenig API (``list.php`` and ``prices.php``) for load tests
+
+Serves a ``FakeWorld``, adding latency and failures. Start it, then point the
+app at it, with any API key:
+
+    python -m backend.fake_tankerkoenig --port 8001 --latency-ms 80 --error-rate 0.01
+    TANKERKOENIG_BASE_URL=http://127.0.0.1:8001 TANKERKOENIG_API_KEY=load-test \\
+        python -m uvicorn backend.main:app
+
+``GET /stats`` counts the calls answered per endpoint and outcome. Call it
+with ``?reset=true`` to zero the counts between runs.
+"""
+import argparse
+import asyncio
+import collections
+import random
+from typing import Optional
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from .fake_world import FAKE_PRICE_INTERVAL, FAKE_SEED, FAKE_STATIONS, FakeWorld
+
+LICENSE = "CC BY 4.0 -  https://creativecommons.tankerkoenig.de"
+MAX_RADIUS = 25.0
+MAX_PRICE_IDS = 10
+
+def create_app(world: FakeWorld, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+               api_error_rate: float = 0.0, seed: Optional[int] = None) -> FastAPI:
+    """``latency_ms`` +- ``jitter_ms`` per call; ``error_rate`` of the calls get an HTTP 503,
+    ``api_error_rate`` an ``ok: false`` answer"""
+    app = FastAPI(title="Fake Tankerkoenig", openapi_url=None)
+    rng = random.Random(seed)
+    counts = collections.Counter()
+
+    async def answer(endpoint: str, build):
+        delay = max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000.0
+        if delay:
+            await asyncio.sleep(delay)
+        roll = rng.random()
+        if roll < error_rate:
+            counts[endpoint, "http_503"] += 1
+            return JSONResponse({"ok": False, "message": "Service Unavailable"}, status_code=503)
+        if roll < error_rate + api_error_rate:
+            counts[endpoint, "api_error"] += 1
+            return {"ok": False, "status": "error", "message": "simulated API error"}
+        body = build()
+        counts[endpoint, "ok" if body.get("ok") else "rejected"] += 1
+        return body
+
+    def error(message: str) -> dict:
+        return {"ok": False, "status": "error", "message": message}
+
+    @app.get("/list.php")
+    async def list_stations(lat: float, lng: float, rad: float, sort: str = "dist", type: str = "all",
+                            apikey: str = ""):
+        def build():
+            if not apikey:
+                return error("apikey nicht angegeben, falsch, oder im falschen Format")
+            if not 0 < rad <= MAX_RADIUS:
+                return error(f"Radius muss zwischen 0.1 und {MAX_RADIUS:g}km liegen")
+            if type != "all" or sort != "dist":
+                return error("this fake only supports type=all&sort=dist, as the app uses")
+            return {"ok": True, "license": LICENSE, "data": "MTS-K", "status": "ok",
+                    "stations": world.list_stations(lat, lng, rad)}
+        return await answer("list.php", build)
+
+    @app.get("/prices.php")
+    async def prices(ids: str, apikey: str = ""):
+        def build():
+            station_ids = [i for i in ids.split(",") if i]
+            if not apikey:
+                return error("apikey nicht angegeben, falsch, oder im falschen Format")
+            if not 0 < len(station_ids) <= MAX_PRICE_IDS:
+                return error(f"parameter error: 1 to {MAX_PRICE_IDS} station IDs")
+            return {"ok": True, "license": LICENSE, "data": "MTS-K", "prices": world.prices(station_ids)}
+        return await answer("prices.php", build)
+
+    @app.get("/stats")
+    async def stats(reset: bool = False):
+        result = {"stations": len(world), "seed": world.seed, "latency_ms": latency_ms, "jitter_ms": jitter_ms,
+                  "error_rate": error_rate, "api_error_rate": api_error_rate,
+                  "calls": {f"{endpoint} {outcome}": n for (endpoint, outcome), n in sorted(counts.items())}}
+        if reset:
+            counts.clear()
+        return result
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake Tankerkoenig API (list.php, prices.php)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--stations", type=int, default=FAKE_STATIONS)
+    parser.add_argument("--seed", type=int, default=FAKE_SEED, help="same seed, same stations and prices")
+    parser.add_argument("--price-interval", type=float, default=FAKE_PRICE_INTERVAL,
+                        help="seconds between price steps per station")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with HTTP 503")
+    parser.add_argument("--api-error-rate", type=float, default=0.0, help="share of calls answered with ok=false")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    world = FakeWorld(args.stations, args.seed, args.price_interval)
+    app = create_app(world, args.latency_ms, args.jitter_ms, args.error_rate, args.api_error_rate, args.seed)
+    print(f"Fake Tankerkoenig: {len(world)} stations on http://{args.host}:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
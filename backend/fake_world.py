@@ -0,0 +1,181 @@
+"""A simulated German station network with prices that change over time
+
+``FakeWorld`` generates ``FAKE_STATIONS`` stations from ``FAKE_SEED``. They
+are clustered around the large cities, with rural stations in between. It
+answers in the shapes of Tankerkoenig's ``list.php`` and ``prices.php``, so
+the fake provider and the fake server (``backend.fake_tankerkoenig``) behave
+like the real API.
+
+A price is a function of the station and the time, with no state:
+
+* the national base price per fuel;
+* a fixed offset per station (brand premium + location);
+* the daily cycle: most expensive in the early morning, cheapest in the
+  evening;
+* a step every ``FAKE_PRICE_INTERVAL`` seconds, which each station takes
+  at its own phase.
+
+So every process with the same seed agrees on every price, and prices
+change steadily.
+"""
+import math
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from .geo import EARTH_RADIUS_KM, bounding_box
+
+FAKE_STATIONS = int(os.getenv("FAKE_STATIONS", "15000"))  # Germany has about 14,500
+FAKE_SEED = int(os.getenv("FAKE_SEED", "42"))
+FAKE_PRICE_INTERVAL = float(os.getenv("FAKE_PRICE_INTERVAL", "900"))  # seconds between price steps
+
+BERLIN = ZoneInfo("Europe/Berlin")
+
+BASE_PRICES = {"e5": 1.789, "e10": 1.729, "diesel": 1.659}
+
+# Offset per local hour: expensive after 22:00 and in the morning, cheapest around 18-21 h
+DAILY_CYCLE = np.array([
+    0.06, 0.06, 0.06, 0.06, 0.06, 0.07, 0.08, 0.07, 0.05, 0.04, 0.03, 0.04,
+    0.05, 0.03, 0.02, 0.03, 0.02, 0.01, 0.00, -0.01, -0.01, 0.00, 0.07, 0.06,
+])
+
+# (name, lat, lng, share of the urban stations)
+CITIES = [
+    ("Berlin", 52.520, 13.405, 10), ("Hamburg", 53.551, 9.994, 7), ("München", 48.137, 11.575, 7),
+    ("Köln", 50.938, 6.960, 5), ("Frankfurt am Main", 50.110, 8.682, 4), ("Stuttgart", 48.776, 9.183, 4),
+    ("Düsseldorf", 51.228, 6.774, 3), ("Leipzig", 51.340, 12.375, 3), ("Dortmund", 51.514, 7.466, 3),
+    ("Essen", 51.456, 7.012, 3), ("Bremen", 53.079, 8.802, 3), ("Dresden", 51.050, 13.738, 3),
+    ("Hannover", 52.376, 9.732, 3), ("Nürnberg", 49.452, 11.077, 3), ("Duisburg", 51.435, 6.763, 2),
+    ("Bochum", 51.482, 7.216, 2), ("Wuppertal", 51.256, 7.151, 2), ("Bielefeld", 52.030, 8.532, 2),
+    ("Bonn", 50.737, 7.098, 2), ("Münster", 51.961, 7.626, 2), ("Mannheim", 49.487, 8.466, 2),
+    ("Karlsruhe", 49.007, 8.404, 2), ("Augsburg", 48.370, 10.898, 2), ("Freiburg im Breisgau", 47.999, 7.842, 2),
+    ("Kiel", 54.323, 10.123, 1), ("Rostock", 54.092, 12.099, 1), ("Erfurt", 50.978, 11.029, 1),
+    ("Magdeburg", 52.120, 11.628, 1), ("Saarbrücken", 49.240, 6.997, 1), ("Regensburg", 49.013, 12.101, 1),
+]
+URBAN_SHARE = 0.3  # the 30 cities hold about a quarter of the population
+GERMANY = (47.4, 54.8, 6.0, 14.9)  # rural stations: uniform in this box
+
+# (brand, share, price premium)
+BRANDS = [
+    ("ARAL", 0.20, 0.03), ("Shell", 0.14, 0.03), ("ESSO", 0.08, 0.02), ("TotalEnergies", 0.07, 0.02),
+    ("AVIA", 0.06, 0.0), ("JET", 0.05, -0.04), ("STAR", 0.05, -0.01), ("HEM", 0.04, -0.03),
+    ("Agip", 0.04, 0.01), ("Raiffeisen", 0.04, -0.01), ("bft", 0.04, -0.02), ("Freie Tankstelle", 0.19, -0.02),
+]
+STREETS = ["Hauptstraße", "Bahnhofstraße", "Industriestraße", "Berliner Straße", "Münchener Straße",
+           "Gewerbestraße", "Am Autohof", "Landstraße", "Ringstraße", "Westring", "Ostring", "Bundesstraße"]
+
+class FakeWorld:
+    def __init__(self, stations: int = FAKE_STATIONS, seed: int = FAKE_SEED,
+                 price_interval: float = FAKE_PRICE_INTERVAL):
+        self.seed = seed
+        self.price_interval = price_interval
+        rng = np.random.default_rng(seed)
+
+        urban = int(stations * URBAN_SHARE)
+        weights = np.array([city[3] for city in CITIES], dtype=float)
+        city = rng.choice(len(CITIES), size=urban, p=weights / weights.sum())
+        spread_km = rng.exponential(8.0, urban)
+        bearing = rng.uniform(0, 2 * math.pi, urban)
+        city_lat = np.array([c[1] for c in CITIES])[city]
+        city_lng = np.array([c[2] for c in CITIES])[city]
+        urban_lat = city_lat + np.degrees(spread_km * np.cos(bearing) / EARTH_RADIUS_KM)
+        urban_lng = city_lng + np.degrees(spread_km * np.sin(bearing) / EARTH_RADIUS_KM) / np.cos(np.radians(city_lat))
+        rural = stations - urban
+        self.lat = np.concatenate([urban_lat, rng.uniform(GERMANY[0], GERMANY[1], rural)])
+        self.lng = np.concatenate([urban_lng, rng.uniform(GERMANY[2], GERMANY[3], rural)])
+        self.place = [CITIES[c][0] for c in city] + ["Landkreis"] * rural
+
+        shares = np.array([brand[1] for brand in BRANDS])
+        self.brand = rng.choice(len(BRANDS), size=stations, p=shares / shares.sum())
+        self.offset = np.array([brand[2] for brand in BRANDS])[self.brand] + rng.normal(0, 0.02, stations)
+        self.offset[:urban] -= 0.01  # more competition in town
+        self.phase = rng.uniform(0, price_interval, stations)
+        self.step_seed = rng.integers(1, 2 ** 31, stations, dtype=np.uint64)
+        self.all_day = rng.random(stations) < 0.45  # the others close from 22 to 6 h
+        self.no_e10 = rng.random(stations) < 0.03
+        self.street = rng.integers(0, len(STREETS), stations)
+        self.house_number = rng.integers(1, 250, stations)
+        self.post_code = rng.integers(1067, 99999, stations)
+        self.ids = [str(uuid.UUID(bytes=bytes(row), version=4))
+                    for row in rng.integers(0, 256, (stations, 16), dtype=np.uint8)]
+        self.index = {station_id: i for i, station_id in enumerate(self.ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _prices(self, rows: np.ndarray, now: float) -> Dict[str, np.ndarray]:
+        hour = datetime.fromtimestamp(now, BERLIN).hour
+        step = np.floor((now + self.phase[rows]) / self.price_interval).astype(np.uint64)
+        # -0.02 .. +0.02 in whole cents, fixed per (station, step)
+        jitter = ((self.step_seed[rows] * np.uint64(2654435761) + step * np.uint64(40503)) % np.uint64(5)
+                  ).astype(float) * 0.01 - 0.02
+        common = DAILY_CYCLE[hour] + self.offset[rows] + jitter
+        return {fuel: np.round(base + common, 2) - 0.001 for fuel, base in BASE_PRICES.items()}
+
+    def _is_open(self, rows: np.ndarray, now: float) -> np.ndarray:
+        hour = datetime.fromtimestamp(now, BERLIN).hour
+        return self.all_day[rows] | (6 <= hour < 22)
+
+    def _reading(self, i: int, prices: Dict[str, np.ndarray], j: int, is_open: bool) -> dict:
+        reading = {fuel: round(float(prices[fuel][j]), 3) for fuel in BASE_PRICES}
+        if self.no_e10[i]:
+            reading["e10"] = False
+        reading["isOpen"] = bool(is_open)
+        return reading
+
+    def list_stations(self, lat: float, lng: float, radius: float, now: Optional[float] = None) -> List[dict]:
+        """``list.php?type=all&sort=dist``: the stations within ``radius`` km, nearest first"""
+        now = time.time() if now is None else now
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius)
+        rows = np.flatnonzero((self.lat >= min_lat) & (self.lat <= max_lat) &
+                              (self.lng >= min_lng) & (self.lng <= max_lng))
+        phi1, phi2 = math.radians(lat), np.radians(self.lat[rows])
+        a = (np.sin((phi2 - phi1) / 2) ** 2 +
+             math.cos(phi1) * np.cos(phi2) * np.sin(np.radians(self.lng[rows] - lng) / 2) ** 2)
+        dist = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(1.0, a)))
+        inside = dist <= radius
+        rows, dist = rows[inside], dist[inside]
+        order = np.argsort(dist, kind="stable")
+        rows, dist = rows[order], dist[order]
+
+        prices = self._prices(rows, now)
+        is_open = self._is_open(rows, now)
+        stations = []
+        for j, i in enumerate(rows):
+            brand = BRANDS[self.brand[i]][0]
+            stations.append({
+                "id": self.ids[i],
+                "name": f"{brand} {self.place[i]}",
+                "brand": brand,
+                "street": STREETS[self.street[i]],
+                "houseNumber": str(self.house_number[i]),
+                "postCode": int(self.post_code[i]),
+                "place": self.place[i],
+                "lat": round(float(self.lat[i]), 6),
+                "lng": round(float(self.lng[i]), 6),
+                "dist": round(float(dist[j]), 1),
+                **self._reading(i, prices, j, is_open[j]),
+            })
+        return stations
+
+    def prices(self, station_ids: Iterable[str], now: Optional[float] = None) -> Dict[str, dict]:
+        """``prices.php``: ``{id: {"status": "open"|"closed", "e5": ..., ...}}``; unknown IDs get "no prices" """
+        now = time.time() if now is None else now
+        station_ids = list(station_ids)
+        known = [(station_id, self.index[station_id]) for station_id in station_ids if station_id in self.index]
+        rows = np.array([i for _, i in known], dtype=np.intp)
+        prices = self._prices(rows, now)
+        is_open = self._is_open(rows, now)
+        result = {station_id: {"status": "no prices"} for station_id in station_ids}
+        for j, (station_id, i) in enumerate(known):
+            reading = self._reading(i, prices, j, is_open[j])
+            if not reading.pop("isOpen"):
+                result[station_id] = {"status": "closed"}
+            else:
+                result[station_id] = {"status": "open", **reading}
+        return result
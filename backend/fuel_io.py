@@ -0,0 +1,201 @@
+"""Bulk import and streaming export of fuel logs (CSV and NDJSON)
+
+Import reads the upload row by row, validates it in chunks and inserts each
+chunk with one executemany in its own transaction. Kilometers and consumption
+are then derived in a single ordered pass over the user's history (see
+``consumption.rebuild``) and the statistics rollups are rebuilt once; this
+also happens when the import fails after some chunks were committed.
+
+Export streams the history from a server-side cursor (``yield_per``), so the
+whole history is never held in memory.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import IO, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from . import models, consumption, fuel_stats
+from .database import SessionLocal
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 50
+
+FORMATS = ("csv", "ndjson")
+FUEL_TYPES = ("diesel", "e5", "e10")
+
+# Column order of the export; the import accepts the same columns
+EXPORT_FIELDS = ("date", "station_name", "city", "fuel_type", "liters", "price_per_liter",
+                 "total_price", "odometer", "kilometers_driven", "consumption", "notes")
+
+def format_from_filename(filename: Optional[str]) -> str:
+    if filename and filename.lower().endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "csv"
+
+# --- Import ---
+
+def _parse_float(value, field: str, required: bool = False) -> Optional[float]:
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if "," in value and "." not in value:
+            value = value.replace(",", ".")  # Dezimalkomma aus deutschen Tabellen
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} is not a number: {value!r}")
+
+def _parse_date(value) -> datetime:
+    if not value or not str(value).strip():
+        raise ValueError("date is required")
+    value = str(value).strip()
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        pass
+    for pattern in ("%d.%m.%Y %H:%M", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(value, pattern)
+        except ValueError:
+            pass
+    raise ValueError(f"date is not ISO 8601 or DD.MM.YYYY: {value!r}")
+
+def validate_row(raw: dict, user_id: int) -> dict:
+    """Turn one uploaded row into FuelLog column values; raises ValueError"""
+    liters = _parse_float(raw.get("liters"), "liters", required=True)
+    price_per_liter = _parse_float(raw.get("price_per_liter"), "price_per_liter", required=True)
+    if liters <= 0:
+        raise ValueError("liters must be positive")
+    if price_per_liter <= 0:
+        raise ValueError("price_per_liter must be positive")
+
+    fuel_type = (raw.get("fuel_type") or "diesel").strip().lower()
+    if fuel_type not in FUEL_TYPES:
+        raise ValueError(f"fuel_type must be one of {', '.join(FUEL_TYPES)}")
+
+    total_price = _parse_float(raw.get("total_price"), "total_price")
+    return {
+        "user_id": user_id,
+        "date": _parse_date(raw.get("date")),
+        "station_name": (raw.get("station_name") or "").strip() or "Unbekannt",
+        "city": (raw.get("city") or "").strip() or None,
+        "fuel_type": fuel_type,
+        "liters": liters,
+        "price_per_liter": price_per_liter,
+        "total_price": total_price if total_price is not None else liters * price_per_liter,
+        "odometer": _parse_float(raw.get("odometer"), "odometer"),
+        "notes": (raw.get("notes") or "").strip() or None,
+    }
+
+def read_rows(fileobj: IO[bytes], fmt: str) -> Iterator[Tuple[int, object]]:
+    """Yield (line number, dict or ValueError) for every row of the upload"""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "ndjson":
+            for line_no, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, ValueError(f"invalid JSON: {e.msg}")
+                    continue
+                yield line_no, row if isinstance(row, dict) else ValueError("expected a JSON object")
+            return
+
+        header = text.readline()
+        # Spreadsheets exported with a German locale use ";" as delimiter
+        delimiter = max(",;\t", key=header.count)
+        reader = csv.DictReader(text, fieldnames=next(csv.reader([header], delimiter=delimiter)),
+                                delimiter=delimiter)
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        for row in reader:
+            yield reader.line_num + 1, row
+    finally:
+        text.detach()  # leave the upload open for its owner
+
+def import_logs(db, user_id: int, fileobj: IO[bytes], fmt: str = "csv",
+                batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """Import an upload for one user; commits per batch. Invalid rows are skipped and reported"""
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+
+    imported = 0
+    skipped = 0
+    errors: List[dict] = []
+    batch: List[dict] = []
+
+    def flush_batch():
+        nonlocal imported
+        if batch:
+            db.execute(insert(models.FuelLog), batch)
+            db.commit()
+            imported += len(batch)
+            batch.clear()
+
+    recomputed = 0
+    try:
+        for line_no, raw in read_rows(fileobj, fmt):
+            try:
+                if isinstance(raw, ValueError):
+                    raise raw
+                batch.append(validate_row(raw, user_id))
+            except ValueError as e:
+                skipped += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"line": line_no, "error": str(e)})
+                continue
+            if len(batch) >= batch_size:
+                flush_batch()
+        flush_batch()
+    finally:
+        # Batches committed before a failure are kept, so derive their values
+        # and bump the fuel-log version (ETags) even if the import is aborted
+        if imported:
+            db.rollback()
+            recomputed = consumption.rebuild(db, user_id)
+            fuel_stats.rebuild(db, user_id)  # commits
+    return {"imported": imported, "skipped": skipped, "errors": errors, "consumption_updated": recomputed}
+
+# --- Export ---
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def export_logs(user_id: int, fmt: str = "csv") -> Iterator[str]:
+    """Yield the user's history (oldest first) in chunks; uses its own session
+
+    Runs after the request's session is gone, so it opens and closes its own.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(*(getattr(models.FuelLog, field) for field in EXPORT_FIELDS)).filter(
+            models.FuelLog.user_id == user_id
+        ).order_by(models.FuelLog.date, models.FuelLog.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        if fmt == "csv":
+            writer.writerow(EXPORT_FIELDS)
+
+        for count, row in enumerate(rows, start=1):
+            values = [_export_value(value) for value in row]
+            if fmt == "csv":
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, values))) + "\n")
+            if count % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
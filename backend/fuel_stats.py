@@ -0,0 +1,214 @@
+"""Incrementally maintained fuel-log statistics
+
+Every fuel log contributes to six ``FuelStats`` rows: (its fuel type, "all")
+x (period "all", its year, its month). ``apply_log`` adds or removes one log in
+the caller's transaction, so ``/fuel-logs/statistics`` never has to scan a
+user's history. Each of them also bumps the user's ``fuel_log_version``, the
+ETag source of the fuel-log endpoints. ``rebuild`` recomputes the rollups from
+scratch (backfill):
+
+    python -m backend.fuel_stats rebuild [--user USERNAME]
+"""
+import argparse
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from . import models
+
+ALL = "all"
+
+_COUNTERS = ("log_count", "total_liters", "total_cost", "price_sum",
+             "consumption_sum", "consumption_count", "total_km")
+
+def _keys(log) -> List[tuple]:
+    date = log.date
+    periods = [ALL, f"{date.year:04d}", f"{date.year:04d}-{date.month:02d}"]
+    fuel_types = [ALL, log.fuel_type or "diesel"]
+    return [(fuel_type, period) for fuel_type in fuel_types for period in periods]
+
+def _deltas(log) -> dict:
+    return {
+        "log_count": 1,
+        "total_liters": log.liters or 0.0,
+        "total_cost": log.total_price or 0.0,
+        "price_sum": log.price_per_liter or 0.0,
+        # Same rules as before: only truthy consumption / km count
+        "consumption_sum": log.consumption or 0.0,
+        "consumption_count": 1 if log.consumption else 0,
+        "total_km": log.kilometers_driven or 0.0,
+    }
+
+def _rows(db: Session, user_id: int, keys: List[tuple]) -> dict:
+    return {
+        (row.fuel_type, row.period): row for row in db.query(models.FuelStats).filter(
+            models.FuelStats.user_id == user_id,
+            models.FuelStats.fuel_type.in_({k[0] for k in keys}),
+            models.FuelStats.period.in_({k[1] for k in keys})
+        )
+    }
+
+def touch(db: Session, user_id: Optional[int] = None):
+    """Bump the fuel-log version of one user (or all users); does not commit"""
+    query = db.query(models.User)
+    if user_id is not None:
+        query = query.filter(models.User.id == user_id)
+    query.update({models.User.fuel_log_version: models.User.fuel_log_version + 1}, synchronize_session=False)
+
+def log_version(db: Session, user_id: int) -> int:
+    return db.query(models.User.fuel_log_version).filter(models.User.id == user_id).scalar() or 0
+
+def apply_log(db: Session, log, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) one log's values; does not commit
+
+    Call it after the insert/delete has been flushed. ``log`` only needs the
+    FuelLog attributes (user_id, date, fuel_type, liters, total_price,
+    price_per_liter, consumption, kilometers_driven), so callers can pass a
+    snapshot of a row's previous values.
+    """
+    touch(db, log.user_id)
+    keys = _keys(log)
+    rows = _rows(db, log.user_id, keys)
+    if (ALL, ALL) not in rows:
+        # Rollups were never built for this user: build them from the flushed logs
+        _rebuild(db, log.user_id)
+        return
+    deltas = _deltas(log)
+    for key in keys:
+        row = rows.get(key)
+        if row is None:
+            row = models.FuelStats(user_id=log.user_id, fuel_type=key[0], period=key[1],
+                                   **{counter: 0 for counter in _COUNTERS})
+            db.add(row)
+        for counter, value in deltas.items():
+            setattr(row, counter, (getattr(row, counter) or 0) + sign * value)
+        if row.log_count <= 0 and key != (ALL, ALL):
+            db.delete(row)
+
+def replace_log(db: Session, before, after):
+    """Move an edited log from its previous values (snapshot) to its new ones; does not commit"""
+    touch(db, after.user_id)
+    if db.query(models.FuelStats.id).filter(
+        models.FuelStats.user_id == after.user_id,
+        models.FuelStats.fuel_type == ALL,
+        models.FuelStats.period == ALL
+    ).first() is None:
+        _rebuild(db, after.user_id)  # never built: build them from the flushed logs
+        return
+    keys = _keys(after)
+    if _keys(before) != keys:
+        # Moved to another month or fuel type
+        apply_log(db, before, sign=-1)
+        db.flush()
+        apply_log(db, after)
+        return
+    rows = _rows(db, after.user_id, keys)
+    if len(rows) != len(keys):
+        _rebuild(db, after.user_id)  # out of sync: rebuild from the flushed logs
+        return
+    old, new = _deltas(before), _deltas(after)
+    for row in rows.values():
+        for counter in _COUNTERS:
+            setattr(row, counter, (getattr(row, counter) or 0) + new[counter] - old[counter])
+
+def rebuild(db: Session, user_id: Optional[int] = None) -> int:
+    """Recompute all rollups (of one user) from the fuel logs; commits. Returns logs processed"""
+    processed = _rebuild(db, user_id)
+    db.commit()
+    return processed
+
+def _rebuild(db: Session, user_id: Optional[int] = None) -> int:
+    stats_query = db.query(models.FuelStats)
+    logs_query = db.query(
+        models.FuelLog.user_id, models.FuelLog.date, models.FuelLog.fuel_type, models.FuelLog.liters,
+        models.FuelLog.total_price, models.FuelLog.price_per_liter, models.FuelLog.consumption,
+        models.FuelLog.kilometers_driven
+    )
+    user_ids = [user_id] if user_id is not None else [uid for (uid,) in db.query(models.User.id)]
+    if user_id is not None:
+        stats_query = stats_query.filter(models.FuelStats.user_id == user_id)
+        logs_query = logs_query.filter(models.FuelLog.user_id == user_id)
+    stats_query.delete(synchronize_session=False)
+    touch(db, user_id)
+
+    totals = {}
+    processed = 0
+    for log in logs_query.yield_per(1000):
+        deltas = _deltas(log)
+        for key in _keys(log):
+            row = totals.setdefault((log.user_id,) + key, dict.fromkeys(_COUNTERS, 0))
+            for counter, value in deltas.items():
+                row[counter] += value
+        processed += 1
+
+    # Every user gets an "all/all" row, so an existing row means "rollups are built"
+    for uid in user_ids:
+        totals.setdefault((uid, ALL, ALL), dict.fromkeys(_COUNTERS, 0))
+
+    for (uid, fuel_type, period), counters in totals.items():
+        db.add(models.FuelStats(user_id=uid, fuel_type=fuel_type, period=period, **counters))
+    db.flush()
+    return processed
+
+def _summary(row: models.FuelStats) -> dict:
+    return {
+        "total_logs": row.log_count,
+        "total_liters": round(row.total_liters, 2),
+        "total_cost": round(row.total_cost, 2),
+        "average_price_per_liter": round(row.price_sum / row.log_count, 3) if row.log_count else None,
+        "average_consumption": round(row.consumption_sum / row.consumption_count, 2) if row.consumption_count else None,
+        "total_kilometers": round(row.total_km, 1) if row.total_km else None
+    }
+
+def get_statistics(db: Session, user_id: int) -> dict:
+    """Overall statistics plus per fuel type, yearly and monthly breakdowns"""
+    rows = db.query(models.FuelStats).filter(models.FuelStats.user_id == user_id).all()
+    if not any(row.fuel_type == ALL and row.period == ALL for row in rows):
+        # Logs from before the rollups existed: backfill this user once
+        rebuild(db, user_id)
+        rows = db.query(models.FuelStats).filter(models.FuelStats.user_id == user_id).all()
+
+    overall = next(row for row in rows if row.fuel_type == ALL and row.period == ALL)
+    if not overall.log_count:
+        return {"total_logs": 0}
+
+    result = _summary(overall)
+    result["by_fuel_type"] = {
+        row.fuel_type: _summary(row) for row in rows if row.fuel_type != ALL and row.period == ALL
+    }
+    result["yearly"] = [
+        {"period": row.period, **_summary(row)}
+        for row in sorted(rows, key=lambda r: r.period, reverse=True)
+        if row.fuel_type == ALL and len(row.period) == 4
+    ]
+    result["monthly"] = [
+        {"period": row.period, **_summary(row)}
+        for row in sorted(rows, key=lambda r: r.period, reverse=True)
+        if row.fuel_type == ALL and len(row.period) == 7
+    ]
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain fuel-log statistics rollups")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--user", help="Only rebuild this username")
+    args = parser.parse_args()
+
+    from .database import SessionLocal, engine
+    from .migrate import ensure_current
+    ensure_current(engine)  # the rollup table comes with the migrations
+    db = SessionLocal()
+    try:
+        user_id = None
+        if args.user:
+            user = db.query(models.User).filter(models.User.username == args.user).first()
+            if user is None:
+                parser.error(f"Unknown user: {args.user}")
+            user_id = user.id
+        processed = rebuild(db, user_id)
+        print(f"✅ Fuel statistics rebuilt from {processed} logs")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
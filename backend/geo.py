@@ -0,0 +1,28 @@
+"""Small geo helpers shared by the price endpoints"""
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in km"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def km_per_degree_lng(lat: float) -> float:
+    """Length of one degree of longitude at the given latitude"""
+    return max(1e-6, math.cos(math.radians(lat)) * math.pi * EARTH_RADIUS_KM / 180.0)
+
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180.0
+
+def bounding_box(lat: float, lng: float, radius_km: float):
+    """(min_lat, max_lat, min_lng, max_lng) enclosing a circle"""
+    angular = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(angular)
+    # Exact longitude span of a spherical cap (slightly wider than at the center latitude)
+    ratio = math.sin(angular) / max(1e-12, math.cos(math.radians(lat)))
+    dlng = 180.0 if ratio >= 1 else math.degrees(math.asin(ratio))
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
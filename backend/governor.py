@@ -0,0 +1,216 @@
+"""Upstream governor: token-bucket rate limit + circuit breaker
+
+Every Tankerkoenig call goes through ``UpstreamGovernor.run``:
+
+1. While the breaker is open, the call fails immediately with ``CircuitOpen``
+   and is never sent. The breaker opens after ``failure_threshold``
+   consecutive failures.
+2. Otherwise the call takes a token from the bucket. If no token is available
+   within ``max_wait`` seconds, it fails with ``Throttled``; this does not
+   count as an upstream failure.
+3. Each result is recorded. After the cooldown one probe call is let through
+   (half-open). A success closes the breaker. A failure reopens it for twice
+   as long, up to ``max_cooldown``, with random jitter so several workers do
+   not retry in lockstep.
+
+All state lives on the event loop; no locks are needed.
+"""
+import asyncio
+import os
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Tankerkoenig asks clients to keep their request rate low; stay well below it by default
+UPSTREAM_RATE_PER_MINUTE = float(os.getenv("UPSTREAM_RATE_PER_MINUTE", "60"))
+UPSTREAM_BURST = int(os.getenv("UPSTREAM_BURST", "10"))
+UPSTREAM_MAX_WAIT = float(os.getenv("UPSTREAM_MAX_WAIT", "2"))  # seconds an interactive call may queue
+UPSTREAM_BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))  # consecutive
+UPSTREAM_BREAKER_COOLDOWN = float(os.getenv("UPSTREAM_BREAKER_COOLDOWN", "30"))  # first open period
+UPSTREAM_BREAKER_MAX_COOLDOWN = float(os.getenv("UPSTREAM_BREAKER_MAX_COOLDOWN", "600"))
+
+class Rejected(Exception):
+    """The call was not sent upstream"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitOpen(Rejected):
+    pass
+
+class Throttled(Rejected):
+    pass
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with "equal jitter": uniformly in [d/2, d] for d = min(cap, base * 2^attempt)"""
+    delay = min(cap, base * (2 ** max(0, attempt)))
+    return random.uniform(delay / 2, delay)
+
+class TokenBucket:
+    """``rate`` tokens per second, at most ``burst`` saved up
+
+    A caller that has to wait reserves its token up front (the balance goes
+    negative), so concurrent waiters are served in order at exactly ``rate``.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self.granted = 0
+        self.delayed = 0
+        self.throttled = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill(time.monotonic())
+        return self._tokens
+
+    async def acquire(self, max_wait: float):
+        if self.rate <= 0:
+            return
+        self._refill(time.monotonic())
+        wait = max(0.0, (1.0 - self._tokens) / self.rate)
+        if wait > max_wait:
+            self.throttled += 1
+            raise Throttled(f"Upstream rate limit reached, next slot in {wait:.1f}s", wait)
+        self._tokens -= 1.0
+        self.granted += 1
+        if wait > 0:
+            self.delayed += 1
+            await asyncio.sleep(wait)
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = UPSTREAM_BREAKER_FAILURES,
+                 cooldown: float = UPSTREAM_BREAKER_COOLDOWN, max_cooldown: float = UPSTREAM_BREAKER_MAX_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.trips = 0          # consecutive openings without a success in between
+        self.total_trips = 0
+        self.open_until = 0.0
+        self._probing = False
+        self.rejected = 0
+
+    def allow(self):
+        """Raise ``CircuitOpen`` unless a call may be sent now"""
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            if now < self.open_until:
+                self.rejected += 1
+                raise CircuitOpen("Upstream circuit open", self.open_until - now)
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                self.rejected += 1
+                raise CircuitOpen("Upstream circuit half-open, probe in flight", 1.0)
+            self._probing = True
+
+    def release(self):
+        """The allowed call was never sent (throttled or cancelled)"""
+        self._probing = False
+
+    def success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.trips = 0
+        self._probing = False
+
+    def failure(self):
+        self.consecutive_failures += 1
+        probe_failed = self.state == self.HALF_OPEN and self._probing
+        self._probing = False
+        if probe_failed or (self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold):
+            self._trip()
+
+    def _trip(self):
+        self.state = self.OPEN
+        self.open_until = time.monotonic() + backoff_delay(self.trips, self.cooldown, self.max_cooldown)
+        self.trips += 1
+        self.total_trips += 1
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "open_for_seconds": round(max(0.0, self.open_until - time.monotonic()), 1)
+            if self.state == self.OPEN else 0.0,
+            "trips": self.total_trips,
+            "rejected_calls": self.rejected,
+        }
+
+class UpstreamGovernor:
+    def __init__(self, bucket: Optional[TokenBucket] = None, breaker: Optional[CircuitBreaker] = None,
+                 max_wait: float = UPSTREAM_MAX_WAIT):
+        self.bucket = bucket or TokenBucket(UPSTREAM_RATE_PER_MINUTE / 60.0, UPSTREAM_BURST)
+        self.breaker = breaker or CircuitBreaker()
+        self.max_wait = max_wait
+        self.calls = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_failure_at: Optional[float] = None
+        self.last_success_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.breaker.state == CircuitBreaker.OPEN and time.monotonic() < self.breaker.open_until
+
+    async def run(self, call: Callable[[], Awaitable[T]], max_wait: Optional[float] = None) -> T:
+        """Send ``call()`` if breaker and bucket allow it; any exception counts as a failure"""
+        self.breaker.allow()
+        try:
+            await self.bucket.acquire(self.max_wait if max_wait is None else max_wait)
+            self.calls += 1
+            result = await call()
+        except Rejected:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            self.last_failure_at = time.time()
+            self.breaker.failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.last_success_at = time.time()
+        self.breaker.success()
+        return result
+
+    def stats(self) -> dict:
+        def age(timestamp: Optional[float]) -> Optional[float]:
+            return round(time.time() - timestamp, 1) if timestamp else None
+
+        return {
+            "circuit": self.breaker.stats(),
+            "rate_limit": {
+                "per_minute": round(self.bucket.rate * 60, 2),
+                "burst": self.bucket.burst,
+                "tokens": round(self.bucket.tokens, 2),
+                "max_wait_seconds": self.max_wait,
+                "granted": self.bucket.granted,
+                "delayed": self.bucket.delayed,
+                "throttled": self.bucket.throttled,
+            },
+            "calls": self.calls,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "seconds_since_failure": age(self.last_failure_at),
+            "seconds_since_success": age(self.last_success_at),
+        }
+
+upstream_governor = UpstreamGovernor()
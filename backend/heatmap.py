@@ -0,0 +1,299 @@
+"""Price heatmap tiles (``/heatmap/{z}/{x}/{y}``)
+
+Tiles are 256 px Web Mercator PNGs, so Leaflet can show them as a tile layer.
+Each pixel is an inverse-distance-weighted average of the station prices
+within ``radius_px``. The weights also fade to zero at that radius, so empty
+areas stay transparent. Stations are snapped onto a coarse ``HEATMAP_GRID``²
+lattice (plus a margin of one radius). The weighted sums are then two FFT
+convolutions of that raster with the weight stencil, and the result is
+bilinearly upsampled. The cost depends on the lattice size, not on the number
+of stations, so a national-zoom tile costs about as much as a city tile.
+
+Every ``update`` (one per ingestion run) takes a new price snapshot. The
+stations are grouped into ``REGION_DEG`` regions, and each region gets a
+content hash per fuel. A tile's fingerprint combines the colour scale with
+the hashes of the regions it reads. A cached tile is therefore reused until
+a price in its own neighbourhood changes, even though the snapshot version
+moves on with every run.
+"""
+import hashlib
+import math
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+HEATMAP_CACHE_MAX_ENTRIES = int(os.getenv("HEATMAP_CACHE_MAX_ENTRIES", "2000"))
+HEATMAP_GRID = int(os.getenv("HEATMAP_GRID", "64"))  # computed cells per tile side
+HEATMAP_RADIUS_PX = float(os.getenv("HEATMAP_RADIUS_PX", "32"))  # influence radius on screen
+HEATMAP_MIN_RADIUS_KM = float(os.getenv("HEATMAP_MIN_RADIUS_KM", "2"))  # ... but never less than this
+
+TILE_SIZE = 256
+REGION_DEG = 0.5
+MAX_ZOOM = 18
+
+# Colour stops from cheap to expensive: green -> yellow -> orange -> red
+_STOPS = np.array([0.0, 0.4, 0.7, 1.0])
+_COLOURS = np.array([(34, 197, 94), (250, 204, 21), (251, 146, 60), (239, 68, 68)], dtype=float)
+_MAX_ALPHA = 170
+_PRICE_STEPS, _ALPHA_STEPS = 32, 8  # 256 palette entries: colour index * _ALPHA_STEPS + alpha index
+
+# --- Tile geometry ---
+
+def _world_px(z: int) -> float:
+    return TILE_SIZE * (1 << z)
+
+def project(lat, lng, z: int):
+    """Web Mercator world pixel coordinates at zoom ``z`` (vectorized)"""
+    lat = np.clip(np.radians(lat), -1.4844, 1.4844)  # +-85.05°
+    size = _world_px(z)
+    px = (np.asarray(lng) + 180.0) / 360.0 * size
+    py = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * size
+    return px, py
+
+def unproject(px: float, py: float, z: int) -> Tuple[float, float]:
+    size = _world_px(z)
+    lng = px / size * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1.0 - 2.0 * py / size))))
+    return lat, lng
+
+def radius_px(z: int, y: int) -> float:
+    """Influence radius in pixels for tile row ``y``: HEATMAP_RADIUS_PX, widened to
+    HEATMAP_MIN_RADIUS_KM at street level but never beyond one tile"""
+    lat, _ = unproject(0, (y + 0.5) * TILE_SIZE, z)
+    km_per_px = 40075.016 * math.cos(math.radians(lat)) / _world_px(z)
+    return min(max(HEATMAP_RADIUS_PX, HEATMAP_MIN_RADIUS_KM / km_per_px), float(TILE_SIZE))
+
+# --- Rendering ---
+
+def _palette() -> Tuple[bytes, bytes]:
+    """PLTE (RGB) and tRNS (alpha) chunk payloads"""
+    t = np.repeat(np.linspace(0.0, 1.0, _PRICE_STEPS), _ALPHA_STEPS)
+    rgb = np.column_stack([np.interp(t, _STOPS, _COLOURS[:, c]) for c in range(3)])
+    alpha = np.tile(np.linspace(0.0, _MAX_ALPHA, _ALPHA_STEPS), _PRICE_STEPS)
+    return np.round(rgb).astype(np.uint8).tobytes(), np.round(alpha).astype(np.uint8).tobytes()
+
+_PALETTE = _palette()
+
+def _colour_index(price: np.ndarray, weight: np.ndarray, scale: Tuple[float, float]) -> np.ndarray:
+    """Palette index per pixel: price position on the scale and coverage as opacity"""
+    low, high = scale
+    t = np.clip((price - low) / (high - low), 0.0, 1.0)
+    alpha = np.clip(weight, 0.0, 1.0)
+    return (np.round(t * (_PRICE_STEPS - 1)) * _ALPHA_STEPS + np.round(alpha * (_ALPHA_STEPS - 1))).astype(np.uint8)
+
+def encode_png(index: np.ndarray, palette: Tuple[bytes, bytes] = _PALETTE) -> bytes:
+    """Minimal palette PNG with the "Up" filter
+
+    Smooth heatmaps are mostly zeros after Up-filtering, so zlib level 1
+    is both fast (~1 ms per tile) and small.
+    """
+    height, width = index.shape
+    raw = np.empty((height, width + 1), dtype=np.uint8)
+    raw[:, 0] = 2  # filter type Up: difference to the row above
+    raw[0, 1:] = index[0]
+    raw[1:, 1:] = index[1:] - index[:-1]
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)
+    rgb, alpha = palette
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"PLTE", rgb) + chunk(b"tRNS", alpha)
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 1)) + chunk(b"IEND", b""))
+
+EMPTY_TILE = encode_png(np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint8))
+
+def _kernels(radius: float, cell: float):
+    """Tapered IDW weights and the taper alone on a (2R+1)² cell stencil
+
+    w = (1 - d²/r²)² / (d² + ε): inverse distance squared, fading to zero at
+    the radius. The taper without 1/d² measures how much data is nearby.
+    """
+    reach = math.ceil(radius / cell)
+    offsets = np.arange(-reach, reach + 1) * cell
+    d2 = offsets[:, None] ** 2 + offsets[None, :] ** 2
+    taper = np.clip(1.0 - d2 / (radius * radius), 0.0, None) ** 2
+    return taper / (d2 + (radius / 16.0) ** 2), taper
+
+def _convolve(raster: np.ndarray, kernel: np.ndarray, size: int) -> np.ndarray:
+    """Central ``size``² window of the full 2D convolution (via FFT)"""
+    shape = (raster.shape[0] + kernel.shape[0] - 1,) * 2
+    full = np.fft.irfft2(np.fft.rfft2(raster, shape) * np.fft.rfft2(kernel, shape), shape)
+    start = kernel.shape[0] - 1
+    return full[start:start + size, start:start + size]
+
+def _upsample(values: np.ndarray, size: int) -> np.ndarray:
+    """Bilinear resize of a square grid (cell centres) to ``size`` x ``size`` pixels"""
+    n = values.shape[0]
+    pos = np.clip((np.arange(size) + 0.5) * n / size - 0.5, 0, n - 1)
+    i0 = np.floor(pos).astype(int)
+    i1 = np.minimum(i0 + 1, n - 1)
+    f = pos - i0
+    rows = values[i0] * (1 - f)[:, None] + values[i1] * f[:, None]
+    return rows[:, i0] * (1 - f)[None, :] + rows[:, i1] * f[None, :]
+
+def render_tile(lat: np.ndarray, lng: np.ndarray, price: np.ndarray, z: int, x: int, y: int,
+                scale: Tuple[float, float], grid: int = HEATMAP_GRID) -> bytes:
+    """PNG for tile z/x/y from the stations' coordinates and prices of one fuel"""
+    radius = radius_px(z, y)
+    px, py = project(lat, lng, z)
+    px = px - x * TILE_SIZE
+    py = py - y * TILE_SIZE
+    near = (px > -radius) & (px < TILE_SIZE + radius) & (py > -radius) & (py < TILE_SIZE + radius)
+    if not near.any():
+        return EMPTY_TILE
+    px, py, price = px[near], py[near], price[near]
+
+    # Snap stations to grid cells: count and price sum per cell, plus a margin of ``reach`` cells
+    cell = TILE_SIZE / grid
+    kernel, taper = _kernels(radius, cell)
+    reach = kernel.shape[0] // 2
+    side = grid + 2 * reach
+    cells = (np.floor(py / cell).astype(np.int64) + reach) * side + np.floor(px / cell).astype(np.int64) + reach
+    count = np.bincount(cells, minlength=side * side).reshape(side, side).astype(float)
+    price_sum = np.bincount(cells, weights=price, minlength=side * side).reshape(side, side)
+
+    # IDW for every grid cell at once: sum(w * price) / sum(w) as convolutions with the stencil
+    numerator = _convolve(price_sum, kernel, grid)
+    denominator = _convolve(count, kernel, grid)
+    coverage = _convolve(count, taper, grid)
+    coverage[coverage < 1e-6] = 0.0  # FFT round-off
+    if not coverage.any():
+        return EMPTY_TILE
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        value = np.where(coverage > 0, numerator / denominator, 0.0)
+    value = _upsample(value, TILE_SIZE)
+    coverage = _upsample(coverage, TILE_SIZE)
+    return encode_png(_colour_index(value, coverage, scale))
+
+# --- Snapshot + cache ---
+
+def price_scale(prices: np.ndarray) -> Tuple[float, float]:
+    """5th-95th percentile rounded outwards to 5 cents, so small moves keep the scale (and the cache)"""
+    if prices.size == 0:
+        return 1.5, 2.0
+    low, high = np.percentile(prices, [5, 95])
+    low = math.floor(low * 20) / 20
+    high = max(math.ceil(high * 20) / 20, low + 0.05)
+    return round(low, 2), round(high, 2)
+
+class _FuelLayer:
+    """Stations with a price for one fuel, plus per-region content hashes"""
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, price: np.ndarray):
+        order = np.lexsort((lng, lat))
+        self.lat, self.lng, self.price = lat[order], lng[order], price[order]
+        self.scale = price_scale(self.price)
+        rows = np.floor(self.lat / REGION_DEG).astype(np.int64)
+        cols = np.floor(self.lng / REGION_DEG).astype(np.int64)
+        self.regions: Dict[Tuple[int, int], bytes] = {}
+        if self.lat.size:
+            keys = rows * 100_000 + cols
+            grouped = np.argsort(keys, kind="stable")
+            starts = np.flatnonzero(np.r_[True, np.diff(keys[grouped]) != 0])
+            packed = np.column_stack((self.lat, self.lng, self.price))[grouped]
+            for begin, end in zip(starts, np.r_[starts[1:], grouped.size]):
+                first = grouped[begin]
+                self.regions[(int(rows[first]), int(cols[first]))] = hashlib.blake2b(
+                    packed[begin:end].tobytes(), digest_size=8).digest()
+
+    def fingerprint(self, z: int, x: int, y: int) -> bytes:
+        """Hash of the colour scale and every region the tile (plus radius) reads"""
+        radius = radius_px(z, y)
+        north, west = unproject(x * TILE_SIZE - radius, y * TILE_SIZE - radius, z)
+        south, east = unproject((x + 1) * TILE_SIZE + radius, (y + 1) * TILE_SIZE + radius, z)
+        row_range = range(math.floor(south / REGION_DEG), math.floor(north / REGION_DEG) + 1)
+        col_range = range(math.floor(west / REGION_DEG), math.floor(east / REGION_DEG) + 1)
+        digest = hashlib.blake2b(repr(self.scale).encode(), digest_size=16)
+        if len(row_range) * len(col_range) > len(self.regions):
+            keys = sorted(key for key in self.regions if key[0] in row_range and key[1] in col_range)
+        else:
+            keys = [(row, col) for row in row_range for col in col_range if (row, col) in self.regions]
+        for key in keys:
+            digest.update(self.regions[key])
+        return digest.digest()
+
+class HeatmapTiles:
+    """Price snapshot arrays per fuel and an LRU cache of rendered tiles"""
+
+    def __init__(self, max_entries: int = HEATMAP_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.version = 0
+        self._layers: Dict[str, _FuelLayer] = {}
+        self._tiles: "OrderedDict[Tuple[str, int, int, int], Tuple[bytes, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rendered = 0
+
+    def update(self, stations: Iterable[dict], fuel_types: Sequence[str]):
+        """Take a new price snapshot (list.php-shaped station dicts)"""
+        located = [s for s in stations if s.get("lat") is not None and s.get("lng") is not None]
+        layers = {}
+        for fuel in fuel_types:
+            priced = [s for s in located if s.get(fuel)]
+            layers[fuel] = _FuelLayer(np.array([s["lat"] for s in priced], dtype=float),
+                                      np.array([s["lng"] for s in priced], dtype=float),
+                                      np.array([s[fuel] for s in priced], dtype=float))
+        with self._lock:
+            self._layers = layers
+            self.version += 1
+
+    def lookup(self, fuel_type: str, z: int, x: int, y: int) -> Tuple[Optional[bytes], Optional[bytes]]:
+        """(cached PNG or None, fingerprint of the tile's current inputs)"""
+        layer = self._layers.get(fuel_type)
+        if layer is None:
+            return EMPTY_TILE, None
+        fingerprint = layer.fingerprint(z, x, y)
+        key = (fuel_type, z, x, y)
+        with self._lock:
+            entry = self._tiles.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                self._tiles.move_to_end(key)
+                self.hits += 1
+                return entry[1], fingerprint
+            self.misses += 1
+        return None, fingerprint
+
+    def render(self, fuel_type: str, z: int, x: int, y: int) -> bytes:
+        """Render a tile from the current snapshot and cache it"""
+        layer = self._layers[fuel_type]
+        fingerprint = layer.fingerprint(z, x, y)
+        png = render_tile(layer.lat, layer.lng, layer.price, z, x, y, layer.scale)
+        with self._lock:
+            self.rendered += 1
+            self._tiles[(fuel_type, z, x, y)] = (fingerprint, png)
+            self._tiles.move_to_end((fuel_type, z, x, y))
+            while len(self._tiles) > self.max_entries:
+                self._tiles.popitem(last=False)
+        return png
+
+    def scales(self) -> Dict[str, List[float]]:
+        return {fuel: list(layer.scale) for fuel, layer in self._layers.items()}
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "snapshot_version": self.version,
+                "stations": {fuel: int(layer.price.size) for fuel, layer in self._layers.items()},
+                "scales": self.scales(),
+                "entries": len(self._tiles),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "rendered": self.rendered,
+            }
+
+heatmap_tiles = HeatmapTiles()
@@ -0,0 +1,43 @@
+"""Conditional GET: strong ETags from data versions
+
+An endpoint derives its ETag from the version of the data a response is built
+from (a price fingerprint, a user's fuel-log version) plus the request
+parameters, *before* it builds the body. A matching ``If-None-Match`` gets a
+bodiless 304, so neither the body nor its JSON serialization is computed.
+
+A strong ETag promises byte-identical bodies, which a gzip or brotli variant
+is not. ``CompressionMiddleware`` therefore sends the ``weak`` form with
+encoded responses; ``matches`` accepts both forms.
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+# Per-user data: the browser may store it, but has to revalidate before every use
+PRIVATE = "private, no-cache"
+
+def make_etag(*parts) -> str:
+    """Strong ETag from the reprs of ``parts`` (versions, IDs, parameters)"""
+    return '"' + hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest() + '"'
+
+def weak(etag: str) -> str:
+    """``W/"..."``: same validator, but only semantically equivalent bodies (e.g. another Content-Encoding)"""
+    return etag if etag.startswith("W/") else "W/" + etag
+
+def matches(request: Request, etag: str) -> bool:
+    """``If-None-Match`` lists ``etag`` (weak comparison, as RFC 9110 prescribes for it) or is ``*``"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+def not_modified(request: Request, response: Response, etag: str, cache_control: str = PRIVATE) -> Optional[Response]:
+    """A 304 if the client already has ``etag``; otherwise None, with the validators set on ``response``"""
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Authorization"}
+    if matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,270 @@
+"""Background price ingestion
+
+On a fixed schedule the worker collects every active ``UserSettings`` location
+and every ``FavoriteLocation``, merges them into as few list.php query circles
+(max 25 km) as possible and refreshes those circles into the local
+``Station``/``PriceSnapshot`` store. Upstream traffic then depends on the
+covered area, not on how often users open the app.
+
+Full station records are only re-listed (list.php) every
+``STATION_RELIST_INTERVAL``; in between, circles whose station IDs are known
+get a price-only refresh through prices.php (10 IDs per call).
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from . import models
+from .database import SessionLocal
+from .geo import haversine_km, KM_PER_DEGREE_LAT, km_per_degree_lng
+from .station_store import store_stations, store_prices, rebuild_index, coverage
+from .price_history import price_history
+from .providers import StationProvider
+
+logger = logging.getLogger(__name__)
+
+MAX_QUERY_RADIUS = 25.0  # Tankerkoenig limit
+FAVORITE_RADIUS = 5.0  # Radius used by the favorite-location endpoints
+
+INGEST_INTERVAL = float(os.getenv("INGEST_INTERVAL", "300"))  # seconds
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+STATION_RELIST_INTERVAL = float(os.getenv("STATION_RELIST_INTERVAL", "21600"))  # 6 h
+
+Circle = Tuple[float, float, float]  # lat, lng, radius km
+
+def demand_circles(db) -> List[Circle]:
+    """All circles users may ask about: active settings + favorite locations"""
+    circles = []
+    settings = db.query(
+        models.UserSettings.latitude, models.UserSettings.longitude, models.UserSettings.radius
+    ).filter(
+        models.UserSettings.is_active == True,
+        models.UserSettings.latitude != None,
+        models.UserSettings.longitude != None
+    ).all()
+    for lat, lng, radius in settings:
+        circles.append((lat, lng, min(radius or 5.0, MAX_QUERY_RADIUS)))
+
+    favorites = db.query(models.FavoriteLocation.latitude, models.FavoriteLocation.longitude).filter(
+        models.FavoriteLocation.latitude != None,
+        models.FavoriteLocation.longitude != None
+    ).all()
+    for lat, lng in favorites:
+        circles.append((lat, lng, FAVORITE_RADIUS))
+
+    # Identical circles (same town, same radius) only need to be considered once
+    return sorted(set((round(lat, 4), round(lng, 4), radius) for lat, lng, radius in circles))
+
+def _enclosing_circle(members: List[Circle]) -> Circle:
+    """Small circle around all member circles (bounding-box center)"""
+    ref_lat = sum(m[0] for m in members) / len(members)
+    kx = km_per_degree_lng(ref_lat)
+    min_x = min(m[1] * kx - m[2] for m in members)
+    max_x = max(m[1] * kx + m[2] for m in members)
+    min_y = min(m[0] * KM_PER_DEGREE_LAT - m[2] for m in members)
+    max_y = max(m[0] * KM_PER_DEGREE_LAT + m[2] for m in members)
+    lat = (min_y + max_y) / 2 / KM_PER_DEGREE_LAT
+    lng = (min_x + max_x) / 2 / kx
+    radius = max(haversine_km(lat, lng, m[0], m[1]) + m[2] for m in members)
+    return lat, lng, radius
+
+def covering_circles(demands: List[Circle], max_radius: float = MAX_QUERY_RADIUS) -> List[Circle]:
+    """Greedy cover of the demand circles with as few query circles as possible
+
+    Each round seeds a cluster with the largest uncovered circle and adds the
+    nearest remaining circles as long as the enclosing circle stays within
+    ``max_radius``.
+    """
+    remaining = sorted(demands, key=lambda c: -c[2])
+    result = []
+    while remaining:
+        seed = remaining.pop(0)
+        members = [seed]
+        cover = (seed[0], seed[1], min(seed[2], max_radius))
+        rest = []
+        for candidate in sorted(remaining, key=lambda c: haversine_km(seed[0], seed[1], c[0], c[1])):
+            if haversine_km(seed[0], seed[1], candidate[0], candidate[1]) > 2 * max_radius:
+                rest.append(candidate)
+                continue
+            if haversine_km(cover[0], cover[1], candidate[0], candidate[1]) + candidate[2] <= cover[2] + 1e-9:
+                members.append(candidate)  # already inside
+                continue
+            trial = _enclosing_circle(members + [candidate])
+            if trial[2] <= max_radius:
+                members.append(candidate)
+                cover = trial
+            else:
+                rest.append(candidate)
+        result.append((round(cover[0], 6), round(cover[1], 6), round(min(math.ceil(cover[2] * 100) / 100, max_radius), 2)))
+        remaining = rest
+    return result
+
+class IngestWorker:
+    """Periodic refresh of all covering circles into the local store"""
+
+    def __init__(self, interval: float = INGEST_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self.runs = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_circle_count = 0
+        self.last_station_count = 0
+        self.last_changed_count = 0
+        self.last_listed_circles = 0
+        self.last_price_only_circles = 0
+        self.listeners = []  # coroutine functions, awaited with the list of price changes after every refresh
+        # circle -> (monotonic time of last list.php, station IDs in it)
+        self._listings: Dict[Circle, Tuple[float, List[str]]] = {}
+
+    def start(self, provider: StationProvider):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run(provider))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Refresh now (e.g. after a user added a new location)"""
+        self._wake.set()
+
+    @property
+    def max_age(self) -> float:
+        """Coverage older than this is not trusted by the request path"""
+        return self.interval * 3
+
+    async def _run(self, provider: StationProvider):
+        while True:
+            try:
+                await self.refresh(provider)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception("Ingestion failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def refresh(self, provider: StationProvider):
+        started = time.monotonic()
+        circles = await asyncio.to_thread(self._load_circles)
+
+        now = time.monotonic()
+        self._listings = {c: listing for c, listing in self._listings.items() if c in circles}
+        relist = [c for c in circles
+                  if c not in self._listings or now - self._listings[c][0] > STATION_RELIST_INTERVAL]
+        reprice = [c for c in circles if c not in relist]
+
+        semaphore = asyncio.Semaphore(INGEST_CONCURRENCY)
+
+        async def fetch(circle: Circle):
+            async with semaphore:
+                # Background work may queue for upstream tokens for up to one interval
+                return await provider.list_stations(circle[0], circle[1], circle[2], max_wait=self.interval)
+
+        listed = await asyncio.gather(*(fetch(c) for c in relist), return_exceptions=True)
+
+        # Price-only refresh for every station ID we already know in the other circles
+        price_ids = list(dict.fromkeys(sid for c in reprice for sid in self._listings[c][1]))
+        prices, price_error = {}, None
+        if price_ids:
+            try:
+                prices = await provider.prices(price_ids, max_wait=self.interval)
+            except Exception as e:
+                price_error = e
+
+        fetched_at = datetime.utcnow()
+        stations, refreshed, errors = [], [], []
+        for circle, result in zip(relist, listed):
+            if isinstance(result, Exception):
+                errors.append(f"{circle}: {result}")
+                continue
+            stations.extend(result)
+            refreshed.append(circle)
+            self._listings[circle] = (now, [s["id"] for s in result if s.get("id")])
+        if price_error is not None:
+            errors.append(f"prices.php: {price_error}")
+        else:
+            refreshed.extend(reprice)
+
+        changes = await asyncio.to_thread(self._store, stations, prices, fetched_at)
+        changed = len(changes)
+        coverage.replace(refreshed)
+
+        self.runs += 1
+        self.last_run_at = fetched_at
+        self.last_duration = round(time.monotonic() - started, 3)
+        self.last_error = "; ".join(errors) if errors else None
+        self.last_circle_count = len(refreshed)
+        self.last_station_count = len({s.get("id") for s in stations} | set(prices))
+        self.last_changed_count = changed
+        self.last_listed_circles = len(relist)
+        self.last_price_only_circles = len(reprice)
+        logger.info("Ingestion run", extra={
+            "circles": len(refreshed), "circles_total": len(circles), "listed": len(relist),
+            "price_only": len(reprice), "stations": self.last_station_count, "price_changes": changed,
+            "duration_s": self.last_duration,
+        })
+
+        for listener in self.listeners:
+            try:
+                await listener(changes)
+            except Exception:
+                logger.exception("Ingestion listener failed", extra={"listener": getattr(listener, "__name__", repr(listener))})
+
+    def _load_circles(self) -> List[Circle]:
+        db = SessionLocal()
+        try:
+            return covering_circles(demand_circles(db))
+        finally:
+            db.close()
+
+    def _store(self, stations: List[dict], prices: Dict[str, dict], fetched_at: datetime) -> List[dict]:
+        db = SessionLocal()
+        try:
+            changes = store_stations(db, stations, fetched_at)
+            changes += store_prices(db, prices, fetched_at)
+            price_history.record(db, changes, fetched_at)
+            db.commit()
+            price_history.maintain(db)  # throttled downsampling + retention
+            rebuild_index(db)
+            return changes
+        finally:
+            db.close()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_duration_seconds": self.last_duration,
+            "last_error": self.last_error,
+            "circles": self.last_circle_count,
+            "stations": self.last_station_count,
+            "changed_prices": self.last_changed_count,
+            "listed_circles": self.last_listed_circles,
+            "price_only_circles": self.last_price_only_circles,
+            "relist_interval_seconds": STATION_RELIST_INTERVAL,
+        }
+
+ingest_worker = IngestWorker()
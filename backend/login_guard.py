@@ -0,0 +1,73 @@
+"""Per-IP login rate limiting and login latency percentiles"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict
+
+LOGIN_RATE_LIMIT = int(os.getenv("LOGIN_RATE_LIMIT", "10"))  # attempts per window and IP
+LOGIN_RATE_WINDOW = float(os.getenv("LOGIN_RATE_WINDOW", "60"))  # seconds
+
+class LoginRateLimiter:
+    """Sliding window of attempt timestamps per client IP"""
+
+    def __init__(self, limit: int = LOGIN_RATE_LIMIT, window: float = LOGIN_RATE_WINDOW,
+                 max_clients: int = 10_000):
+        self.limit = limit
+        self.window = window
+        self.max_clients = max_clients
+        self._attempts: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def retry_after(self, ip: str) -> float:
+        """Record an attempt; 0 if allowed, else seconds until the next one is"""
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._attempts.get(ip)
+            if attempts is None:
+                if len(self._attempts) >= self.max_clients:
+                    self._prune(now)
+                attempts = self._attempts[ip] = deque()
+            while attempts and now - attempts[0] >= self.window:
+                attempts.popleft()
+            if len(attempts) >= self.limit:
+                self.limited += 1
+                return self.window - (now - attempts[0])
+            attempts.append(now)
+            return 0.0
+
+    def _prune(self, now: float):
+        for ip in [ip for ip, attempts in self._attempts.items()
+                   if not attempts or now - attempts[-1] >= self.window]:
+            del self._attempts[ip]
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "window_seconds": self.window,
+                "tracked_clients": len(self._attempts), "limited": self.limited}
+
+class LatencyStats:
+    """Keeps the most recent durations and reports percentiles in ms"""
+
+    def __init__(self, size: int = 1000):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+        self.count += 1
+
+    def percentiles(self) -> dict:
+        samples = sorted(self._samples)
+        if not samples:
+            return {"count": self.count}
+
+        def percentile(p: float) -> float:
+            return round(samples[min(len(samples) - 1, math.ceil(p * len(samples)) - 1)] * 1000, 1)
+
+        return {"count": self.count, "p50_ms": percentile(0.5), "p90_ms": percentile(0.9),
+                "p99_ms": percentile(0.99), "max_ms": round(samples[-1] * 1000, 1)}
+
+login_limiter = LoginRateLimiter()
+login_latency = LatencyStats()
@@ -0,0 +1,56 @@
+"""Leveled, structured logging for the ``backend`` package
+
+Modules log through ``logging.getLogger(__name__)`` and pass data as fields:
+``logger.info("Stations found", extra={"count": 12})``. ``configure_logging``
+installs one stderr handler on the ``backend`` logger:
+
+* ``LOG_FORMAT=text`` (default): ``time LEVEL logger: message key=value ...``
+* ``LOG_FORMAT=json``: one JSON object per line, with the fields as keys
+
+``LOG_LEVEL`` (default INFO) sets the threshold; per-request detail is DEBUG.
+"""
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+def fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        extra = fields(record)
+        return super().formatMessage(record) + "".join(f" {key}={value}" for key, value in extra.items())
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **fields(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    logger = logging.getLogger("backend")
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False  # uvicorn configures the root logger separately
@@ -1,17 +1,48 @@
-from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks, Request, Response, UploadFile, File
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import base64
+import hmac
+import logging
+import math
 import os
-import requests
+import time
 
 from . import models, auth, database
 from .database import engine, get_db
+from .station_cache import station_cache, filter_stations
+from .upstream import tankerkoenig, UpstreamError, UpstreamUnavailable
+from .providers import provider
+from .singleflight import price_flights, tile_flights
+from .station_store import (query_stations, sort_stations, dashboard_station, dashboard_columns, station_columns,
+                            oldest_reading, price_fingerprint, index_size, coverage, rebuild_index, FUEL_TYPES)
+from .ingest import ingest_worker, FAVORITE_RADIUS
+from .events import price_broadcaster, format_sse, KEEPALIVE_SECONDS
+from .alerts import alert_engine
+from .principal_cache import principal_cache
+from .passwords import password_hasher, HasherOverloaded
+from .login_guard import login_limiter, login_latency
+from .price_history import price_history, hour_of_day_profile, cheaper_than
+from .heatmap import heatmap_tiles, MAX_ZOOM as HEATMAP_MAX_ZOOM
+from .http_cache import make_etag, not_modified
+from .fast_json import json_response
+from .schemas import (CheckPricesResponse, SearchStationsResponse, FavoritePricesResponse, LocationPrices,
+                      RouteStationsResponse, StationHistoryResponse, AreaHistoryResponse)
+from .compression import CompressionMiddleware, PrecompressedStaticFiles
+from .logs import configure_logging
+from .metrics import MetricsMiddleware, instrument_engine, registry as metrics_registry, METRICS_TOKEN
+from .profiler import profiler, run_in_threadpool, PROFILER_ENABLED
+from . import fuel_stats, fuel_io, consumption, migrate, route
 
-# Create tables
-models.Base.metadata.create_all(bind=engine)
+configure_logging()
+logger = logging.getLogger(__name__)
+instrument_engine(engine)
 
 app = FastAPI(title="L8teFuel API")
 
@@ -22,24 +53,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+# gzip (or brotli) for JSON/text responses; registered last, so it wraps everything else
+app.add_middleware(CompressionMiddleware)
+# Outermost: request latency includes compression
+app.add_middleware(MetricsMiddleware, profiler=profiler)
 
 # Initial Admin Creation & Database Setup
 @app.on_event("startup")
 def create_initial_admin():
-    """Erstellt Datenbank-Tabellen und Admin-User beim Server-Start"""
+    """Prüft das Datenbank-Schema und erstellt den Admin-User beim Server-Start"""
     try:
-        # 1. Erstelle alle Tabellen falls sie nicht existieren
-        print("🔄 Erstelle Datenbank-Tabellen...")
-        models.Base.metadata.create_all(bind=engine)
-        print("✅ Datenbank-Tabellen erstellt/überprüft")
+        # 1. Schema wird per Migration angelegt (python -m backend.migrate upgrade)
+        if os.getenv("AUTO_MIGRATE") == "1":
+            migrate.upgrade(engine)  # nur für lokale Entwicklung
+        migrate.ensure_current(engine)
+        logger.info("Datenbank-Schema aktuell")
         
         # 2. Erstelle Admin-User falls er nicht existiert
         db = next(database.get_db())
         admin = db.query(models.User).filter(models.User.username == "admin").first()
         
         if not admin:
-            print("🔄 Erstelle Admin-User...")
+            logger.info("Erstelle Admin-User")
             hashed_pw = auth.get_password_hash("admin123")
             new_admin = models.User(username="admin", hashed_password=hashed_pw, is_admin=True)
             db.add(new_admin)
@@ -51,27 +88,102 @@ def create_initial_admin():
             db.add(settings)
             db.commit()
             
-            print("✅ Admin-User erstellt: admin / admin123")
+            logger.warning("Admin-User erstellt: admin / admin123 (Passwort ändern!)")
         else:
-            print("✅ Admin-User existiert bereits")
+            logger.info("Admin-User existiert bereits")
             
-    except Exception as e:
-        print(f"❌ Fehler beim Startup: {e}")
+    except Exception:
+        logger.exception("Fehler beim Startup")
         raise
 
+@app.on_event("startup")
+async def start_upstream_client():
+    """Opens the shared, pooled Tankerkoenig HTTP client"""
+    await tankerkoenig.start()
+    if provider.is_fake:
+        logger.warning("Using MOCK data: simulated stations, no valid TANKERKOENIG_API_KEY configured. "
+                       "Get one at https://creativecommons.tankerkoenig.de")
+    if PROFILER_ENABLED:
+        profiler.enable()
+
+async def publish_price_changes(changes: List[dict]):
+    """Push deltas of the freshly ingested prices to all SSE subscribers"""
+    db = database.SessionLocal()
+    try:
+        await price_broadcaster.publish(lambda lat, lng, radius: query_stations(db, lat, lng, radius))
+    finally:
+        db.close()
+
+def _evaluate_price_alerts(changes: List[dict]):
+    db = database.SessionLocal()
+    try:
+        alert_engine.rebuild(db)
+    finally:
+        db.close()
+    alert_engine.evaluate(changes)
+
+async def evaluate_price_alerts(changes: List[dict]):
+    """Check all active users' target prices against the ingested price changes"""
+    await asyncio.to_thread(_evaluate_price_alerts, changes)
+
+@app.on_event("startup")
+async def start_ingest_worker():
+    """Starts the background price ingestion (not for the fake provider: its stations must not enter the store)"""
+    if not provider.is_fake and os.getenv("INGEST_ENABLED", "1") != "0":
+        ingest_worker.listeners.append(publish_price_changes)
+        ingest_worker.listeners.append(evaluate_price_alerts)
+        ingest_worker.start(provider)
+
+@app.on_event("shutdown")
+async def close_upstream_client():
+    await ingest_worker.stop()
+    await tankerkoenig.close()
+    password_hasher.shutdown()
+    profiler.disable()
+
 # --- Auth Endpoints ---
 
+def hasher_overloaded() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                         detail="Authentication is busy, please retry", headers={"Retry-After": "1"})
+
+async def hash_password(password: str) -> str:
+    """bcrypt in the bounded password pool; 503 when it is saturated"""
+    try:
+        return await password_hasher.hash(password)
+    except HasherOverloaded:
+        raise hasher_overloaded()
+
 @app.post("/token")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    access_token = auth.create_access_token(data={"sub": user.username})
-    return {"access_token": access_token, "token_type": "bearer", "is_admin": user.is_admin}
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    # Behind a proxy this is the X-Forwarded-For client only if uvicorn trusts the proxy
+    # (--proxy-headers --forwarded-allow-ips, see DEPLOYMENT.md); otherwise it is the proxy itself
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = login_limiter.retry_after(client_ip)
+    if retry_after:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many login attempts",
+                            headers={"Retry-After": str(math.ceil(retry_after))})
+    
+    started = time.perf_counter()
+    try:
+        user = db.query(models.User.username, models.User.hashed_password, models.User.is_admin).filter(
+            models.User.username == form_data.username
+        ).first()
+        db.close()  # don't hold a pooled connection while waiting for bcrypt
+        try:
+            valid = user is not None and await password_hasher.verify(form_data.password, user.hashed_password)
+        except HasherOverloaded:
+            raise hasher_overloaded()
+        if not valid:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Incorrect username or password",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        access_token = auth.create_access_token(data={"sub": user.username})
+        return {"access_token": access_token, "token_type": "bearer", "is_admin": user.is_admin}
+    finally:
+        login_latency.observe(time.perf_counter() - started)
 
 # --- User Management (Admin only) ---
 
@@ -81,7 +193,7 @@ async def create_user(username: str, password: str, current_admin: models.User =
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    hashed_pw = auth.get_password_hash(password)
+    hashed_pw = await hash_password(password)
     new_user = models.User(username=username, hashed_password=hashed_pw, is_admin=False)
     db.add(new_user)
     db.commit()
@@ -95,19 +207,28 @@ async def create_user(username: str, password: str, current_admin: models.User =
 
 @app.get("/admin/users")
 async def list_users(current_admin: models.User = Depends(auth.get_current_admin), db: Session = Depends(get_db)):
-    return db.query(models.User).all()
+    users = db.query(models.User.username, models.User.is_admin).order_by(models.User.id)
+    return [{"username": username, "is_admin": is_admin} for username, is_admin in users]
 
 @app.put("/admin/users/{username}/reset-password")
 async def reset_password(username: str, new_password: str, current_admin: models.User = Depends(auth.get_current_admin), db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.username == username).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    user.hashed_password = auth.get_password_hash(new_password)
+    user.hashed_password = await hash_password(new_password)
     db.commit()
+    principal_cache.invalidate(username)
     return {"message": "Password reset successfully"}
 
 # --- User Endpoints ---
 
+def user_settings(db: Session, user: models.User) -> models.UserSettings:
+    """The user's settings row in this session, for changes (``current_user`` may be a cached copy)"""
+    settings = db.query(models.UserSettings).filter(models.UserSettings.user_id == user.id).first()
+    if settings is None:
+        raise HTTPException(status_code=404, detail="Settings not found")
+    return settings
+
 @app.get("/me")
 async def get_me(current_user: models.User = Depends(auth.get_current_user)):
     return {
@@ -124,8 +245,11 @@ async def get_me(current_user: models.User = Depends(auth.get_current_user)):
 
 @app.put("/me/password")
 async def change_password(new_password: str, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    current_user.hashed_password = auth.get_password_hash(new_password)
+    hashed_pw = await hash_password(new_password)
+    # current_user may be the principal cache's read-only copy: write through this session
+    db.query(models.User).filter(models.User.id == current_user.id).update({models.User.hashed_password: hashed_pw})
     db.commit()
+    principal_cache.invalidate(current_user.username)
     return {"message": "Password updated successfully"}
 
 @app.put("/me/settings")
@@ -136,12 +260,15 @@ async def update_settings(latitude: Optional[float] = None,
                          is_active: Optional[bool] = None,
                          current_user: models.User = Depends(auth.get_current_user), 
                          db: Session = Depends(get_db)):
-    if latitude is not None: current_user.settings.latitude = latitude
-    if longitude is not None: current_user.settings.longitude = longitude
-    if radius is not None: current_user.settings.radius = radius
-    if target_price is not None: current_user.settings.target_price = target_price
-    if is_active is not None: current_user.settings.is_active = is_active
+    settings = user_settings(db, current_user)
+    if latitude is not None: settings.latitude = latitude
+    if longitude is not None: settings.longitude = longitude
+    if radius is not None: settings.radius = radius
+    if target_price is not None: settings.target_price = target_price
+    if is_active is not None: settings.is_active = is_active
     db.commit()
+    principal_cache.invalidate(current_user.username)
+    ingest_worker.wake()  # pick up the new area without waiting for the next cycle
     return {"message": "Settings updated"}
 
 @app.get("/debug/settings")
@@ -160,113 +287,225 @@ async def debug_settings(current_user: models.User = Depends(auth.get_current_us
         "api_config": {
             "has_api_key": bool(api_key),
             "api_key_preview": api_key[:8] + "..." if api_key else None,
-            "is_test_key": api_key.startswith("0000") if api_key else False
+            "is_test_key": api_key.startswith("0000") if api_key else False,
+            "provider": provider.name,
+            "is_mock": provider.is_fake
         }
     }
 
 # --- Fuel Price Logic ---
 
-@app.get("/check-prices")
-async def check_prices(current_user: models.User = Depends(auth.get_current_user)):
-    """Returns ALL stations in radius for map display (Dashboard)"""
+async def fetch_stations(lat: float, lng: float, radius: float, max_wait: Optional[float] = None) -> List[dict]:
+    """Raw list.php stations within radius (nearest first), served from the shared cache when possible
+
+    ``max_wait``: seconds the upstream call may queue for a rate-limit token (governor default if None).
+    """
+    cached = station_cache.get(lat, lng, radius)
+    if cached is not None:
+        return cached
+
+    # Fetch the whole quantized cell so neighbours in the same cell share the entry
+    key = station_cache.key_for(lat, lng, radius)
+    query_lat, query_lng, query_radius = station_cache.query_circle(lat, lng, radius)
+
+    async def load():
+        stations = await provider.list_stations(query_lat, query_lng, query_radius, max_wait=max_wait)
+        fetched_at = datetime.utcnow()
+        for station in stations:
+            station["fetched_at"] = fetched_at
+        station_cache.put(key, query_lat, query_lng, query_radius, stations)
+        return stations
+
+    # Identical concurrent lookups (same upstream circle + sort) share one call
+    flight = (query_lat, query_lng, query_radius, "dist")
+
+    # Just expired: answer from the old entry and refresh it in the background (stale-while-revalidate)
+    recent = station_cache.get_stale(lat, lng, radius, station_cache.revalidate_window)
+    if recent is not None:
+        revalidation = asyncio.ensure_future(price_flights.do(flight, load))
+        revalidation.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return recent
+
+    stations = await price_flights.do(flight, load)
+    return filter_stations(stations, lat, lng, radius)
+
+def last_known_stations(db: Session, lat: float, lng: float, radius: float) -> Optional[List[dict]]:
+    """Last known good data while the upstream fails: an expired cache entry, else the local store"""
+    stations = station_cache.get_stale(lat, lng, radius, station_cache.stale_ttl)
+    if stations is None:
+        stations = query_stations(db, lat, lng, radius) or None
+    if stations is None:
+        return None
+    return [dict(station, stale=True) for station in stations]
+
+async def load_stations(db: Session, lat: float, lng: float, radius: float,
+                        sort: str = "dist", fuel_type: Optional[str] = None,
+                        max_wait: Optional[float] = None) -> List[dict]:
+    """Stations within radius: from the local store if the area is ingested, live otherwise
+
+    If the upstream call fails (or the circuit breaker refuses it), the last
+    known stations are returned with ``stale=True``; UpstreamError is only
+    raised when there is nothing to fall back to.
+    """
+    if coverage.covers(lat, lng, radius, ingest_worker.max_age):
+        return query_stations(db, lat, lng, radius, sort=sort, fuel_type=fuel_type)
+    try:
+        stations = await fetch_stations(lat, lng, radius, max_wait)
+    except UpstreamError as e:
+        stations = last_known_stations(db, lat, lng, radius)
+        if stations is None:
+            raise
+        if not isinstance(e, UpstreamUnavailable):
+            logger.warning("Upstream failed, serving stale stations", extra={"error": str(e), "stations": len(stations)})
+    return sort_stations(stations, sort, fuel_type)
+
+def freshness(stations: List[dict]) -> dict:
+    """How old the oldest price reading in a response is, and whether it is a stale fallback"""
+    oldest = oldest_reading(stations)
+    stale = any(s.get("stale") for s in stations)
+    if oldest is None:
+        return {"updated_at": None, "age_seconds": None, "stale": stale}
+    return {"updated_at": oldest.isoformat(), "age_seconds": round((datetime.utcnow() - oldest).total_seconds()),
+            "stale": stale}
+
+STATION_FORMATS = ("full", "compact")
+
+def check_station_format(format: str):
+    if format not in STATION_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(STATION_FORMATS)}")
+
+def mock_notice() -> dict:
+    """Marks answers built from the fake provider's simulated stations"""
+    return {"debug": "Using MOCK data - configure real API key"} if provider.is_fake else {}
+
+@app.get("/check-prices", response_model=CheckPricesResponse)
+async def check_prices(request: Request, response: Response, format: str = "full",
+                       current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    """Returns ALL stations in radius for map display (Dashboard)
+
+    The ETag covers the settings and the price readings, so an unchanged poll
+    gets a 304. ``age_seconds`` is then as of the cached copy; ``updated_at``
+    stays exact. ``format=compact`` sends ``columns`` (parallel arrays, see
+    ``StationColumns``) instead of ``all_stations``.
+    """
+    check_station_format(format)
     if not current_user.settings.is_active or not current_user.settings.latitude:
-        return {"status": "inactive", "all_stations": []}
-    
-    api_key = os.getenv("TANKERKOENIG_API_KEY")
+        return json_response({"status": "inactive", "all_stations": []}, CheckPricesResponse)
     
     # Validate radius (Tankerkoenig API max is 25 km)
     search_radius = min(current_user.settings.radius, 25.0)
-    
-    # Simple Mock fallback / Warning if no key
-    if not api_key or api_key.startswith("0000"):
-        print(f"⚠️  WARNING: Using MOCK data - No valid API key configured!")
-        print(f"   Current API Key: {api_key}")
-        print(f"   Get a real API key from: https://creativecommons.tankerkoenig.de")
-        # Keep the mock for testing if no valid key is provided
-        mock_stations = [
-            {"name": "MOCK (No API Key) - Shell", "price": 1.65, "distance": 1.2, "lat": current_user.settings.latitude + 0.01, "lng": current_user.settings.longitude + 0.01},
-            {"name": "MOCK (No API Key) - Aral", "price": 1.58, "distance": 3.4, "lat": current_user.settings.latitude + 0.03, "lng": current_user.settings.longitude + 0.02},
-            {"name": "MOCK (No API Key) - Esso", "price": 1.72, "distance": 2.1, "lat": current_user.settings.latitude + 0.02, "lng": current_user.settings.longitude + 0.015},
-        ]
-        # Return ALL stations for map display
-        all_in_radius = [s for s in mock_stations if s["distance"] <= current_user.settings.radius]
-        return {"status": "active", "all_stations": all_in_radius, "target_price": current_user.settings.target_price, "debug": "Using MOCK data - configure real API key"}
 
     try:
-        url = "https://creativecommons.tankerkoenig.de/json/list.php"
-        params = {
-            "lat": current_user.settings.latitude,
-            "lng": current_user.settings.longitude,
-            "rad": search_radius,
-            "sort": "dist",
-            "type": "all",
-            "apikey": api_key
-        }
-        
-        print(f"🔍 Tankerkoenig API Request:")
-        print(f"   Location: {params['lat']}, {params['lng']}")
-        print(f"   Radius: {params['rad']} km")
-        print(f"   API Key: {api_key[:8]}...")
-        
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
-        
-        print(f"📡 API Response Status: {response.status_code}")
-        print(f"   OK: {data.get('ok')}")
-        print(f"   Message: {data.get('message', 'N/A')}")
-        
-        if not data.get("ok"):
-            error_msg = data.get("message", "Unknown API error")
-            print(f"❌ API Error: {error_msg}")
-            print(f"   Full response: {data}")
-            return {"status": "api_error", "all_stations": [], "error": error_msg}
-
-        stations = data.get("stations", [])
-        print(f"✅ Found {len(stations)} stations from API")
-        
-        all_stations = []
-        
-        for s in stations:
-            if not s.get("isOpen", True):
-                continue
-
-            # Default priority: E10 -> E5 -> Diesel
-            price = s.get("e10")
-            if not price: price = s.get("e5")
-            if not price: price = s.get("diesel")
-            
-            # Skip if no price found (e.g. station doesn't sell standard fuels)
-            if not price:
-                 continue
+        try:
+            stations = await load_stations(db, current_user.settings.latitude, current_user.settings.longitude, search_radius)
+        except UpstreamError as e:
+            logger.warning("Station lookup failed", extra={"error": str(e)})
+            return json_response({"status": "api_error", "all_stations": [], "error": str(e)}, CheckPricesResponse)
 
-            # Return ALL stations (no price filtering here)
-            all_stations.append({
-                "name": f"{s.get('brand')} - {s.get('street')} {s.get('houseNumber', '')}", 
-                "price": price, 
-                "distance": s.get("dist"), 
-                "lat": s.get("lat"), 
-                "lng": s.get("lng")
-            })
+        settings = current_user.settings
+        etag = make_etag("check-prices", current_user.id, settings.latitude, settings.longitude, search_radius,
+                         settings.target_price, format, price_fingerprint(stations))
+        cached = not_modified(request, response, etag)
+        if cached is not None:
+            return cached
         
-        print(f"📍 Returning {len(all_stations)} stations for map display")
-        return {"status": "active", "all_stations": all_stations, "target_price": current_user.settings.target_price}
+        # Return ALL stations (no price filtering here)
+        if format == "compact":
+            listing = {"columns": dashboard_columns(stations)}
+        else:
+            listing = {"all_stations": [entry for entry in map(dashboard_station, stations) if entry]}
+        logger.debug("Dashboard stations", extra={"found": len(stations), "radius_km": search_radius, "format": format})
+        return json_response({"status": "active", **listing, "target_price": current_user.settings.target_price,
+                              **freshness(stations), **mock_notice()}, CheckPricesResponse, response)
 
     except Exception as e:
-        print(f"❌ Error fetching prices: {e}")
-        import traceback
-        traceback.print_exc()
-        return {"status": "error", "all_stations": [], "error": str(e)}
+        logger.exception("Error fetching prices")
+        return json_response({"status": "error", "all_stations": [], "error": str(e)}, CheckPricesResponse)
+
+@app.post("/prices/stream/ticket")
+async def price_stream_ticket(current_user: models.User = Depends(auth.get_current_user)):
+    """Short-lived ticket for /prices/stream (EventSource cannot send the Authorization header)"""
+    return {"ticket": auth.create_stream_ticket(current_user.username),
+            "expires_in": auth.STREAM_TICKET_EXPIRE_SECONDS}
 
-@app.get("/search-stations")
+@app.get("/prices/stream")
+async def price_stream(
+    request: Request,
+    ticket: str,
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    radius: Optional[float] = None
+):
+    """Server-Sent Events: snapshot once, then only price deltas and target-price alerts
+
+    ``ticket`` comes from POST /prices/stream/ticket. Deltas are computed from
+    the ingestion store, so only areas the ingestion currently covers can be
+    streamed; for others (e.g. a location not ingested yet) the client polls.
+    """
+    db = database.SessionLocal()
+    try:
+        current_user = auth.user_from_stream_ticket(ticket, db)
+        settings = current_user.settings
+        area_lat = lat if lat is not None else settings.latitude
+        area_lng = lng if lng is not None else settings.longitude
+        area_radius = min(radius if radius is not None else settings.radius, 25.0)
+        target_price = settings.target_price
+
+        if not ingest_worker.running:
+            # Clients fall back to polling /check-prices
+            raise HTTPException(status_code=503, detail="Price stream unavailable")
+        if not area_lat or not area_lng:
+            raise HTTPException(status_code=400, detail="No location configured")
+        if not coverage.covers(area_lat, area_lng, area_radius, ingest_worker.max_age):
+            raise HTTPException(status_code=503, detail="Area not ingested, poll /check-prices instead")
+
+        seed = None
+        if not price_broadcaster.has_area(area_lat, area_lng, area_radius):
+            seed = query_stations(db, area_lat, area_lng, area_radius)
+    finally:
+        db.close()
+
+    subscription = price_broadcaster.subscribe(area_lat, area_lng, area_radius, target_price, seed)
+
+    async def events():
+        try:
+            yield format_sse("snapshot", subscription.snapshot())
+            while not await request.is_disconnected():
+                if subscription.needs_resync:
+                    subscription.needs_resync = False
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    yield format_sse("snapshot", subscription.snapshot())
+                try:
+                    event, data = await asyncio.wait_for(subscription.queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event, data)
+        finally:
+            price_broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/search-stations", response_model=SearchStationsResponse)
 async def search_stations(
     lat: Optional[float] = None,
     lng: Optional[float] = None,
     radius: Optional[float] = None,
     max_price: Optional[float] = None,
     fuel_type: Optional[str] = "diesel",
-    current_user: models.User = Depends(auth.get_current_user)
+    sort: str = "dist",
+    format: str = "full",
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
 ):
-    """Independent search for Explore page with custom filters"""
+    """Independent search for Explore page with custom filters (sort: dist or price)
+
+    ``format=compact`` sends ``columns`` (parallel arrays, see ``StationColumns``)
+    and ``fuel_type`` instead of ``stations``.
+    """
+    check_station_format(format)
     
     # Use provided params or fall back to user settings
     search_lat = lat if lat is not None else current_user.settings.latitude
@@ -275,57 +514,18 @@ async def search_stations(
     search_max_price = max_price if max_price is not None else 999.0
     
     if not search_lat or not search_lng:
-        return {"status": "no_location", "stations": []}
-    
-    api_key = os.getenv("TANKERKOENIG_API_KEY")
+        return json_response({"status": "no_location", "stations": []}, SearchStationsResponse)
     
     # Validate radius (Tankerkoenig API max is 25 km)
     search_radius = min(search_radius, 25.0)
-    
-    # Simple Mock fallback
-    if not api_key or api_key.startswith("0000"):
-        mock_stations = [
-            {"name": "MOCK - Shell", "diesel": 1.65, "e5": 1.75, "e10": 1.72, "distance": 1.2, "lat": search_lat + 0.01, "lng": search_lng + 0.01},
-            {"name": "MOCK - Aral", "diesel": 1.58, "e5": 1.68, "e10": 1.65, "distance": 3.4, "lat": search_lat + 0.03, "lng": search_lng + 0.02},
-            {"name": "MOCK - Esso", "diesel": 1.72, "e5": 1.82, "e10": 1.79, "distance": 2.1, "lat": search_lat + 0.02, "lng": search_lng + 0.015},
-        ]
-        
-        results = []
-        for s in mock_stations:
-            if s["distance"] > search_radius:
-                continue
-            price = s.get(fuel_type, s.get("diesel"))
-            if price <= search_max_price:
-                results.append({
-                    "name": s["name"],
-                    "price": price,
-                    "distance": s["distance"],
-                    "lat": s["lat"],
-                    "lng": s["lng"],
-                    "fuel_type": fuel_type
-                })
-        
-        return {"status": "active", "stations": results, "debug": "Using MOCK data"}
 
     try:
-        url = "https://creativecommons.tankerkoenig.de/json/list.php"
-        params = {
-            "lat": search_lat,
-            "lng": search_lng,
-            "rad": search_radius,
-            "sort": "dist",
-            "type": "all",
-            "apikey": api_key
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
-        
-        if not data.get("ok"):
-            return {"status": "api_error", "stations": [], "error": data.get("message", "Unknown error")}
+        try:
+            stations = await load_stations(db, search_lat, search_lng, search_radius, sort=sort, fuel_type=fuel_type)
+        except UpstreamError as e:
+            return json_response({"status": "api_error", "stations": [], "error": str(e)}, SearchStationsResponse)
 
-        stations = data.get("stations", [])
-        results = []
+        matches = []
         
         for s in stations:
             if not s.get("isOpen", True):
@@ -337,20 +537,261 @@ async def search_stations(
                 continue
             
             if price <= search_max_price:
-                results.append({
-                    "name": f"{s.get('brand')} - {s.get('street')} {s.get('houseNumber', '')}", 
-                    "price": price, 
-                    "distance": s.get("dist"), 
-                    "lat": s.get("lat"), 
-                    "lng": s.get("lng"),
-                    "fuel_type": fuel_type
-                })
+                matches.append((s, price))
+
+        if format == "compact":
+            listing = {"fuel_type": fuel_type, "columns": station_columns(matches)}
+        else:
+            listing = {"stations": [{
+                "name": f"{s.get('brand')} - {s.get('street')} {s.get('houseNumber', '')}", 
+                "price": price, 
+                "distance": s.get("dist"), 
+                "lat": s.get("lat"), 
+                "lng": s.get("lng"),
+                "fuel_type": fuel_type,
+                "updated_at": s["fetched_at"].isoformat() if s.get("fetched_at") else None
+            } for s, price in matches]}
         
-        return {"status": "active", "stations": results}
+        return json_response({"status": "active", **listing, **freshness(stations), **mock_notice()},
+                             SearchStationsResponse)
 
     except Exception as e:
-        print(f"❌ Error searching stations: {e}")
-        return {"status": "error", "stations": [], "error": str(e)}
+        logger.exception("Error searching stations")
+        return json_response({"status": "error", "stations": [], "error": str(e)}, SearchStationsResponse)
+
+ROUTE_SORTS = ("effective", "price", "detour", "along")
+
+def plan_route(points: List[tuple], width: float):
+    trip = route.Route(points)
+    return trip, route.corridor_circles(trip, width)
+
+@app.get("/route/stations", response_model=RouteStationsResponse)
+async def route_stations(
+    polyline: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    width: float = 2.0,
+    fuel_type: str = "diesel",
+    sort: str = "effective",
+    liters: float = 40.0,
+    consumption: float = 7.0,
+    limit: int = 50,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Cheapest stations along a trip, ranked by price and detour
+
+    The route is an encoded polyline, or ``start``/``end`` as "lat,lng" (straight
+    line). ``width`` is the corridor half-width in km. ``sort``: effective
+    (price incl. detour fuel for a fill of ``liters`` at ``consumption`` l/100 km),
+    price, detour or along (order of appearance on the route).
+    """
+    if fuel_type not in FUEL_TYPES:
+        raise HTTPException(status_code=400, detail=f"fuel_type must be one of {', '.join(FUEL_TYPES)}")
+    if sort not in ROUTE_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(ROUTE_SORTS)}")
+    if not 0 < width <= route.MAX_CORRIDOR_KM:
+        raise HTTPException(status_code=400, detail=f"width must be between 0 and {route.MAX_CORRIDOR_KM:g} km")
+    if liters <= 0 or consumption < 0 or not 1 <= limit <= 500:
+        raise HTTPException(status_code=400, detail="liters must be > 0, consumption >= 0, limit 1..500")
+    try:
+        if polyline:
+            points = route.decode_polyline(polyline)
+        elif start and end:
+            points = [route.parse_point(start), route.parse_point(end)]
+        else:
+            raise ValueError("Pass a polyline, or start and end")
+        trip, circles = await run_in_threadpool(plan_route, points, width)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Ingested and cached circles are answered locally. At most ROUTE_CONCURRENCY upstream calls
+    # run at a time, and together they may wait ROUTE_MAX_WAIT seconds for rate-limit tokens.
+    # Circles that miss the deadline fall back to last known data (or count as failed).
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + route.ROUTE_MAX_WAIT
+    semaphore = asyncio.Semaphore(route.ROUTE_CONCURRENCY)
+
+    async def lookup(lat: float, lng: float, radius: float):
+        if coverage.covers(lat, lng, radius, ingest_worker.max_age):
+            return query_stations(db, lat, lng, radius)
+        async with semaphore:
+            return await load_stations(db, lat, lng, radius, max_wait=max(0.0, deadline - loop.time()))
+
+    results = await asyncio.gather(*(lookup(*circle) for circle in circles), return_exceptions=True)
+    failed = [result for result in results if isinstance(result, Exception)]
+    candidates = route.dedupe_stations(result for result in results if not isinstance(result, Exception))
+    if failed and not candidates:
+        return json_response({"status": "api_error", "stations": [], "error": str(failed[0])}, RouteStationsResponse)
+
+    ranked = await run_in_threadpool(route.rank_stations, candidates, trip, width, fuel_type, liters, consumption, sort)
+    return json_response({
+        "status": "active",
+        "route_km": round(trip.length_km, 1),
+        "corridor_km": width,
+        "query_circles": len(circles),
+        "failed_circles": len(failed),
+        "candidates": len(candidates),
+        "matches": len(ranked),
+        "stations": ranked[:limit],
+        **freshness(candidates)
+    }, RouteStationsResponse)
+
+@app.get("/admin/cache/stats")
+async def station_cache_stats(current_admin: models.User = Depends(auth.get_current_admin)):
+    """Hit/miss/eviction counters of the shared station cache"""
+    return station_cache.stats()
+
+@app.get("/admin/auth/stats")
+async def auth_stats(current_admin: models.User = Depends(auth.get_current_admin)):
+    """Principal cache, password pool, login rate limit and login latency percentiles"""
+    return {
+        "principal_cache": principal_cache.stats(),
+        "password_pool": password_hasher.stats(),
+        "login_rate_limit": login_limiter.stats(),
+        "login_latency": login_latency.percentiles(),
+    }
+
+@app.get("/admin/upstream/stats")
+async def upstream_stats(current_admin: models.User = Depends(auth.get_current_admin)):
+    """Upstream governor (circuit breaker, rate limit) and how many callers were coalesced per call"""
+    return {"provider": provider.stats(), "governor": tankerkoenig.governor.stats(),
+            "single_flight": price_flights.stats()}
+
+@app.get("/admin/ingest/stats")
+async def ingest_stats(current_admin: models.User = Depends(auth.get_current_admin)):
+    """State of the background price ingestion and the covered circles"""
+    return {**ingest_worker.stats(), "indexed_stations": index_size(), "coverage": coverage.circles,
+            "price_stream": price_broadcaster.stats(), "price_history": price_history.stats(),
+            "heatmap_tiles": heatmap_tiles.stats()}
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    """Prometheus text format (scraped without a user login; set METRICS_TOKEN to protect it)"""
+    if METRICS_TOKEN and not hmac.compare_digest(request.headers.get("authorization", "").encode(),
+                                                 f"Bearer {METRICS_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/admin/profiler")
+async def profiler_dump(
+    route: Optional[str] = None,
+    top: int = 20,
+    format: str = "json",
+    current_admin: models.User = Depends(auth.get_current_admin)
+):
+    """Slowest profiled requests per route ("GET /check-prices") with their hottest stacks
+
+    ``format=collapsed`` returns folded stacks for flamegraph.pl / speedscope instead.
+    """
+    if format == "collapsed":
+        return Response(content=profiler.collapsed(route), media_type="text/plain")
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be json or collapsed")
+    return profiler.dump(route, max(1, top))
+
+@app.put("/admin/profiler")
+async def profiler_toggle(
+    enabled: bool,
+    interval_ms: Optional[float] = None,
+    clear: bool = False,
+    current_admin: models.User = Depends(auth.get_current_admin)
+):
+    """Start/stop the sampling profiler; ``clear`` drops the kept profiles"""
+    if enabled:
+        profiler.enable(interval_ms)
+    else:
+        profiler.disable()
+    if clear:
+        profiler.clear()
+    return profiler.stats()
+
+@app.get("/admin/alerts")
+async def alert_stats(current_admin: models.User = Depends(auth.get_current_admin)):
+    """Alert engine counters and the most recent alerts"""
+    return {**alert_engine.stats(), "recent": alert_engine.recent()}
+
+# --- Price History ---
+
+HISTORY_RESOLUTIONS = ("auto", "raw", "hour", "day")
+
+def history_range(days: float, end: Optional[datetime]):
+    if days <= 0 or days > 730:
+        raise HTTPException(status_code=400, detail="days must be between 0 and 730")
+    end = end or datetime.utcnow()
+    return end - timedelta(days=days), end
+
+@app.get("/stations/{station_id}/history", response_model=StationHistoryResponse)
+async def station_price_history(
+    station_id: str,
+    fuel_type: str = "diesel",
+    days: float = 7,
+    end: Optional[datetime] = None,
+    resolution: str = "auto",
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Price history of one station (raw change points or hourly/daily min/avg/max)"""
+    if fuel_type not in FUEL_TYPES or resolution not in HISTORY_RESOLUTIONS:
+        raise HTTPException(status_code=400, detail="Invalid fuel_type or resolution")
+    start, end = history_range(days, end)
+    resolution = price_history.resolution_for(start, end, resolution)
+    points = price_history.station_history(db, station_id, fuel_type, start, end, resolution)
+    
+    snapshot = db.query(models.PriceSnapshot).filter(models.PriceSnapshot.station_id == station_id).first()
+    current = getattr(snapshot, fuel_type) if snapshot else None
+    return json_response({
+        "station_id": station_id,
+        "fuel_type": fuel_type,
+        "resolution": resolution,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "current": current,
+        "cheaper_than": cheaper_than(current, points),
+        "points": points
+    }, StationHistoryResponse)
+
+@app.get("/history/area", response_model=AreaHistoryResponse)
+async def area_price_history(
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    radius: Optional[float] = None,
+    fuel_type: str = "diesel",
+    days: float = 7,
+    end: Optional[datetime] = None,
+    resolution: str = "auto",
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Price history of all stored stations in a circle, plus the average price per hour of day"""
+    if fuel_type not in FUEL_TYPES or resolution not in HISTORY_RESOLUTIONS:
+        raise HTTPException(status_code=400, detail="Invalid fuel_type or resolution")
+    lat = lat if lat is not None else current_user.settings.latitude
+    lng = lng if lng is not None else current_user.settings.longitude
+    radius = min(radius if radius is not None else current_user.settings.radius, 25.0)
+    if lat is None or lng is None:
+        raise HTTPException(status_code=400, detail="No location configured")
+    
+    start, end = history_range(days, end)
+    resolution = price_history.resolution_for(start, end, resolution)
+    if resolution == "raw":
+        resolution = "hour"  # areas are always answered from the rollups
+    stations = query_stations(db, lat, lng, radius)
+    buckets = price_history.area_history(db, [s["id"] for s in stations], fuel_type, start, end, resolution)
+    
+    open_prices = [s[fuel_type] for s in stations if s.get("isOpen") and s.get(fuel_type)]
+    current = round(sum(open_prices) / len(open_prices), 3) if open_prices else None
+    return json_response({
+        "fuel_type": fuel_type,
+        "resolution": resolution,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "stations": len(stations),
+        "current_avg": current,
+        "cheaper_than": cheaper_than(current, buckets),
+        "by_hour_of_day": hour_of_day_profile(buckets) if resolution == "hour" else None,
+        "points": buckets
+    }, AreaHistoryResponse)
 
 # --- Favorite Locations Endpoints ---
 
@@ -400,6 +841,7 @@ async def create_favorite_location(
     db.add(location)
     db.commit()
     db.refresh(location)
+    ingest_worker.wake()
     
     return {"id": location.id, "message": "Location created"}
 
@@ -422,7 +864,68 @@ async def delete_favorite_location(
     db.commit()
     return {"message": "Location deleted"}
 
-@app.get("/favorite-locations/{location_id}/prices")
+def summarize_location_prices(location: models.FavoriteLocation, stations: List[dict], fuel_type: str) -> dict:
+    """Cheapest/average/count of open stations for one favorite location"""
+    prices = []
+    
+    for s in stations:
+        if not s.get("isOpen", True):
+            continue
+        price = s.get(fuel_type)
+        if price:
+            prices.append(price)
+    
+    if not prices:
+        return {"location_id": location.id, "city": location.city, "station_count": 0}
+    
+    return {
+        "location_id": location.id,
+        "city": location.city,
+        "cheapest_price": min(prices),
+        "average_price": sum(prices) / len(prices),
+        "station_count": len(prices),
+        "is_mock": provider.is_fake,
+        **freshness(stations)
+    }
+
+@app.get("/favorite-locations/prices", response_model=FavoritePricesResponse)
+async def get_all_favorite_location_prices(
+    fuel_type: str = "diesel",
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Current prices for all favorite locations of the user in one request"""
+    locations = db.query(models.FavoriteLocation).filter(
+        models.FavoriteLocation.user_id == current_user.id
+    ).order_by(models.FavoriteLocation.is_home.desc(), models.FavoriteLocation.created_at.desc()).all()
+    
+    # Favorites at the same spot (e.g. "Wohnort" and "Home") share one lookup
+    circles = {}
+    for loc in locations:
+        circles.setdefault((round(loc.latitude, 4), round(loc.longitude, 4)), []).append(loc)
+    
+    async def lookup(lat: float, lng: float):
+        try:
+            return await load_stations(db, lat, lng, FAVORITE_RADIUS)
+        except Exception as e:
+            return e
+    
+    keys = list(circles)
+    results = await asyncio.gather(*(lookup(lat, lng) for lat, lng in keys))
+    
+    by_location = {}
+    for key, result in zip(keys, results):
+        for loc in circles[key]:
+            if isinstance(result, Exception):
+                logger.warning("Error fetching prices for location", extra={"location_id": loc.id, "error": str(result)})
+                by_location[loc.id] = {"location_id": loc.id, "city": loc.city, "error": str(result)}
+            else:
+                by_location[loc.id] = summarize_location_prices(loc, result, fuel_type)
+    
+    return json_response({"fuel_type": fuel_type, "locations": [by_location[loc.id] for loc in locations]},
+                         FavoritePricesResponse)
+
+@app.get("/favorite-locations/{location_id}/prices", response_model=LocationPrices)
 async def get_favorite_location_prices(
     location_id: int,
     fuel_type: str = "diesel",
@@ -439,90 +942,76 @@ async def get_favorite_location_prices(
         raise HTTPException(status_code=404, detail="Location not found")
     
     # Use same logic as search-stations
-    api_key = os.getenv("TANKERKOENIG_API_KEY")
-    radius = 5.0  # Default 5km for favorite locations
-    
-    if not api_key or api_key.startswith("0000"):
-        # Mock data
-        return {
-            "location_id": location_id,
-            "city": location.city,
-            "cheapest_price": 1.55,
-            "average_price": 1.62,
-            "station_count": 5,
-            "is_mock": True
-        }
+    radius = FAVORITE_RADIUS  # Default 5km for favorite locations
     
     try:
-        url = "https://creativecommons.tankerkoenig.de/json/list.php"
-        params = {
-            "lat": location.latitude,
-            "lng": location.longitude,
-            "rad": radius,
-            "sort": "price",
-            "type": "all",
-            "apikey": api_key
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
+        try:
+            stations = await load_stations(db, location.latitude, location.longitude, radius)
+        except UpstreamError as e:
+            return json_response({"location_id": location_id, "city": location.city, "error": str(e)}, LocationPrices)
         
-        if not data.get("ok"):
-            return {"location_id": location_id, "city": location.city, "error": data.get("message")}
-        
-        stations = data.get("stations", [])
-        prices = []
-        
-        for s in stations:
-            if not s.get("isOpen", True):
-                continue
-            price = s.get(fuel_type)
-            if price:
-                prices.append(price)
-        
-        if not prices:
-            return {"location_id": location_id, "city": location.city, "station_count": 0}
-        
-        return {
-            "location_id": location_id,
-            "city": location.city,
-            "cheapest_price": min(prices),
-            "average_price": sum(prices) / len(prices),
-            "station_count": len(prices),
-            "is_mock": False
-        }
+        return json_response(summarize_location_prices(location, stations, fuel_type), LocationPrices)
         
     except Exception as e:
-        print(f"Error fetching prices for location: {e}")
-        return {"location_id": location_id, "city": location.city, "error": str(e)}
+        logger.exception("Error fetching prices for location")
+        return json_response({"location_id": location_id, "city": location.city, "error": str(e)}, LocationPrices)
 
 # --- Fuel Log Endpoints (Fahrtenbuch) ---
 
+FUEL_LOG_COLUMNS = (
+    models.FuelLog.id, models.FuelLog.station_name, models.FuelLog.city, models.FuelLog.liters,
+    models.FuelLog.price_per_liter, models.FuelLog.total_price, models.FuelLog.fuel_type,
+    models.FuelLog.odometer, models.FuelLog.kilometers_driven, models.FuelLog.consumption,
+    models.FuelLog.date, models.FuelLog.notes
+)
+
+def encode_log_cursor(date: datetime, log_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{date.isoformat()}|{log_id}".encode()).decode()
+
+def decode_log_cursor(cursor: str):
+    try:
+        date, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(date), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @app.get("/fuel-logs")
 async def get_fuel_logs(
+    request: Request,
+    response: Response,
     limit: int = 50,
+    cursor: Optional[str] = None,
     current_user: models.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all fuel logs for current user"""
-    logs = db.query(models.FuelLog).filter(
-        models.FuelLog.user_id == current_user.id
-    ).order_by(models.FuelLog.date.desc()).limit(limit).all()
+    """Get fuel logs for current user, newest first
+
+    Keyset pagination on (date, id): pass the X-Next-Cursor response header as
+    ``cursor`` to get the next page. Every page is an index range scan. The
+    ETag is the user's fuel-log version: unchanged pages get a 304.
+    """
+    limit = max(1, min(limit, 500))
+    etag = make_etag("fuel-logs", current_user.id, fuel_stats.log_version(db, current_user.id), limit, cursor)
+    cached = not_modified(request, response, etag)
+    if cached is not None:
+        return cached
+
+    query = db.query(*FUEL_LOG_COLUMNS).filter(models.FuelLog.user_id == current_user.id)
     
-    return [{
-        "id": log.id,
-        "station_name": log.station_name,
-        "city": log.city,
-        "liters": log.liters,
-        "price_per_liter": log.price_per_liter,
-        "total_price": log.total_price,
-        "fuel_type": log.fuel_type,
-        "odometer": log.odometer,
-        "kilometers_driven": log.kilometers_driven,
-        "consumption": log.consumption,
-        "date": log.date.isoformat(),
-        "notes": log.notes
-    } for log in logs]
+    if cursor:
+        cursor_date, cursor_id = decode_log_cursor(cursor)
+        query = query.filter(or_(
+            models.FuelLog.date < cursor_date,
+            and_(models.FuelLog.date == cursor_date, models.FuelLog.id < cursor_id)
+        ))
+    
+    rows = query.order_by(models.FuelLog.date.desc(), models.FuelLog.id.desc()).limit(limit + 1).all()
+    
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_log_cursor(rows[-1].date, rows[-1].id)
+    
+    return [{**row._mapping, "date": row.date.isoformat()} for row in rows]
 
 @app.post("/fuel-logs")
 async def create_fuel_log(
@@ -533,47 +1022,71 @@ async def create_fuel_log(
     city: Optional[str] = None,
     odometer: Optional[float] = None,
     notes: Optional[str] = None,
+    date: Optional[datetime] = None,
     current_user: models.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Create a new fuel log entry"""
-    total_price = liters * price_per_liter
-    
-    # Calculate consumption if odometer provided
-    kilometers_driven = None
-    consumption = None
-    
-    if odometer:
-        # Get last fuel log
-        last_log = db.query(models.FuelLog).filter(
-            models.FuelLog.user_id == current_user.id,
-            models.FuelLog.odometer != None
-        ).order_by(models.FuelLog.date.desc()).first()
-        
-        if last_log and last_log.odometer:
-            kilometers_driven = odometer - last_log.odometer
-            if kilometers_driven > 0:
-                consumption = (liters / kilometers_driven) * 100
-    
+    """Create a new fuel log entry (back-dated entries via ``date``)"""
     log = models.FuelLog(
         user_id=current_user.id,
         station_name=station_name,
         city=city,
         liters=liters,
         price_per_liter=price_per_liter,
-        total_price=total_price,
+        total_price=liters * price_per_liter,
         fuel_type=fuel_type,
         odometer=odometer,
-        kilometers_driven=kilometers_driven,
-        consumption=consumption,
-        notes=notes
+        notes=notes,
+        date=date or datetime.utcnow()
     )
     
     db.add(log)
+    db.flush()
+    # Consumption of this log and its successor + statistics, same transaction as the insert
+    consumption.after_insert(db, log)
     db.commit()
     db.refresh(log)
     
-    return {"id": log.id, "message": "Fuel log created", "consumption": consumption}
+    return {"id": log.id, "message": "Fuel log created", "consumption": log.consumption}
+
+@app.put("/fuel-logs/{log_id}")
+async def update_fuel_log(
+    log_id: int,
+    station_name: Optional[str] = None,
+    liters: Optional[float] = None,
+    price_per_liter: Optional[float] = None,
+    fuel_type: Optional[str] = None,
+    city: Optional[str] = None,
+    odometer: Optional[float] = None,
+    notes: Optional[str] = None,
+    date: Optional[datetime] = None,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Edit a fuel log; only the given fields change"""
+    log = db.query(models.FuelLog).filter(
+        models.FuelLog.id == log_id,
+        models.FuelLog.user_id == current_user.id
+    ).first()
+    
+    if not log:
+        raise HTTPException(status_code=404, detail="Fuel log not found")
+    
+    before = consumption.snapshot(log)
+    changes = {
+        "station_name": station_name, "liters": liters, "price_per_liter": price_per_liter,
+        "fuel_type": fuel_type, "city": city, "odometer": odometer, "notes": notes, "date": date
+    }
+    for field, value in changes.items():
+        if value is not None:
+            setattr(log, field, value)
+    log.total_price = log.liters * log.price_per_liter
+    
+    db.flush()
+    consumption.after_update(db, log, before)
+    db.commit()
+    
+    return {"id": log.id, "message": "Fuel log updated", "consumption": log.consumption}
 
 @app.delete("/fuel-logs/{log_id}")
 async def delete_fuel_log(
@@ -590,40 +1103,87 @@ async def delete_fuel_log(
     if not log:
         raise HTTPException(status_code=404, detail="Fuel log not found")
     
+    before = consumption.snapshot(log)
     db.delete(log)
+    db.flush()
+    consumption.after_delete(db, before)  # the next entry gets a new baseline
     db.commit()
     return {"message": "Fuel log deleted"}
 
+@app.post("/fuel-logs/import")
+async def import_fuel_logs(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Bulk import fuel logs from a CSV (, or ; separated) or NDJSON upload
+
+    Columns: date, station_name, city, fuel_type, liters, price_per_liter,
+    total_price, odometer, notes. Kilometers and consumption are derived.
+    """
+    fmt = format or fuel_io.format_from_filename(file.filename)
+    if fmt not in fuel_io.FORMATS:
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    # Parsing and batched inserts are blocking; keep them off the event loop
+    result = await run_in_threadpool(fuel_io.import_logs, db, current_user.id, file.file, fmt)
+    logger.info("Fuel logs imported", extra={"username": current_user.username, "imported": result["imported"],
+                                             "skipped": result["skipped"]})
+    return result
+
+@app.get("/fuel-logs/export")
+async def export_fuel_logs(
+    format: str = "csv",
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Stream the whole fuel-log history as CSV or NDJSON"""
+    if format not in fuel_io.FORMATS:
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"fuel-logs-{current_user.username}.{format}"
+    return StreamingResponse(fuel_io.export_logs(current_user.id, format), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
 @app.get("/fuel-logs/statistics")
 async def get_fuel_statistics(
+    request: Request,
+    response: Response,
     current_user: models.User = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get fuel consumption statistics"""
-    logs = db.query(models.FuelLog).filter(
-        models.FuelLog.user_id == current_user.id
-    ).all()
-    
-    if not logs:
-        return {"total_logs": 0}
-    
-    total_liters = sum(log.liters for log in logs)
-    total_cost = sum(log.total_price for log in logs)
-    avg_price = sum(log.price_per_liter for log in logs) / len(logs)
-    
-    consumptions = [log.consumption for log in logs if log.consumption]
-    avg_consumption = sum(consumptions) / len(consumptions) if consumptions else None
-    
-    total_km = sum(log.kilometers_driven for log in logs if log.kilometers_driven)
-    
-    return {
-        "total_logs": len(logs),
-        "total_liters": round(total_liters, 2),
-        "total_cost": round(total_cost, 2),
-        "average_price_per_liter": round(avg_price, 3),
-        "average_consumption": round(avg_consumption, 2) if avg_consumption else None,
-        "total_kilometers": round(total_km, 1) if total_km else None
-    }
+    """Get fuel consumption statistics (incl. per fuel type, yearly and monthly) from the rollups"""
+    etag = make_etag("fuel-stats", current_user.id, fuel_stats.log_version(db, current_user.id))
+    cached = not_modified(request, response, etag)
+    if cached is not None:
+        return cached
+    return fuel_stats.get_statistics(db, current_user.id)
+
+@app.post("/admin/fuel-stats/rebuild")
+async def rebuild_fuel_statistics(current_admin: models.User = Depends(auth.get_current_admin), db: Session = Depends(get_db)):
+    """Recompute all fuel-log statistics rollups (backfill)"""
+    processed = fuel_stats.rebuild(db)
+    return {"message": "Fuel statistics rebuilt", "logs": processed}
+
+# --- Heatmap Tiles ---
+
+@app.get("/heatmap/{z}/{x}/{y}")
+async def heatmap_tile(z: int, x: int, y: int, fuel_type: str = "e10", db: Session = Depends(get_db)):
+    """Interpolated price heatmap as a 256 px PNG map tile (no auth: map tiles are plain image requests)"""
+    if fuel_type not in FUEL_TYPES:
+        raise HTTPException(status_code=400, detail=f"fuel_type must be one of {', '.join(FUEL_TYPES)}")
+    if not 0 <= z <= HEATMAP_MAX_ZOOM or not (0 <= x < 1 << z and 0 <= y < 1 << z):
+        raise HTTPException(status_code=404, detail="Tile not found")
+    if heatmap_tiles.version == 0:
+        # No ingestion run in this process yet: take the snapshot from the store
+        await run_in_threadpool(rebuild_index, db)
+
+    png, fingerprint = heatmap_tiles.lookup(fuel_type, z, x, y)
+    if png is None:
+        png = await tile_flights.do(
+            (fuel_type, z, x, y, fingerprint),
+            lambda: run_in_threadpool(heatmap_tiles.render, fuel_type, z, x, y)
+        )
+    return Response(content=png, media_type="image/png", headers={"Cache-Control": "public, max-age=60"})
 
 # --- Settings Update for Heatmap ---
 
@@ -634,9 +1194,10 @@ async def toggle_heatmap(
     db: Session = Depends(get_db)
 ):
     """Toggle heatmap display"""
-    current_user.settings.show_heatmap = show_heatmap
+    user_settings(db, current_user).show_heatmap = show_heatmap
     db.commit()
+    principal_cache.invalidate(current_user.username)
     return {"show_heatmap": show_heatmap}
 
-# Static Files
-app.mount("/", StaticFiles(directory="frontend", html=True), name="static")
+# Static Files (compressed variants are built once, here at startup)
+app.mount("/", PrecompressedStaticFiles(directory="frontend", html=True), name="static")
@@ -0,0 +1,223 @@
+"""In-process metrics in the Prometheus text format (``GET /metrics``)
+
+A minimal registry with counters, gauges and histograms with labels, so no
+client library is needed. Every metric of the app is defined here.
+
+``MetricsMiddleware`` times each request under its route template (not the
+raw path, which keeps the label set small). It also gives each request a
+``RequestStats`` in a context variable. ``instrument_engine`` counts SQL
+statements into it; ``run_in_threadpool`` copies the context, so queries
+from worker threads count as well.
+"""
+import bisect
+import contextvars
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # if set, /metrics requires "Authorization: Bearer <token>"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}",
+                          *self._samples()])
+
+    def _samples(self):
+        return []
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(v)}" for key, v in values]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket (+Inf last)], sum
+        self._series: Dict[Tuple[str, ...], Tuple[list, list]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def _samples(self):
+        with self._lock:
+            series = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} registered twice")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+registry = Registry()
+
+# --- Metrics ---
+
+HTTP_REQUEST_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route template", ("method", "route", "status")))
+HTTP_IN_FLIGHT = registry.register(Gauge("http_requests_in_flight", "Requests being handled"))
+DB_QUERIES = registry.register(Counter("db_queries_total", "SQL statements executed"))
+DB_QUERIES_PER_REQUEST = registry.register(Histogram(
+    "db_queries_per_request", "SQL statements per request by route", ("route",), buckets=COUNT_BUCKETS))
+UPSTREAM_REQUESTS = registry.register(Counter(
+    "upstream_requests_total", "Tankerkoenig calls by endpoint and outcome (HTTP status or error kind)",
+    ("endpoint", "outcome")))
+UPSTREAM_DURATION = registry.register(Histogram(
+    "upstream_request_duration_seconds", "Tankerkoenig call latency (sent calls only)", ("endpoint",)))
+UPSTREAM_STATIONS = registry.register(Histogram(
+    "upstream_stations_returned", "Stations (or prices) per successful Tankerkoenig call", ("endpoint",),
+    buckets=COUNT_BUCKETS))
+PASSWORD_HASH_DURATION = registry.register(Histogram(
+    "password_hash_duration_seconds", "bcrypt time per job in the hasher pool", ("operation",),
+    buckets=(0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0)))
+
+# --- Per-request accounting ---
+
+class RequestStats:
+    __slots__ = ("queries", "samples")
+
+    def __init__(self):
+        self.queries = 0
+        self.samples = None  # Counter of folded stacks while the profiler runs
+
+current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("current_request", default=None)
+
+def instrument_engine(engine: Engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERIES.inc()
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    return getattr(route, "path", "") or getattr(route, "name", None) or "unmatched"
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: latency histogram, in-flight gauge, queries per request
+
+    ``profiler`` (see ``backend.profiler``) is told when each request starts and ends.
+    """
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        if self.profiler is not None:
+            self.profiler.begin(stats)
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            route = route_label(scope)
+            HTTP_REQUEST_DURATION.observe(duration, method=scope["method"], route=route, status=status)
+            DB_QUERIES_PER_REQUEST.observe(stats.queries, route=route)
+            if self.profiler is not None:
+                self.profiler.finish(stats, f"{scope['method']} {route}", duration)
+            current_request.reset(token)
@@ -0,0 +1,194 @@
+"""Schema migrations
+
+The app no longer creates or alters tables on startup. Run the migrations once
+per deploy (the Docker image does this before starting uvicorn):
+
+    python -m backend.migrate upgrade     # apply pending revisions
+    python -m backend.migrate current     # show the schema version, exit 1 if behind
+    python -m backend.migrate check       # EXPLAIN the hot queries, exit 1 on table scans
+
+Applied revisions are recorded in ``schema_version``. Revision 1 creates all
+missing tables from the current models, so a fresh database already has later
+revisions' objects: every revision must be idempotent (``checkfirst``).
+"""
+import argparse
+import sys
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from . import models
+
+# --- Revisions ---
+
+def _baseline(conn: Connection):
+    models.Base.metadata.create_all(bind=conn)
+
+def _hot_path_indexes(conn: Connection):
+    # Older databases may hold several settings rows per user; keep the first
+    conn.execute(text(
+        "DELETE FROM user_settings WHERE id NOT IN (SELECT MIN(id) FROM user_settings GROUP BY user_id)"
+    ))
+    for table, name in (
+        (models.UserSettings.__table__, "uq_user_settings_user_id"),
+        (models.FavoriteLocation.__table__, "ix_favorite_locations_user_home_created"),
+        (models.FuelLog.__table__, "ix_fuel_logs_user_date_id"),
+        (models.FuelLog.__table__, "ix_fuel_logs_user_odometer"),
+    ):
+        index = next(index for index in table.indexes if index.name == name)
+        index.create(bind=conn, checkfirst=True)
+
+def _price_history(conn: Connection):
+    for model in (models.PriceHistoryChunk, models.PriceRollup):
+        model.__table__.create(bind=conn, checkfirst=True)
+
+def _fuel_log_version(conn: Connection):
+    if "fuel_log_version" not in {column["name"] for column in inspect(conn).get_columns("users")}:
+        conn.execute(text("ALTER TABLE users ADD COLUMN fuel_log_version INTEGER NOT NULL DEFAULT 0"))
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "Baseline: create missing tables", _baseline),
+    (2, "Hot-path indexes, unique user_settings.user_id", _hot_path_indexes),
+    (3, "Price history chunks and rollups", _price_history),
+    (4, "users.fuel_log_version (ETags of the fuel-log endpoints)", _fuel_log_version),
+]
+
+HEAD = MIGRATIONS[-1][0]
+
+# --- Runner ---
+
+def _ensure_version_table(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, description VARCHAR, applied_at VARCHAR)"
+    ))
+
+def current_version(engine: Engine) -> int:
+    if not inspect(engine).has_table("schema_version"):
+        return 0
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+def upgrade(engine: Engine) -> List[int]:
+    """Apply all pending revisions, each in its own transaction; returns the applied versions"""
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version(engine):
+            continue
+        print(f"🔄 Migration {version}: {description}")
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.utcnow().isoformat()}
+            )
+        applied.append(version)
+    return applied
+
+def ensure_current(engine: Engine):
+    """Startup check: refuse to run against an unmigrated schema"""
+    version = current_version(engine)
+    if version < HEAD:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {HEAD}. "
+            f"Run: python -m backend.migrate upgrade"
+        )
+
+# --- Query plan check ---
+
+def _hot_queries(db) -> List[Tuple[str, object]]:
+    """The per-request queries of backend/main.py (with placeholder values)"""
+    from sqlalchemy import and_, func, or_
+    now = datetime(2024, 1, 1)
+    FuelLog = models.FuelLog
+    return [
+        ("login / current user", db.query(models.User).filter(models.User.username == "admin")),
+        ("fuel log version", db.query(models.User.fuel_log_version).filter(models.User.id == 1)),
+        ("user.settings", db.query(models.UserSettings).filter(models.UserSettings.user_id == 1)),
+        ("favorite locations", db.query(models.FavoriteLocation).filter(
+            models.FavoriteLocation.user_id == 1
+        ).order_by(models.FavoriteLocation.is_home.desc(), models.FavoriteLocation.created_at.desc())),
+        ("favorite location by id", db.query(models.FavoriteLocation).filter(
+            models.FavoriteLocation.id == 1, models.FavoriteLocation.user_id == 1)),
+        ("fuel logs first page", db.query(FuelLog.id, FuelLog.date).filter(FuelLog.user_id == 1).order_by(
+            FuelLog.date.desc(), FuelLog.id.desc()).limit(51)),
+        ("fuel logs next page", db.query(FuelLog.id, FuelLog.date).filter(
+            FuelLog.user_id == 1, or_(FuelLog.date < now, and_(FuelLog.date == now, FuelLog.id < 10))
+        ).order_by(FuelLog.date.desc(), FuelLog.id.desc()).limit(51)),
+        ("fuel log by id", db.query(FuelLog).filter(FuelLog.id == 1, FuelLog.user_id == 1)),
+        ("previous odometer", db.query(FuelLog.odometer).filter(
+            FuelLog.user_id == 1, FuelLog.odometer > 0,
+            or_(FuelLog.date < now, and_(FuelLog.date == now, FuelLog.id < 10))
+        ).order_by(FuelLog.date.desc(), FuelLog.id.desc()).limit(1)),
+        ("next log with odometer", db.query(FuelLog).filter(
+            FuelLog.user_id == 1, FuelLog.odometer > 0,
+            or_(FuelLog.date > now, and_(FuelLog.date == now, FuelLog.id > 10))
+        ).order_by(FuelLog.date, FuelLog.id).limit(1)),
+        ("fuel statistics", db.query(models.FuelStats).filter(models.FuelStats.user_id == 1)),
+        ("stations in bounding box", db.query(models.Station).filter(
+            models.Station.latitude.between(52.4, 52.6), models.Station.longitude.between(13.3, 13.5))),
+        ("station price history", db.query(models.PriceRollup).filter(
+            models.PriceRollup.station_id == "x", models.PriceRollup.fuel_type == "e10",
+            models.PriceRollup.resolution == "hour", models.PriceRollup.bucket_start >= now)),
+        ("area price history", db.query(
+            models.PriceRollup.bucket_start, func.avg(models.PriceRollup.avg_price)
+        ).filter(
+            models.PriceRollup.station_id.in_(["x", "y"]), models.PriceRollup.fuel_type == "e10",
+            models.PriceRollup.resolution == "day", models.PriceRollup.bucket_start >= now
+        ).group_by(models.PriceRollup.bucket_start)),
+    ]
+
+def check_plans(engine: Engine) -> List[str]:
+    """EXPLAIN QUERY PLAN every hot query (SQLite); returns the ones that scan a table"""
+    from sqlalchemy.orm import Session
+    if engine.dialect.name != "sqlite":
+        raise RuntimeError("The plan check reads SQLite's EXPLAIN QUERY PLAN output")
+    failures = []
+    with Session(engine) as db:
+        for name, query in _hot_queries(db):
+            compiled = query.statement.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+            params = tuple(
+                value.isoformat(" ") if isinstance(value, datetime) else value
+                for value in (compiled.params[key] for key in compiled.positiontup)
+            )
+            plan = [row[-1] for row in db.connection().exec_driver_sql(
+                f"EXPLAIN QUERY PLAN {compiled.string}", params)]
+            # "SCAN t" is a full table scan; "SEARCH t USING ..." / "SCAN t USING INDEX" are not
+            scans = [step for step in plan if step.startswith("SCAN") and "USING" not in step]
+            print(f"{'❌' if scans else '✅'} {name}: {' | '.join(plan)}")
+            if scans:
+                failures.append(name)
+    return failures
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """CLI; returns the exit code: 1 if the schema is behind (current, check) or a query scans a table"""
+    parser = argparse.ArgumentParser(description="Database schema migrations")
+    parser.add_argument("command", choices=["upgrade", "current", "check"])
+    args = parser.parse_args(argv)
+
+    from .database import engine
+    if args.command == "upgrade":
+        applied = upgrade(engine)
+        print(f"✅ Schema at version {current_version(engine)} ({len(applied)} migrations applied)")
+        return 0
+    if args.command == "current":
+        version = current_version(engine)
+        print(f"Schema version {version} (head {HEAD})")
+        return 0 if version >= HEAD else 1
+    try:
+        ensure_current(engine)
+        failures = check_plans(engine)
+    except RuntimeError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    if failures:
+        print(f"❌ {len(failures)} queries scan a table: {', '.join(failures)}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Date, LargeBinary, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -10,6 +10,8 @@ class User(Base):
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_admin = Column(Boolean, default=False)
+    # Wird bei jeder Änderung am Fahrtenbuch erhöht (ETag von /fuel-logs und /fuel-logs/statistics)
+    fuel_log_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     settings = relationship("UserSettings", back_populates="user", uselist=False)
     favorite_locations = relationship("FavoriteLocation", back_populates="user", cascade="all, delete-orphan")
@@ -29,6 +31,11 @@ class UserSettings(Base):
     
     user = relationship("User", back_populates="settings")
 
+    __table_args__ = (
+        # Genau eine Settings-Zeile pro User (user.settings lädt per user_id)
+        Index("uq_user_settings_user_id", user_id, unique=True),
+    )
+
 class FavoriteLocation(Base):
     """Favoriten-Orte (Wohnort, Arbeit, etc.)"""
     __tablename__ = "favorite_locations"
@@ -44,6 +51,11 @@ class FavoriteLocation(Base):
     
     user = relationship("User", back_populates="favorite_locations")
 
+    __table_args__ = (
+        # WHERE user_id = ? ORDER BY is_home DESC, created_at DESC
+        Index("ix_favorite_locations_user_home_created", user_id, is_home.desc(), created_at.desc()),
+    )
+
 class FuelLog(Base):
     """Fahrtenbuch - Tankfüllungen"""
     __tablename__ = "fuel_logs"
@@ -71,3 +83,102 @@ class FuelLog(Base):
     notes = Column(String, nullable=True)  # Notizen
     
     user = relationship("User", back_populates="fuel_logs")
+
+    __table_args__ = (
+        # Keyset-Pagination: WHERE user_id = ? ORDER BY date DESC, id DESC
+        Index("ix_fuel_logs_user_date_id", user_id, date.desc(), id.desc()),
+        # Verbrauchsberechnung: vorheriger/nächster Eintrag mit Kilometerstand
+        Index("ix_fuel_logs_user_odometer", user_id, date, id,
+              sqlite_where=odometer > 0, postgresql_where=odometer > 0),
+    )
+
+class Station(Base):
+    """Tankstellen-Stammdaten (aus Tankerkoenig list.php)"""
+    __tablename__ = "stations"
+
+    id = Column(String, primary_key=True)  # Tankerkoenig UUID
+    name = Column(String, nullable=True)
+    brand = Column(String, nullable=True)
+    street = Column(String, nullable=True)
+    house_number = Column(String, nullable=True)
+    post_code = Column(String, nullable=True)
+    place = Column(String, nullable=True)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    listed_at = Column(DateTime, default=datetime.utcnow)  # Letztes Listing der Stammdaten
+
+    price = relationship("PriceSnapshot", back_populates="station", uselist=False, cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_stations_lat_lng", "latitude", "longitude"),
+    )
+
+class PriceSnapshot(Base):
+    """Letzter bekannter Preis je Tankstelle"""
+    __tablename__ = "price_snapshots"
+
+    station_id = Column(String, ForeignKey("stations.id"), primary_key=True)
+    e5 = Column(Float, nullable=True)
+    e10 = Column(Float, nullable=True)
+    diesel = Column(Float, nullable=True)
+    is_open = Column(Boolean, default=True)
+    fetched_at = Column(DateTime, default=datetime.utcnow)  # Zeitpunkt der Abfrage
+    changed_at = Column(DateTime, default=datetime.utcnow)  # Letzte Preisänderung
+
+    station = relationship("Station", back_populates="price")
+
+class FuelStats(Base):
+    """Vorberechnete Fahrtenbuch-Statistiken je Nutzer, Kraftstoff und Zeitraum"""
+    __tablename__ = "fuel_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    fuel_type = Column(String)  # diesel, e5, e10 oder "all"
+    period = Column(String)  # "all", Jahr ("2026") oder Monat ("2026-10")
+
+    log_count = Column(Integer, default=0)
+    total_liters = Column(Float, default=0.0)
+    total_cost = Column(Float, default=0.0)
+    price_sum = Column(Float, default=0.0)  # Summe price_per_liter (für Ø Preis)
+    consumption_sum = Column(Float, default=0.0)
+    consumption_count = Column(Integer, default=0)
+    total_km = Column(Float, default=0.0)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "fuel_type", "period", name="uq_fuel_stats_user_fuel_period"),
+    )
+
+class PriceHistoryChunk(Base):
+    """Preisverlauf: alle Preisänderungen einer Tankstelle/Sorte an einem Tag
+
+    ``data`` = ``points`` Zeitstempel (uint32, Sekunden seit Tagesbeginn) gefolgt
+    von ``points`` Preisen (uint16, Zehntel-Cent), little-endian
+    """
+    __tablename__ = "price_history"
+
+    station_id = Column(String, primary_key=True)
+    fuel_type = Column(String, primary_key=True)  # e5, e10, diesel
+    day = Column(Date, primary_key=True)
+    points = Column(Integer, default=0)
+    data = Column(LargeBinary)
+
+    __table_args__ = (
+        Index("ix_price_history_day", "day"),  # Retention
+    )
+
+class PriceRollup(Base):
+    """Verdichteter Preisverlauf (stündlich/täglich): min/Ø/max, zeitgewichtet"""
+    __tablename__ = "price_rollups"
+
+    station_id = Column(String, primary_key=True)
+    fuel_type = Column(String, primary_key=True)
+    resolution = Column(String, primary_key=True)  # "hour" oder "day"
+    bucket_start = Column(DateTime, primary_key=True)
+    min_price = Column(Float)
+    avg_price = Column(Float)
+    max_price = Column(Float)
+    seconds = Column(Integer)  # Abgedeckte Sekunden (Gewicht für Ø)
+
+    __table_args__ = (
+        Index("ix_price_rollups_resolution_bucket", "resolution", "bucket_start"),  # Watermark & Retention
+    )
@@ -0,0 +1,81 @@
+"""bcrypt off the event loop
+
+Hashing and verifying a password costs 100-300 ms of CPU. ``PasswordHasher``
+runs that work in a small dedicated thread pool (bcrypt releases the GIL) and
+caps the number of jobs waiting for it: beyond ``queue_limit`` callers are
+rejected immediately with ``HasherOverloaded`` instead of piling up, so a
+login burst cannot stall every other request.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from . import auth
+from .metrics import PASSWORD_HASH_DURATION
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "16"))  # running + waiting jobs
+
+def _timed(operation: str, fn, *args):
+    """Runs in the pool: bcrypt time only, without the wait for a worker"""
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        PASSWORD_HASH_DURATION.observe(time.perf_counter() - started, operation=operation)
+
+class HasherOverloaded(Exception):
+    """Too many password jobs are queued; retry later"""
+
+class PasswordHasher:
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_limit: int = PASSWORD_HASH_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.queue_limit:
+                self.rejected += 1
+                raise HasherOverloaded()
+            self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(_timed, "verify", auth.verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_timed, "hash", auth.get_password_hash, password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,327 @@
+"""Append-only price history with hourly/daily rollups and retention
+
+Raw data are change points only: every price change the ingestion sees is
+appended to one ``PriceHistoryChunk`` per (station, fuel type, day), packed as
+two little-endian arrays (uint32 seconds since midnight, uint16 tenths of a
+cent), i.e. 6 bytes per change instead of a wide row per reading.
+
+``PriceHistory.maintain`` (called after every ingestion, throttled) downsamples
+closed hours into time-weighted min/avg/max ``PriceRollup`` rows (a price holds
+until the next change, as long as the station is still observed), rolls
+closed days up from the hours and applies the retention policy. History
+queries read the rollups; only short ranges decode raw chunks.
+"""
+import os
+import sys
+import time
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session, aliased
+
+from . import models
+from .station_store import FUEL_TYPES
+
+PRICE_HISTORY_RAW_DAYS = int(os.getenv("PRICE_HISTORY_RAW_DAYS", "14"))
+PRICE_HISTORY_HOURLY_DAYS = int(os.getenv("PRICE_HISTORY_HOURLY_DAYS", "90"))
+PRICE_HISTORY_DAILY_DAYS = int(os.getenv("PRICE_HISTORY_DAILY_DAYS", "730"))
+MAINTENANCE_INTERVAL = float(os.getenv("PRICE_HISTORY_MAINTENANCE_INTERVAL", "300"))  # seconds
+
+MAX_DAYS_PER_RUN = 7  # catch-up after downtime is spread over several runs
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+Series = Tuple[str, str]  # (station_id, fuel_type)
+Point = Tuple[datetime, float]
+
+# --- Encoding ---
+
+def _day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day)
+
+def _encode(times: array, prices: array) -> bytes:
+    if sys.byteorder == "big":
+        times, prices = array("I", times), array("H", prices)
+        times.byteswap()
+        prices.byteswap()
+    return times.tobytes() + prices.tobytes()
+
+def _decode(data: bytes, points: int) -> Tuple[array, array]:
+    times, prices = array("I"), array("H")
+    times.frombytes(data[:points * times.itemsize])
+    prices.frombytes(data[points * times.itemsize:points * (times.itemsize + prices.itemsize)])
+    if sys.byteorder == "big":
+        times.byteswap()
+        prices.byteswap()
+    return times, prices
+
+def chunk_points(chunk: models.PriceHistoryChunk) -> List[Point]:
+    times, prices = _decode(chunk.data, chunk.points)
+    start = _day_start(chunk.day)
+    return [(start + timedelta(seconds=t), p / 1000) for t, p in zip(times, prices)]
+
+# --- Time-weighted aggregation ---
+
+def aggregate(points: List[Point], start: datetime, end: datetime) -> Optional[Tuple[float, float, float, int]]:
+    """(min, avg, max, seconds) of the step function ``points`` over [start, end)"""
+    low = high = None
+    weighted = 0.0
+    covered = 0.0
+    for i, (at, price) in enumerate(points):
+        seg_start = max(at, start)
+        seg_end = min(points[i + 1][0], end) if i + 1 < len(points) else end
+        if seg_end <= seg_start:
+            continue
+        seconds = (seg_end - seg_start).total_seconds()
+        low = price if low is None else min(low, price)
+        high = price if high is None else max(high, price)
+        weighted += price * seconds
+        covered += seconds
+    if not covered:
+        return None
+    return low, round(weighted / covered, 4), high, int(covered)
+
+class PriceHistory:
+    def __init__(self):
+        self._last_maintenance = 0.0
+        self.points_recorded = 0
+        self.hours_rolled = 0
+        self.days_rolled = 0
+        self.last_maintenance_at: Optional[datetime] = None
+        self.last_maintenance_seconds: Optional[float] = None
+
+    # --- Write path ---
+
+    def record(self, db: Session, changes: List[dict], fetched_at: datetime) -> int:
+        """Append the changed prices of one ingestion run; does not commit"""
+        day = fetched_at.date()
+        seconds = int((fetched_at - _day_start(day)).total_seconds())
+        points: Dict[Series, int] = {}
+        for change in changes:
+            old = change.get("old")
+            for fuel in FUEL_TYPES:
+                price = change["new"].get(fuel)
+                if not price or (old is not None and old.get(fuel) == price):
+                    continue
+                points[(change["station_id"], fuel)] = round(price * 1000)
+        if not points:
+            return 0
+
+        chunks = {
+            (chunk.station_id, chunk.fuel_type): chunk for chunk in db.query(models.PriceHistoryChunk).filter(
+                models.PriceHistoryChunk.day == day,
+                models.PriceHistoryChunk.station_id.in_({station_id for station_id, _ in points})
+            )
+        }
+        for (station_id, fuel), price in points.items():
+            chunk = chunks.get((station_id, fuel))
+            if chunk is None:
+                db.add(models.PriceHistoryChunk(station_id=station_id, fuel_type=fuel, day=day, points=1,
+                                                data=_encode(array("I", [seconds]), array("H", [price]))))
+                continue
+            times, prices = _decode(chunk.data, chunk.points)
+            if times and times[-1] > seconds:
+                # Out-of-order reading: keep the chunk sorted
+                pairs = sorted(list(zip(times, prices)) + [(seconds, price)])
+                times, prices = array("I", [t for t, _ in pairs]), array("H", [p for _, p in pairs])
+            else:
+                times.append(seconds)
+                prices.append(price)
+            chunk.data = _encode(times, prices)
+            chunk.points = len(times)
+        self.points_recorded += len(points)
+        return len(points)
+
+    # --- Downsampling & retention ---
+
+    def maintain(self, db: Session, now: Optional[datetime] = None, force: bool = False):
+        """Roll up closed hours/days and drop expired data (at most every MAINTENANCE_INTERVAL); commits"""
+        if not force and time.monotonic() - self._last_maintenance < MAINTENANCE_INTERVAL:
+            return
+        self._last_maintenance = time.monotonic()
+        started = time.perf_counter()
+        now = now or datetime.utcnow()
+
+        self._roll_hours(db, now)
+        self._roll_days(db, now)
+        today = _day_start(now.date())
+        # Keep each series' newest chunk: it is the baseline while the price stays unchanged
+        Chunk, Newer = models.PriceHistoryChunk, aliased(models.PriceHistoryChunk)
+        db.query(Chunk).filter(
+            Chunk.day < (today - timedelta(days=PRICE_HISTORY_RAW_DAYS)).date(),
+            db.query(Newer).filter(
+                Newer.station_id == Chunk.station_id, Newer.fuel_type == Chunk.fuel_type, Newer.day > Chunk.day
+            ).exists()
+        ).delete(synchronize_session=False)
+        for resolution, days in (("hour", PRICE_HISTORY_HOURLY_DAYS), ("day", PRICE_HISTORY_DAILY_DAYS)):
+            db.query(models.PriceRollup).filter(
+                models.PriceRollup.resolution == resolution,
+                models.PriceRollup.bucket_start < today - timedelta(days=days)
+            ).delete(synchronize_session=False)
+        db.commit()
+        self.last_maintenance_at = now
+        self.last_maintenance_seconds = round(time.perf_counter() - started, 3)
+
+    def _watermark(self, db: Session, resolution: str) -> Optional[datetime]:
+        return db.query(func.max(models.PriceRollup.bucket_start)).filter(
+            models.PriceRollup.resolution == resolution
+        ).scalar()
+
+    def _roll_hours(self, db: Session, now: datetime):
+        first_day = db.query(func.min(models.PriceHistoryChunk.day)).scalar()
+        if first_day is None:
+            return
+        watermark = self._watermark(db, "hour")
+        start = max(
+            watermark + HOUR if watermark else _day_start(first_day),
+            _day_start(now.date()) - timedelta(days=PRICE_HISTORY_RAW_DAYS),
+        )
+        end = now.replace(minute=0, second=0, microsecond=0)  # only closed hours
+
+        last_seen = dict(db.query(models.PriceSnapshot.station_id, models.PriceSnapshot.fetched_at))
+        for _ in range(MAX_DAYS_PER_RUN):
+            if start >= end:
+                break
+            day = start.date()
+            day_end = min(_day_start(day) + DAY, end)
+            rows = []
+            for (station_id, fuel), points in self._day_series(db, day).items():
+                seen_until = last_seen.get(station_id)
+                if seen_until is None:
+                    continue
+                hour = start
+                while hour < day_end:
+                    result = aggregate(points, hour, min(hour + HOUR, seen_until))
+                    if result:
+                        low, avg, high, seconds = result
+                        rows.append({"station_id": station_id, "fuel_type": fuel, "resolution": "hour",
+                                     "bucket_start": hour, "min_price": low, "avg_price": avg,
+                                     "max_price": high, "seconds": seconds})
+                    hour += HOUR
+            db.bulk_insert_mappings(models.PriceRollup, rows)
+            db.flush()
+            self.hours_rolled += int((day_end - start) / HOUR)
+            start = day_end
+
+    def _day_series(self, db: Session, day: date) -> Dict[Series, List[Point]]:
+        """Change points of ``day`` per series, preceded by the last known price before it"""
+        Chunk = models.PriceHistoryChunk
+        latest = db.query(Chunk.station_id, Chunk.fuel_type, func.max(Chunk.day).label("day")).filter(
+            Chunk.day < day
+        ).group_by(Chunk.station_id, Chunk.fuel_type).subquery()
+        previous = db.query(Chunk).join(latest, and_(
+            Chunk.station_id == latest.c.station_id,
+            Chunk.fuel_type == latest.c.fuel_type,
+            Chunk.day == latest.c.day
+        ))
+        series: Dict[Series, List[Point]] = {}
+        for chunk in previous:
+            series[(chunk.station_id, chunk.fuel_type)] = chunk_points(chunk)[-1:]
+        for chunk in db.query(Chunk).filter(Chunk.day == day):
+            series.setdefault((chunk.station_id, chunk.fuel_type), []).extend(chunk_points(chunk))
+        return series
+
+    def _roll_days(self, db: Session, now: datetime):
+        hour_watermark = self._watermark(db, "hour")
+        if hour_watermark is None:
+            return
+        Rollup = models.PriceRollup
+        watermark = self._watermark(db, "day")
+        if watermark is not None:
+            day = watermark + DAY
+        else:
+            first_hour = db.query(func.min(Rollup.bucket_start)).filter(Rollup.resolution == "hour").scalar()
+            day = _day_start(first_hour.date())
+        # A day is closed once its last hour is rolled up
+        while day + DAY <= hour_watermark + HOUR and day + DAY <= now:
+            totals = db.query(
+                Rollup.station_id, Rollup.fuel_type, func.min(Rollup.min_price), func.max(Rollup.max_price),
+                func.sum(Rollup.avg_price * Rollup.seconds), func.sum(Rollup.seconds)
+            ).filter(
+                Rollup.resolution == "hour", Rollup.bucket_start >= day, Rollup.bucket_start < day + DAY
+            ).group_by(Rollup.station_id, Rollup.fuel_type)
+            db.bulk_insert_mappings(Rollup, [{
+                "station_id": station_id, "fuel_type": fuel, "resolution": "day", "bucket_start": day,
+                "min_price": low, "avg_price": round(weighted / seconds, 4), "max_price": high, "seconds": seconds,
+            } for station_id, fuel, low, high, weighted, seconds in totals if seconds])
+            db.flush()
+            self.days_rolled += 1
+            day += DAY
+
+    # --- Queries ---
+
+    @staticmethod
+    def resolution_for(start: datetime, end: datetime, requested: str = "auto") -> str:
+        if requested != "auto":
+            return requested
+        span = end - start
+        if span <= 2 * DAY:
+            return "raw"
+        if span <= 31 * DAY:
+            return "hour"
+        return "day"
+
+    def station_history(self, db: Session, station_id: str, fuel_type: str, start: datetime,
+                        end: datetime, resolution: str) -> List[dict]:
+        if resolution == "raw":
+            Chunk = models.PriceHistoryChunk
+            chunks = db.query(Chunk).filter(
+                Chunk.station_id == station_id, Chunk.fuel_type == fuel_type,
+                Chunk.day >= start.date(), Chunk.day <= end.date()
+            ).order_by(Chunk.day)
+            return [{"t": at.isoformat(), "price": price}
+                    for chunk in chunks for at, price in chunk_points(chunk) if start <= at <= end]
+
+        Rollup = models.PriceRollup
+        rows = db.query(Rollup.bucket_start, Rollup.min_price, Rollup.avg_price, Rollup.max_price).filter(
+            Rollup.station_id == station_id, Rollup.fuel_type == fuel_type, Rollup.resolution == resolution,
+            Rollup.bucket_start >= start, Rollup.bucket_start < end
+        ).order_by(Rollup.bucket_start)
+        return [{"t": t.isoformat(), "min": low, "avg": round(avg, 3), "max": high} for t, low, avg, high in rows]
+
+    def area_history(self, db: Session, station_ids: List[str], fuel_type: str, start: datetime,
+                     end: datetime, resolution: str) -> List[dict]:
+        """Per bucket over all stations: cheapest min, mean avg, highest max"""
+        if not station_ids:
+            return []
+        Rollup = models.PriceRollup
+        rows = db.query(
+            Rollup.bucket_start, func.min(Rollup.min_price), func.avg(Rollup.avg_price),
+            func.max(Rollup.max_price), func.count()
+        ).filter(
+            Rollup.station_id.in_(station_ids), Rollup.fuel_type == fuel_type, Rollup.resolution == resolution,
+            Rollup.bucket_start >= start, Rollup.bucket_start < end
+        ).group_by(Rollup.bucket_start).order_by(Rollup.bucket_start)
+        return [{"t": t.isoformat() if isinstance(t, datetime) else t, "min": low, "avg": round(avg, 3),
+                 "max": high, "stations": count} for t, low, avg, high, count in rows]
+
+    def stats(self) -> dict:
+        return {
+            "points_recorded": self.points_recorded,
+            "hours_rolled": self.hours_rolled,
+            "days_rolled": self.days_rolled,
+            "last_maintenance_at": self.last_maintenance_at.isoformat() if self.last_maintenance_at else None,
+            "last_maintenance_seconds": self.last_maintenance_seconds,
+            "retention_days": {"raw": PRICE_HISTORY_RAW_DAYS, "hour": PRICE_HISTORY_HOURLY_DAYS,
+                               "day": PRICE_HISTORY_DAILY_DAYS},
+        }
+
+def hour_of_day_profile(buckets: List[dict]) -> List[dict]:
+    """Average price per hour of day (0-23) over hourly buckets"""
+    sums: Dict[int, List[float]] = {}
+    for bucket in buckets:
+        hour = datetime.fromisoformat(bucket["t"]).hour
+        sums.setdefault(hour, []).append(bucket["avg"])
+    return [{"hour": hour, "avg": round(sum(values) / len(values), 3)} for hour, values in sorted(sums.items())]
+
+def cheaper_than(current: Optional[float], buckets: List[dict]) -> Optional[float]:
+    """Share of buckets whose average was above ``current`` (1.0 = cheapest in the range)"""
+    averages = [bucket.get("avg", bucket.get("price")) for bucket in buckets]
+    if current is None or not averages:
+        return None
+    return round(sum(1 for avg in averages if avg > current) / len(averages), 3)
+
+price_history = PriceHistory()
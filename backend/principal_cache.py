@@ -0,0 +1,124 @@
+"""Short-lived cache of authenticated users and their settings
+
+``auth.user_from_token`` used to run one query for the user and a second lazy
+one for ``user.settings`` on every request. Now a miss loads both in one
+joined query and keeps a detached copy per username; a hit returns that copy
+(no SQL at all). The copy belongs to no session and is shared between
+requests, so it is read-only: endpoints that change the user or its settings
+load the rows into their own session first.
+
+Every username has a version that ``invalidate`` bumps. A load that started
+before an invalidation is not stored, so a concurrent settings update can
+never be overwritten by stale data. Call ``invalidate`` after committing any
+change to a user or its settings.
+
+Invalidation is per process. With several workers (``uvicorn --workers``,
+replicas) the other workers keep their copy until it expires, so a password
+or role change, a deleted user or new settings can be stale there for up to
+``PRINCIPAL_CACHE_TTL``. Admins are cached for only
+``PRINCIPAL_CACHE_ADMIN_TTL`` to keep revoked admin rights short-lived; set
+``PRINCIPAL_CACHE_TTL=0`` to disable the cache where that is not acceptable.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from . import models
+
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))  # seconds
+PRINCIPAL_CACHE_ADMIN_TTL = float(os.getenv("PRINCIPAL_CACHE_ADMIN_TTL", "10"))  # seconds, admins
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "1000"))
+
+def _columns(obj) -> dict:
+    return {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+
+def _detached_copy(user: models.User) -> models.User:
+    """Copy of a loaded user (+ settings) that belongs to no session"""
+    copy = models.User(**_columns(user))
+    if user.settings is not None:
+        copy.settings = models.UserSettings(**_columns(user.settings))
+        make_transient_to_detached(copy.settings)
+    else:
+        copy.settings = None
+    make_transient_to_detached(copy)
+    return copy
+
+class PrincipalCache:
+    """Thread-safe TTL/LRU cache: username -> detached user with settings"""
+
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL, max_entries: int = PRINCIPAL_CACHE_MAX_ENTRIES,
+                 admin_ttl: float = PRINCIPAL_CACHE_ADMIN_TTL):
+        self.ttl = ttl
+        self.admin_ttl = min(admin_ttl, ttl)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, int, models.User]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def version(self, username: str) -> int:
+        with self._lock:
+            return self._versions.get(username, 0)
+
+    def get(self, username: str) -> Optional[models.User]:
+        """The cached, detached user with its settings (read-only, no query), or None"""
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[0] < time.monotonic() or entry[1] != self._versions.get(username, 0):
+                if entry is not None:
+                    del self._entries[username]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, user: models.User, version: int):
+        """Store a freshly loaded user unless it was invalidated since ``version`` was read"""
+        ttl = self.admin_ttl if user.is_admin else self.ttl
+        if ttl <= 0:
+            return
+        copy = _detached_copy(user)
+        with self._lock:
+            if self._versions.get(user.username, 0) != version:
+                return
+            self._entries[user.username] = (time.monotonic() + ttl, version, copy)
+            self._entries.move_to_end(user.username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self._versions[username] = self._versions.get(username, 0) + 1
+            self._entries.pop(username, None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for username in self._entries:
+                self._versions[username] = self._versions.get(username, 0) + 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "admin_ttl_seconds": self.admin_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "invalidations": self.invalidations,
+            }
+
+principal_cache = PrincipalCache()
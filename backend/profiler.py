@@ -0,0 +1,257 @@
+"""Opt-in sampling profiler: per-route stacks of the slowest requests
+
+Off by default; enable it with ``PROFILER_ENABLED=1`` or ``PUT
+/admin/profiler?enabled=true``. While it is enabled, a daemon thread takes
+every thread's stack each ``PROFILER_INTERVAL_MS``. It attributes each
+stack to the request that owns the code running there, from two registries
+filled on the owning side (the sampler never inspects another thread's
+frame locals):
+
+* event loop: the ``RequestStats`` that ``MetricsMiddleware`` puts into
+  ``current_request`` is registered for the request's task (``begin``) and,
+  through a task factory, for every task created inside the request. The
+  sampler looks up ``asyncio.current_task(loop)``;
+* worker threads: ``run_in_threadpool`` below registers the calling
+  request for the worker thread while the function runs.
+
+The sampled frames below the task's coroutine (or the thread entry) are
+stored as one folded stack ("outer;...;inner", the flamegraph format) in the
+request's ``RequestStats``. When a request ends, it is kept if it is among
+the ``PROFILER_SLOWEST`` slowest seen for its route. Work offloaded without
+``run_in_threadpool`` (FastAPI's sync dependencies, the bcrypt pool) is not
+attributed.
+"""
+import asyncio
+import collections
+import functools
+import heapq
+import os
+import sys
+import threading
+import time
+import weakref
+from typing import Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool as _run_in_threadpool
+
+from .metrics import RequestStats, current_request
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+PROFILER_SLOWEST = int(os.getenv("PROFILER_SLOWEST", "5"))  # kept per route
+PROFILER_MAX_DEPTH = 64
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", os.path.basename(code.co_filename))
+    return f"{module}:{code.co_name}"
+
+def _fold(frame, outermost=None, entry_code=None) -> str:
+    """Folded stack from the leaf ``frame`` up to ``outermost`` (included) or a frame running ``entry_code`` (excluded)"""
+    names = []
+    while frame is not None and frame.f_code is not entry_code:
+        names.append(_frame_name(frame))
+        if frame is outermost:
+            break
+        frame = frame.f_back
+    return ";".join(reversed(names[:PROFILER_MAX_DEPTH]))
+
+def _run_attributed(threads: Dict[int, RequestStats], stats: RequestStats, func: Callable, *args, **kwargs):
+    ident = threading.get_ident()
+    threads[ident] = stats
+    try:
+        return func(*args, **kwargs)
+    finally:
+        threads.pop(ident, None)
+
+_THREAD_ENTRY = _run_attributed.__code__
+
+class SlowRequest:
+    __slots__ = ("duration", "finished_at", "samples")
+
+    def __init__(self, duration: float, samples: collections.Counter):
+        self.duration = duration
+        self.finished_at = time.time()
+        self.samples = samples
+
+    def __lt__(self, other: "SlowRequest") -> bool:
+        return self.duration < other.duration
+
+class SamplingProfiler:
+    def __init__(self, interval_ms: float = PROFILER_INTERVAL_MS, slowest: int = PROFILER_SLOWEST):
+        self.interval = interval_ms / 1000.0
+        self.slowest = slowest
+        self._lock = threading.Lock()
+        self._active: Dict[int, RequestStats] = {}  # id -> stats of running requests
+        self._routes: Dict[str, List[SlowRequest]] = {}  # min-heaps of the slowest requests
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._tasks: "weakref.WeakKeyDictionary[asyncio.Task, RequestStats]" = weakref.WeakKeyDictionary()
+        self._threads: Dict[int, RequestStats] = {}  # worker thread ident -> request
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._previous_factory = None
+        self.samples = 0
+        self.requests = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None
+
+    def enable(self, interval_ms: Optional[float] = None):
+        if interval_ms is not None:
+            self.interval = max(1.0, interval_ms) / 1000.0
+        if self._thread is not None:
+            return
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None  # no loop (CLI, tests): only worker threads are attributed
+        if self._loop is not None:
+            self._loop_thread = threading.get_ident()
+            self._previous_factory = self._loop.get_task_factory()
+            self._loop.set_task_factory(self._task_factory)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def disable(self):
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout=1.0)
+        if self._loop is not None and self._loop.get_task_factory() == self._task_factory:
+            self._loop.set_task_factory(self._previous_factory)
+        self._loop = None
+        with self._lock:
+            for stats in self._active.values():
+                stats.samples = None
+            self._active.clear()
+            self._tasks.clear()
+            self._threads.clear()
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+            self.samples = 0
+            self.requests = 0
+
+    def _task_factory(self, loop, coro, **kwargs):
+        """Tasks created inside a request belong to it (the factory runs in the creator's context)"""
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        stats = current_request.get()
+        if stats is not None and stats.samples is not None:
+            with self._lock:
+                self._tasks[task] = stats
+        return task
+
+    def bind(self, func: Callable) -> Callable:
+        """``func`` attributed to the current request while a worker thread runs it"""
+        stats = current_request.get()
+        if self._thread is None or stats is None or stats.samples is None:
+            return func
+        return functools.partial(_run_attributed, self._threads, stats, func)
+
+    # --- Called by MetricsMiddleware ---
+
+    def begin(self, stats: RequestStats):
+        if self._thread is None:
+            return
+        stats.samples = collections.Counter()
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        with self._lock:
+            self._active[id(stats)] = stats
+            if task is not None:
+                self._tasks[task] = stats
+
+    def finish(self, stats: RequestStats, route: str, duration: float):
+        if stats.samples is None:
+            return
+        with self._lock:
+            self._active.pop(id(stats), None)
+            self.requests += 1
+            heap = self._routes.setdefault(route, [])
+            entry = SlowRequest(duration, stats.samples)
+            if len(heap) < self.slowest:
+                heapq.heappush(heap, entry)
+            elif heap[0].duration < duration:
+                heapq.heapreplace(heap, entry)
+        stats.samples = None
+
+    # --- Sampler thread ---
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            loop = self._loop
+            task = asyncio.current_task(loop) if loop is not None and loop.is_running() else None
+            with self._lock:
+                if not self._active:
+                    continue
+                for thread_id, frame in frames.items():
+                    if thread_id == own:
+                        continue
+                    stats = self._threads.get(thread_id)
+                    if stats is not None:
+                        stack = _fold(frame, entry_code=_THREAD_ENTRY)
+                    elif task is not None and thread_id == self._loop_thread:
+                        stats = self._tasks.get(task)
+                        stack = _fold(frame, outermost=getattr(task.get_coro(), "cr_frame", None))
+                    if stats is not None and stats.samples is not None and id(stats) in self._active:
+                        stats.samples[stack] += 1
+                        self.samples += 1
+            del frames
+
+    # --- Output ---
+
+    def dump(self, route: Optional[str] = None, top: int = 20) -> dict:
+        """Slowest requests per route (slowest first) with their ``top`` most sampled stacks"""
+        with self._lock:
+            routes = {name: sorted(heap, reverse=True) for name, heap in self._routes.items()
+                      if route is None or name == route}
+        return {
+            **self.stats(),
+            "routes": {
+                name: [{
+                    "duration_ms": round(entry.duration * 1000, 1),
+                    "finished_at": entry.finished_at,
+                    "samples": sum(entry.samples.values()),
+                    "stacks": [{"stack": stack, "samples": count} for stack, count in entry.samples.most_common(top)],
+                } for entry in entries]
+                for name, entries in routes.items()
+            },
+        }
+
+    def collapsed(self, route: Optional[str] = None) -> str:
+        """All kept samples as "route;stack count" lines, for flamegraph.pl / speedscope"""
+        totals = collections.Counter()
+        with self._lock:
+            for name, heap in self._routes.items():
+                if route is not None and name != route:
+                    continue
+                for entry in heap:
+                    for stack, count in entry.samples.items():
+                        totals[f"{name};{stack}" if stack else name] += count
+        return "".join(f"{stack} {count}\n" for stack, count in totals.most_common())
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "interval_ms": round(self.interval * 1000, 2),
+            "slowest_per_route": self.slowest,
+            "requests_profiled": self.requests,
+            "samples": self.samples,
+        }
+
+profiler = SamplingProfiler()
+
+async def run_in_threadpool(func: Callable, *args, **kwargs):
+    """``starlette.concurrency.run_in_threadpool`` whose thread the profiler attributes to the calling request"""
+    return await _run_in_threadpool(profiler.bind(func), *args, **kwargs)
@@ -0,0 +1,102 @@
+"""Where station prices come from: the Tankerkoenig API or a simulated world
+
+Every price endpoint and the ingestion worker go through the one
+``provider``. ``PRICE_PROVIDER`` selects it:
+
+* ``tankerkoenig``: the API via the pooled, governed client. Pointing
+  ``TANKERKOENIG_BASE_URL`` at ``python -m backend.fake_tankerkoenig``
+  load-tests this same path without the real service.
+* ``fake``: ``FakeWorld`` in-process, with no network. It is meant for
+  development and demos. Its answers are flagged as mock data.
+* ``auto`` (default): ``tankerkoenig`` with an API key, ``fake`` without one
+  or with a test key ("0000...").
+"""
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from .fake_world import FakeWorld
+from .upstream import TankerkoenigClient, tankerkoenig
+
+logger = logging.getLogger(__name__)
+
+PRICE_PROVIDER = os.getenv("PRICE_PROVIDER", "auto").lower()
+TANKERKOENIG_API_KEY = os.getenv("TANKERKOENIG_API_KEY")
+
+class StationProvider(ABC):
+    """``list_stations`` / ``prices`` with the results of list.php / prices.php"""
+
+    name = ""
+    is_fake = False
+
+    @abstractmethod
+    async def list_stations(self, lat: float, lng: float, radius: float,
+                            timeout: Optional[float] = None, max_wait: Optional[float] = None) -> List[dict]:
+        ...
+
+    @abstractmethod
+    async def prices(self, station_ids: List[str],
+                     timeout: Optional[float] = None, max_wait: Optional[float] = None) -> Dict[str, dict]:
+        ...
+
+    def stats(self) -> dict:
+        return {"provider": self.name, "is_fake": self.is_fake}
+
+class TankerkoenigProvider(StationProvider):
+    name = "tankerkoenig"
+
+    def __init__(self, api_key: str, client: TankerkoenigClient = tankerkoenig):
+        self.api_key = api_key
+        self.client = client
+
+    async def list_stations(self, lat, lng, radius, timeout=None, max_wait=None):
+        return await self.client.list_stations(lat, lng, radius, self.api_key, timeout, max_wait)
+
+    async def prices(self, station_ids, timeout=None, max_wait=None):
+        return await self.client.prices(station_ids, self.api_key, timeout, max_wait)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "base_url": self.client.base_url}
+
+class FakeProvider(StationProvider):
+    """Simulated stations; the world is generated on first use (about 0.2 s)"""
+
+    name = "fake"
+    is_fake = True
+
+    def __init__(self, world: Optional[FakeWorld] = None):
+        self._world = world
+        self.list_calls = 0
+        self.price_calls = 0
+
+    @property
+    def world(self) -> FakeWorld:
+        if self._world is None:
+            self._world = FakeWorld()
+        return self._world
+
+    async def list_stations(self, lat, lng, radius, timeout=None, max_wait=None):
+        self.list_calls += 1
+        return self.world.list_stations(lat, lng, radius)
+
+    async def prices(self, station_ids, timeout=None, max_wait=None):
+        self.price_calls += 1
+        return self.world.prices(station_ids)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "stations": len(self.world), "seed": self.world.seed,
+                "list_calls": self.list_calls, "price_calls": self.price_calls}
+
+def create_provider(kind: str = PRICE_PROVIDER, api_key: Optional[str] = TANKERKOENIG_API_KEY) -> StationProvider:
+    if kind == "auto":
+        kind = "tankerkoenig" if api_key and not api_key.startswith("0000") else "fake"
+    if kind == "fake":
+        return FakeProvider()
+    if kind == "tankerkoenig":
+        if not api_key:
+            raise ValueError("PRICE_PROVIDER=tankerkoenig needs TANKERKOENIG_API_KEY")
+        return TankerkoenigProvider(api_key)
+    raise ValueError(f"Unknown PRICE_PROVIDER {kind!r} (auto, tankerkoenig or fake)")
+
+provider = create_provider()
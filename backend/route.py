@@ -0,0 +1,296 @@
+"""Route corridor search: cheapest stations along a trip
+
+A route is a polyline (Google "encoded polyline", as returned by most routing
+APIs) or just a start and an end point. It is resampled every ``ROUTE_STEP_KM`` km
+along its length. Everything afterwards is vectorized over those samples:
+
+* ``corridor_circles`` greedily covers the corridor (route +- ``width``) with
+  as few list.php circles (max 25 km) as possible. Each circle is centred on
+  the route as far ahead as it can be while still covering everything behind
+  it.
+* ``Route.distances`` computes every candidate station's distance to the
+  polyline and its position along the route. Stations are joined to nearby
+  segments through a coarse cell grid, so the cost grows with the number of
+  stations, not stations x segments.
+"""
+import math
+import os
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from .geo import EARTH_RADIUS_KM, KM_PER_DEGREE_LAT, km_per_degree_lng
+
+MAX_QUERY_RADIUS = 25.0  # Tankerkoenig limit
+ROUTE_STEP_KM = float(os.getenv("ROUTE_STEP_KM", "0.5"))
+ROUTE_MAX_KM = float(os.getenv("ROUTE_MAX_KM", "1500"))
+ROUTE_CONCURRENCY = int(os.getenv("ROUTE_CONCURRENCY", "4"))  # upstream calls in flight per route request
+ROUTE_MAX_WAIT = float(os.getenv("ROUTE_MAX_WAIT", "20"))  # seconds a route request may queue for upstream tokens
+MAX_CORRIDOR_KM = 10.0
+
+Point = Tuple[float, float]
+Circle = Tuple[float, float, float]  # lat, lng, radius km
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[Point]:
+    """Decode a Google encoded polyline into (lat, lng) pairs"""
+    points, index, lat, lng = [], 0, 0, 0
+    factor = 10 ** precision
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift, result = 0, 0
+            while True:
+                if index >= len(encoded):
+                    raise ValueError("Truncated polyline")
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
+
+def encode_polyline(points: Iterable[Point], precision: int = 5) -> str:
+    factor = 10 ** precision
+    encoded, prev_lat, prev_lng = [], 0, 0
+    for lat, lng in points:
+        lat_i, lng_i = round(lat * factor), round(lng * factor)
+        for delta in (lat_i - prev_lat, lng_i - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                encoded.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            encoded.append(chr(value + 63))
+        prev_lat, prev_lng = lat_i, lng_i
+    return "".join(encoded)
+
+def parse_point(value: str) -> Point:
+    """``"lat,lng"`` -> (lat, lng)"""
+    try:
+        lat, lng = (float(part) for part in value.split(","))
+    except ValueError:
+        raise ValueError(f"Expected 'lat,lng', got {value!r}")
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError(f"Coordinates out of range: {value!r}")
+    return lat, lng
+
+def haversine_np(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Vectorized great-circle distance in km"""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(np.radians(lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def _densify(lat: np.ndarray, lng: np.ndarray, legs: np.ndarray, step: float):
+    """Split every leg into pieces of at most ``step`` km (linear in lat/lng); returns lat, lng, km"""
+    pieces = np.maximum(1, np.ceil(legs / step)).astype(int)
+    leg = np.repeat(np.arange(len(legs)), pieces)
+    fraction = (np.arange(leg.size) - np.repeat(np.cumsum(pieces) - pieces, pieces)) / np.repeat(pieces, pieces)
+    dense_lat = np.append(lat[leg] + (lat[leg + 1] - lat[leg]) * fraction, lat[-1])
+    dense_lng = np.append(lng[leg] + (lng[leg + 1] - lng[leg]) * fraction, lng[-1])
+    segments = haversine_np(dense_lat[:-1], dense_lng[:-1], dense_lat[1:], dense_lng[1:])
+    return dense_lat, dense_lng, np.concatenate(([0.0], np.cumsum(segments)))
+
+def _resample(lat: np.ndarray, lng: np.ndarray, km: np.ndarray, step: float):
+    """Points every ``step`` km along the polyline plus its end (linear in lat/lng); returns lat, lng, km"""
+    positions = np.append(np.arange(0.0, km[-1], step), km[-1])
+    return np.interp(positions, km, lat), np.interp(positions, km, lng), positions
+
+def _cell_key(rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    return rows.astype(np.int64) * 1_000_003 + cols.astype(np.int64)
+
+def _neighbours(lat: np.ndarray, lng: np.ndarray, t_lat: np.ndarray, t_lng: np.ndarray,
+                reach: float) -> Tuple[np.ndarray, np.ndarray]:
+    """(point, target) index pairs that include every target within ``reach`` km of a point
+
+    Targets are bucketed into cells at least ``reach`` km wide; each point is
+    paired with the targets in its own and the 8 neighbouring cells.
+    """
+    cell_lat = reach / KM_PER_DEGREE_LAT
+    cell_lng = reach / km_per_degree_lng(min(89.0, float(np.abs(t_lat).max()) + cell_lat))  # widest cells needed
+    t_key = _cell_key(np.floor(t_lat / cell_lat), np.floor(t_lng / cell_lng))
+    order = np.argsort(t_key, kind="stable")
+    sorted_keys = t_key[order]
+
+    # Cells (row, col-1..col+1) are adjacent in key order: one range per neighbouring row
+    rows, cols = np.floor(lat / cell_lat), np.floor(lng / cell_lng)
+    point_idx, target_idx = [], []
+    for d_row in (-1, 0, 1):
+        lo = np.searchsorted(sorted_keys, _cell_key(rows + d_row, cols - 1), side="left")
+        hi = np.searchsorted(sorted_keys, _cell_key(rows + d_row, cols + 1), side="right")
+        counts = hi - lo
+        if not counts.any():
+            continue
+        point_idx.append(np.repeat(np.arange(lat.size), counts))
+        starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+        target_idx.append(order[starts + np.arange(counts.sum())])
+    if not point_idx:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    return np.concatenate(point_idx), np.concatenate(target_idx)
+
+class Route:
+    """Polyline plus samples every ``step`` km along it (``lat``, ``lng``, cumulative ``km``)"""
+
+    def __init__(self, points: List[Point], step: float = ROUTE_STEP_KM):
+        if len(points) < 2:
+            raise ValueError("A route needs at least two points")
+        self._lat = np.array([p[0] for p in points], dtype=float)
+        self._lng = np.array([p[1] for p in points], dtype=float)
+        self._legs = haversine_np(self._lat[:-1], self._lng[:-1], self._lat[1:], self._lng[1:])
+        if self._legs.sum() > ROUTE_MAX_KM:
+            raise ValueError(f"Route longer than {ROUTE_MAX_KM:.0f} km")
+        self._km = np.concatenate(([0.0], np.cumsum(self._legs)))
+        self.step = step
+        self.lat, self.lng, self.km = _resample(self._lat, self._lng, self._km, step)
+
+    @property
+    def length_km(self) -> float:
+        return float(self.km[-1])
+
+    def distances(self, lat: np.ndarray, lng: np.ndarray, max_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """(distance to the route, km along the route) per point; inf/nan beyond ``max_km``
+
+        Two passes, both through ``_neighbours``:
+
+        1. Points farther than ``max_km + piece / 2`` from every sample taken
+           each ``piece = max(step, max_km)`` km along the route cannot be
+           within ``max_km`` of it and are dropped. Most stations returned
+           by the corridor circles are.
+        2. The remaining points are measured against every nearby segment
+           (legs split to at most ``piece`` km) in a local equirectangular
+           frame at the segment, which is exact to metres over these short
+           distances.
+        """
+        lat = np.asarray(lat, dtype=float)
+        lng = np.asarray(lng, dtype=float)
+        distance = np.full(lat.size, np.inf)
+        along = np.full(lat.size, np.nan)
+        if lat.size == 0:
+            return distance, along
+
+        piece = max(self.step, max_km)
+        c_lat, c_lng, _ = _resample(self._lat, self._lng, self._km, piece)
+        p, c = _neighbours(lat, lng, c_lat, c_lng, max_km + piece / 2)
+        near = np.zeros(lat.size, dtype=bool)
+        near[p[haversine_np(lat[p], lng[p], c_lat[c], c_lng[c]) <= max_km + piece / 2]] = True
+        near = np.flatnonzero(near)
+        if near.size == 0:
+            return distance, along
+
+        seg_lat, seg_lng, seg_km = _densify(self._lat, self._lng, self._legs, piece)
+        a_lat, a_lng = seg_lat[:-1], seg_lng[:-1]
+        m_lat, m_lng = (a_lat + seg_lat[1:]) / 2, (a_lng + seg_lng[1:]) / 2
+        # Per segment: x scale at its latitude, vector a -> b in km, 1 / |ab|^2 (0 for empty segments)
+        kx = np.cos(np.radians(m_lat)) * KM_PER_DEGREE_LAT
+        dx, dy = np.diff(seg_lng) * kx, np.diff(seg_lat) * KM_PER_DEGREE_LAT
+        length2 = dx * dx + dy * dy
+        inverse = np.divide(1.0, length2, out=np.zeros_like(length2), where=length2 > 0)
+        longest = float(np.sqrt(length2.max()))
+        p, s = _neighbours(lat[near], lng[near], m_lat, m_lng, (max_km + longest / 2) * 1.01)
+        if p.size == 0:
+            return distance, along
+        p = near[p]
+
+        px, py = (lng[p] - a_lng[s]) * kx[s], (lat[p] - a_lat[s]) * KM_PER_DEGREE_LAT
+        sx, sy = dx[s], dy[s]
+        t = np.clip((px * sx + py * sy) * inverse[s], 0.0, 1.0)
+        pair_distance = np.hypot(px - t * sx, py - t * sy)
+        pair_along = seg_km[s] + t * (seg_km[s + 1] - seg_km[s])
+
+        # Nearest segment per point; ``along`` from the pair that attains it
+        np.minimum.at(distance, p, pair_distance)
+        best = pair_distance == distance[p]
+        along[p[best]] = pair_along[best]
+        beyond = distance > max_km
+        distance[beyond] = np.inf
+        along[beyond] = np.nan
+        return distance, along
+
+def corridor_circles(route: Route, width: float, max_radius: float = MAX_QUERY_RADIUS) -> List[Circle]:
+    """Fewest circles (centres on the route, radius <= ``max_radius``) covering route +- ``width``
+
+    A sample within ``reach = max_radius - width - step/2`` of a centre has its
+    whole corridor cross-section (and the half step to the next sample)
+    inside that circle. Each circle takes the farthest sample that still
+    keeps every not-yet-covered sample behind it within ``reach``. Its
+    radius is then shrunk to what it actually covers.
+    """
+    reach = max_radius - width - route.step / 2
+    if reach <= 0:
+        raise ValueError("Corridor too wide for the query radius")
+    lat, lng, n = route.lat, route.lng, route.lat.size
+    circles = []
+    start = 0
+    while start < n:
+        centre = start
+        while centre + 1 < n and haversine_np(lat[centre + 1], lng[centre + 1],
+                                              lat[start:centre + 2], lng[start:centre + 2]).max() <= reach:
+            centre += 1
+        # Everything from ``start`` up to the first sample beyond ``reach`` is covered
+        ahead = haversine_np(lat[centre], lng[centre], lat[centre:], lng[centre:])
+        beyond = np.flatnonzero(ahead > reach)
+        end = centre + (beyond[0] if beyond.size else ahead.size)
+        covered = haversine_np(lat[centre], lng[centre], lat[start:end], lng[start:end]).max()
+        radius = min(max_radius, math.ceil((covered + width + route.step / 2) * 100) / 100)
+        circles.append((round(float(lat[centre]), 6), round(float(lng[centre]), 6), radius))
+        start = end
+    return circles
+
+def rank_stations(stations: List[dict], route: Route, width: float, fuel_type: str, liters: float,
+                  consumption: float, sort: str = "effective") -> List[dict]:
+    """Open stations with a ``fuel_type`` price within ``width`` km of the route, ranked
+
+    ``detour_km`` assumes driving to the station and back (2 x distance to
+    the route). ``effective_price`` adds that detour's fuel cost, spread over
+    a fill of ``liters``: price * (1 + detour_km * consumption / 100 / liters).
+    """
+    candidates = [s for s in stations if s.get("isOpen", True) and s.get(fuel_type)
+                  and s.get("lat") is not None and s.get("lng") is not None]
+    if not candidates:
+        return []
+    distance, along = route.distances(np.array([s["lat"] for s in candidates]),
+                                      np.array([s["lng"] for s in candidates]), width)
+    price = np.array([s[fuel_type] for s in candidates], dtype=float)
+    detour = 2 * distance
+    effective = price * (1 + detour * consumption / 100 / liters)
+
+    keys = {
+        "effective": (detour, effective),
+        "price": (detour, price),
+        "detour": (price, detour),
+        "along": (price, along),
+    }[sort]
+    matched = np.flatnonzero(np.isfinite(distance))
+    result = []
+    for i in matched[np.lexsort(tuple(key[matched] for key in keys))]:
+        s = candidates[i]
+        result.append({
+            "id": s.get("id"),
+            "name": f"{s.get('brand')} - {s.get('street')} {s.get('houseNumber') or ''}".strip(),
+            "place": s.get("place"),
+            "lat": s["lat"],
+            "lng": s["lng"],
+            "price": float(price[i]),
+            "fuel_type": fuel_type,
+            "effective_price": round(float(effective[i]), 4),
+            "distance_to_route_km": round(float(distance[i]), 2),
+            "detour_km": round(float(detour[i]), 2),
+            "route_km": round(float(along[i]), 1),
+            "updated_at": s["fetched_at"].isoformat() if s.get("fetched_at") else None,
+        })
+    return result
+
+def dedupe_stations(results: Iterable[List[dict]]) -> List[dict]:
+    """Merge station lists by ID, keeping the most recent reading"""
+    by_id = {}
+    for stations in results:
+        for s in stations:
+            key = s.get("id") or (s.get("lat"), s.get("lng"))
+            current = by_id.get(key)
+            if current is None or (s.get("fetched_at") is not None and (
+                    current.get("fetched_at") is None or s["fetched_at"] > current["fetched_at"])):
+                by_id[key] = s
+    return list(by_id.values())
@@ -0,0 +1,144 @@
+"""Response models of the price endpoints
+
+Route decorators declare these as ``response_model``, which documents the
+responses in OpenAPI. The endpoints build plain dicts and return them via
+``fast_json.json_response``, so FastAPI does not validate them on every
+request. ``STRICT_RESPONSES=1`` validates them against these models instead.
+Keys an endpoint leaves out (``error``, ``debug``, ``columns``, ...) are
+absent from its response, not null.
+"""
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+class Freshness(BaseModel):
+    updated_at: Optional[str] = None  # oldest price reading in the response
+    age_seconds: Optional[int] = None
+    stale: Optional[bool] = None  # last known prices served while the upstream fails
+
+class StationColumns(BaseModel):
+    """Compact station list (``format=compact``): one array per field, row i = station i
+
+    ``brand``, ``street`` and ``updated_at`` hold indexes into ``brands``,
+    ``streets`` and ``timestamps``. The dashboard name is
+    "<brand> - <street> <house_number>".
+    """
+    count: int
+    id: List[Optional[str]]
+    lat: List[float]
+    lng: List[float]
+    price: List[float]
+    distance: List[Optional[float]]
+    brand: List[int]
+    street: List[int]
+    house_number: List[Optional[str]]
+    updated_at: List[int]
+    brands: List[Optional[str]]
+    streets: List[Optional[str]]
+    timestamps: List[Optional[str]]
+
+class DashboardStation(BaseModel):
+    id: Optional[str] = None
+    name: str
+    price: float
+    distance: Optional[float] = None
+    lat: float
+    lng: float
+    updated_at: Optional[str] = None
+
+class CheckPricesResponse(Freshness):
+    status: str  # active, inactive, api_error, error
+    all_stations: Optional[List[DashboardStation]] = None
+    columns: Optional[StationColumns] = None
+    target_price: Optional[float] = None
+    error: Optional[str] = None
+    debug: Optional[str] = None
+
+class SearchStation(BaseModel):
+    name: str
+    price: float
+    distance: Optional[float] = None
+    lat: float
+    lng: float
+    fuel_type: str
+    updated_at: Optional[str] = None
+
+class SearchStationsResponse(Freshness):
+    status: str  # active, no_location, api_error, error
+    fuel_type: Optional[str] = None
+    stations: Optional[List[SearchStation]] = None
+    columns: Optional[StationColumns] = None
+    error: Optional[str] = None
+    debug: Optional[str] = None
+
+class LocationPrices(Freshness):
+    location_id: int
+    city: Optional[str] = None
+    cheapest_price: Optional[float] = None
+    average_price: Optional[float] = None
+    station_count: Optional[int] = None
+    is_mock: Optional[bool] = None
+    error: Optional[str] = None
+
+class FavoritePricesResponse(BaseModel):
+    fuel_type: str
+    locations: List[LocationPrices]
+
+class RouteStation(BaseModel):
+    id: Optional[str] = None
+    name: str
+    place: Optional[str] = None
+    lat: float
+    lng: float
+    price: float
+    fuel_type: str
+    effective_price: float
+    distance_to_route_km: float
+    detour_km: float
+    route_km: float
+    updated_at: Optional[str] = None
+
+class RouteStationsResponse(Freshness):
+    status: str  # active, api_error
+    route_km: Optional[float] = None
+    corridor_km: Optional[float] = None
+    query_circles: Optional[int] = None
+    failed_circles: Optional[int] = None
+    candidates: Optional[int] = None
+    matches: Optional[int] = None
+    stations: List[RouteStation]
+    error: Optional[str] = None
+
+class HistoryPoint(BaseModel):
+    """Raw change point (``price``) or rollup bucket (``min``/``avg``/``max``; ``stations`` for areas)"""
+    t: str
+    price: Optional[float] = None
+    min: Optional[float] = None
+    avg: Optional[float] = None
+    max: Optional[float] = None
+    stations: Optional[int] = None
+
+class HourOfDay(BaseModel):
+    hour: int
+    avg: float
+
+class StationHistoryResponse(BaseModel):
+    station_id: str
+    fuel_type: str
+    resolution: str
+    start: str
+    end: str
+    current: Optional[float] = None
+    cheaper_than: Optional[float] = None
+    points: List[HistoryPoint]
+
+class AreaHistoryResponse(BaseModel):
+    fuel_type: str
+    resolution: str
+    start: str
+    end: str
+    stations: int
+    current_avg: Optional[float] = None
+    cheaper_than: Optional[float] = None
+    by_hour_of_day: Optional[List[HourOfDay]] = None
+    points: List[HistoryPoint]
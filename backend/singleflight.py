@@ -0,0 +1,65 @@
+"""In-process request coalescing (single-flight)
+
+Concurrent callers asking for the same key share one in-flight coroutine and
+all await its result. The shared call runs in its own task, so a caller that
+disconnects does not cancel the lookup for everybody else.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+# Upper bounds of the "callers per upstream call" histogram
+_CALLER_BUCKETS = (1, 2, 5, 10, 25, 50)
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._callers: Dict[Hashable, int] = {}
+        self.calls = 0        # shared calls actually executed
+        self.coalesced = 0    # callers that joined an existing call
+        self.max_callers = 0
+        self._histogram = {bucket: 0 for bucket in _CALLER_BUCKETS}
+        self._histogram_overflow = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``fn()`` once per key at a time; concurrent callers share its result"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            self._callers[key] += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        self._callers[key] = 1
+        self.calls += 1
+        task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        callers = self._callers.pop(key, 1)
+        self.max_callers = max(self.max_callers, callers)
+        for bucket in _CALLER_BUCKETS:
+            if callers <= bucket:
+                self._histogram[bucket] += 1
+                break
+        else:
+            self._histogram_overflow += 1
+        if not task.cancelled():
+            task.exception()  # mark as retrieved even if every caller went away
+
+    def stats(self) -> dict:
+        histogram = {f"<={bucket}": count for bucket, count in self._histogram.items()}
+        histogram[f">{_CALLER_BUCKETS[-1]}"] = self._histogram_overflow
+        return {
+            "in_flight": len(self._inflight),
+            "upstream_calls": self.calls,
+            "coalesced_callers": self.coalesced,
+            "avg_callers_per_call": round((self.calls + self.coalesced) / self.calls, 2) if self.calls else None,
+            "max_callers_per_call": self.max_callers,
+            "callers_per_call_histogram": histogram,
+        }
+
+price_flights = SingleFlight()
+tile_flights = SingleFlight()
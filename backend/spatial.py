@@ -0,0 +1,79 @@
+"""In-memory grid index for radius queries over stored stations
+
+Stations are bucketed into fixed lat/lng cells. A radius query only visits
+the cells overlapping the circle's bounding box, pre-filters on the box and
+then applies the exact haversine check. The index is immutable: the ingestion
+worker builds a new one and swaps it in, so readers never see a half-built
+index.
+"""
+import math
+from typing import Dict, List, Optional, Tuple
+
+from .geo import haversine_km, bounding_box
+
+GRID_CELL_DEG = 0.05  # ~5.5 km north-south
+
+class GridIndex:
+    def __init__(self, stations: Optional[List[dict]] = None, cell_deg: float = GRID_CELL_DEG):
+        self.cell_deg = cell_deg
+        self._stations: List[dict] = []
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        for station in stations or ():
+            self._add(station)
+
+    def __len__(self) -> int:
+        return len(self._stations)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def _add(self, station: dict):
+        lat, lng = station.get("lat"), station.get("lng")
+        if lat is None or lng is None:
+            return
+        self._cells.setdefault(self._cell(lat, lng), []).append(len(self._stations))
+        self._stations.append(station)
+
+    def query(self, lat: float, lng: float, radius: float, sort: str = "dist",
+              fuel_type: Optional[str] = None) -> List[dict]:
+        """Stations within ``radius`` km, as copies with ``dist`` set
+
+        ``sort="price"`` orders by ``fuel_type`` price (stations without a
+        price last), then distance.
+        """
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius)
+        min_i, min_j = self._cell(min_lat, min_lng)
+        max_i, max_j = self._cell(max_lat, max_lng)
+
+        result = []
+        stations = self._stations
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                for idx in self._cells.get((i, j), ()):
+                    s = stations[idx]
+                    s_lat, s_lng = s["lat"], s["lng"]
+                    if not (min_lat <= s_lat <= max_lat and min_lng <= s_lng <= max_lng):
+                        continue
+                    dist = haversine_km(lat, lng, s_lat, s_lng)
+                    if dist <= radius:
+                        station = dict(s)
+                        station["dist"] = round(dist, 2)
+                        result.append(station)
+
+        if sort == "price" and fuel_type:
+            result.sort(key=lambda s: (s.get(fuel_type) is None, s.get(fuel_type) or 0, s["dist"]))
+        else:
+            result.sort(key=lambda s: s["dist"])
+        return result
+
+def naive_query(stations: List[dict], lat: float, lng: float, radius: float) -> List[dict]:
+    """Linear scan reference implementation (used by the benchmark)"""
+    result = []
+    for s in stations:
+        dist = haversine_km(lat, lng, s["lat"], s["lng"])
+        if dist <= radius:
+            station = dict(s)
+            station["dist"] = round(dist, 2)
+            result.append(station)
+    result.sort(key=lambda s: s["dist"])
+    return result
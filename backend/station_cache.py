@@ -0,0 +1,224 @@
+"""Shared TTL/LRU cache for Tankerkoenig list.php results
+
+Entries are keyed by a quantized lat/lng cell plus the (rounded up) radius.
+Upstream queries are snapped to the cell center with the radius inflated by
+the cell's half-diagonal, so every request that falls into the same cell is
+answered from the same upstream circle. Lookups check real geometric coverage,
+so a fresh larger circle nearby also answers a smaller request.
+
+Expired entries are kept for another ``stale_ttl`` seconds. ``get_stale`` can
+still return them: briefly after expiry while a background refresh runs
+(stale-while-revalidate), or as last known good data while the upstream is
+failing (stale-if-error).
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .geo import haversine_km, bounding_box, KM_PER_DEGREE_LAT, km_per_degree_lng
+
+MAX_API_RADIUS = 25.0  # Tankerkoenig limit
+
+CACHE_TTL = float(os.getenv("STATION_CACHE_TTL", "300"))  # seconds
+CACHE_MAX_ENTRIES = int(os.getenv("STATION_CACHE_MAX_ENTRIES", "1024"))
+CACHE_CELL_DEG = float(os.getenv("STATION_CACHE_CELL_DEG", "0.01"))  # ~1 km
+CACHE_STALE_TTL = float(os.getenv("STATION_CACHE_STALE_TTL", "21600"))  # keep expired entries 6 h
+CACHE_REVALIDATE_WINDOW = float(os.getenv("STATION_CACHE_REVALIDATE_WINDOW", "120"))  # serve while refreshing
+
+# Coarse buckets (~28 km) used to find nearby covering entries quickly
+_BUCKET_DEG = 0.25
+
+CacheKey = Tuple[int, int, float]
+
+class _Entry:
+    __slots__ = ("lat", "lng", "radius", "stations", "expires_at")
+
+    def __init__(self, lat, lng, radius, stations, expires_at):
+        self.lat = lat
+        self.lng = lng
+        self.radius = radius
+        self.stations = stations
+        self.expires_at = expires_at
+
+def _bucket(lat: float, lng: float) -> Tuple[int, int]:
+    return math.floor(lat / _BUCKET_DEG), math.floor(lng / _BUCKET_DEG)
+
+class StationCache:
+    """Thread-safe station cache with TTL expiry and LRU eviction"""
+
+    def __init__(self, ttl: float = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES,
+                 cell_deg: float = CACHE_CELL_DEG, stale_ttl: float = CACHE_STALE_TTL,
+                 revalidate_window: float = CACHE_REVALIDATE_WINDOW):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.revalidate_window = revalidate_window
+        self.max_entries = max_entries
+        self.cell_deg = cell_deg
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, int], set] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # --- Key / query planning ---
+
+    def key_for(self, lat: float, lng: float, radius: float) -> CacheKey:
+        """Normalized cache key: quantized cell + radius rounded up to whole km"""
+        radius = min(float(math.ceil(radius)), MAX_API_RADIUS)
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg), radius
+
+    def query_circle(self, lat: float, lng: float, radius: float) -> Tuple[float, float, float]:
+        """Upstream circle (lat, lng, rad) to fetch so the whole cell is covered
+
+        Falls back to the exact request center if the inflated radius would
+        exceed the API limit.
+        """
+        cell_lat, cell_lng, key_radius = self.key_for(lat, lng, radius)
+        center_lat = (cell_lat + 0.5) * self.cell_deg
+        center_lng = (cell_lng + 0.5) * self.cell_deg
+        half_diag = math.hypot(self.cell_deg * KM_PER_DEGREE_LAT,
+                               self.cell_deg * km_per_degree_lng(center_lat)) / 2
+        inflated = key_radius + half_diag
+        if inflated <= MAX_API_RADIUS:
+            return round(center_lat, 6), round(center_lng, 6), round(inflated, 3)
+        return lat, lng, min(radius, MAX_API_RADIUS)
+
+    # --- Lookup / store ---
+
+    def get(self, lat: float, lng: float, radius: float) -> Optional[List[dict]]:
+        """Return stations within the circle if a fresh cached superset exists
+
+        Station dicts are shallow copies with ``dist`` recomputed relative to
+        the requested center, sorted by distance.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._find_covering(lat, lng, radius, now)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            stations = entry.stations
+        return filter_stations(stations, lat, lng, radius)
+
+    def get_stale(self, lat: float, lng: float, radius: float, max_staleness: float) -> Optional[List[dict]]:
+        """Like ``get``, but also accepts entries expired at most ``max_staleness`` seconds ago"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._find_covering(lat, lng, radius, now, grace=min(max_staleness, self.stale_ttl))
+            if entry is None:
+                return None
+            self.stale_hits += 1
+            stations = entry.stations
+        return filter_stations(stations, lat, lng, radius)
+
+    def put(self, key: CacheKey, lat: float, lng: float, radius: float, stations: List[dict]):
+        """Store the raw stations fetched for ``key`` with upstream circle (lat, lng, radius)"""
+        entry = _Entry(lat, lng, radius, stations, time.monotonic() + self.ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._buckets.setdefault(_bucket(lat, lng), set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "stale_ttl_seconds": self.stale_ttl,
+                "revalidate_window_seconds": self.revalidate_window,
+                "stale_hits": self.stale_hits,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    # --- Internals (caller holds the lock) ---
+
+    def _find_covering(self, lat, lng, radius, now, grace: float = 0.0) -> Optional[_Entry]:
+        """Covering entry that expired less than ``grace`` seconds ago (0: fresh only)"""
+        # Fast path: exact cell/radius key
+        key = self.key_for(lat, lng, radius)
+        entry = self._entries.get(key)
+        if entry is not None and self._usable(key, entry, lat, lng, radius, now, grace):
+            return entry
+
+        # Any fresh entry whose circle covers ours. Entries are at most MAX_API_RADIUS wide, so
+        # a covering center lies within MAX_API_RADIUS - radius km: scan the buckets of that box
+        # (in longitude it spans more buckets the further north)
+        reach = max(0.0, MAX_API_RADIUS - radius) + 1e-6
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, reach)
+        min_i, min_j = _bucket(min_lat, min_lng)
+        max_i, max_j = _bucket(max_lat, max_lng)
+        best_key, best = None, None
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                for candidate_key in list(self._buckets.get((i, j), ())):
+                    candidate = self._entries.get(candidate_key)
+                    if candidate is None or not self._usable(candidate_key, candidate, lat, lng, radius, now, grace):
+                        continue
+                    # Prefer the smallest covering circle (least local filtering)
+                    if best is None or candidate.radius < best.radius:
+                        best_key, best = candidate_key, candidate
+        if best is not None:
+            self._entries.move_to_end(best_key)
+        return best
+
+    def _usable(self, key, entry, lat, lng, radius, now, grace) -> bool:
+        if entry.expires_at + self.stale_ttl <= now:
+            self._remove(key)
+            self.expirations += 1
+            return False
+        if entry.expires_at + grace <= now:
+            return False
+        if haversine_km(entry.lat, entry.lng, lat, lng) + radius > entry.radius + 1e-9:
+            return False
+        self._entries.move_to_end(key)
+        return True
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        bucket = self._buckets.get(_bucket(entry.lat, entry.lng))
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[_bucket(entry.lat, entry.lng)]
+
+def filter_stations(stations: List[dict], lat: float, lng: float, radius: float) -> List[dict]:
+    """Stations within ``radius`` km of (lat, lng), ``dist`` recomputed, nearest first"""
+    result = []
+    for s in stations:
+        s_lat, s_lng = s.get("lat"), s.get("lng")
+        if s_lat is None or s_lng is None:
+            continue
+        dist = haversine_km(lat, lng, s_lat, s_lng)
+        if dist <= radius:
+            station = dict(s)
+            station["dist"] = round(dist, 2)
+            result.append(station)
+    result.sort(key=lambda s: s["dist"])
+    return result
+
+station_cache = StationCache()
@@ -0,0 +1,279 @@
+"""Local station/price store filled by the ingestion worker
+
+Reads return list.php-shaped dicts (``brand``, ``street``, ``houseNumber``,
+``lat``, ``lng``, ``dist``, ``e5``/``e10``/``diesel``, ``isOpen``) plus
+``fetched_at`` so the endpoints can use them exactly like live API data.
+"""
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .geo import haversine_km, bounding_box
+from .heatmap import heatmap_tiles
+from .spatial import GridIndex
+
+FUEL_TYPES = ("e5", "e10", "diesel")
+
+class Coverage:
+    """Circles refreshed by the last ingestion run (in-memory, per process)"""
+
+    def __init__(self):
+        self._circles: List[Tuple[float, float, float]] = []
+        self._refreshed_at: float = 0.0
+
+    def replace(self, circles: Iterable[Tuple[float, float, float]]):
+        self._circles = list(circles)
+        self._refreshed_at = time.monotonic()
+
+    def covers(self, lat: float, lng: float, radius: float, max_age: float) -> bool:
+        """True if a refreshed circle contains the whole requested circle"""
+        if not self._circles or time.monotonic() - self._refreshed_at > max_age:
+            return False
+        return any(haversine_km(c_lat, c_lng, lat, lng) + radius <= c_radius + 1e-9
+                   for c_lat, c_lng, c_radius in self._circles)
+
+    @property
+    def circles(self) -> List[Tuple[float, float, float]]:
+        return list(self._circles)
+
+coverage = Coverage()
+
+def _station_dict(station: models.Station, price: Optional[models.PriceSnapshot], dist: float) -> dict:
+    return {
+        "id": station.id,
+        "name": station.name,
+        "brand": station.brand,
+        "street": station.street,
+        "houseNumber": station.house_number,
+        "postCode": station.post_code,
+        "place": station.place,
+        "lat": station.latitude,
+        "lng": station.longitude,
+        "dist": round(dist, 2),
+        "e5": price.e5 if price else None,
+        "e10": price.e10 if price else None,
+        "diesel": price.diesel if price else None,
+        "isOpen": price.is_open if price else False,
+        "fetched_at": price.fetched_at if price else None,
+    }
+
+_index: Optional[GridIndex] = None
+
+def rebuild_index(db: Session) -> GridIndex:
+    """Rebuild the in-memory spatial index (and the heatmap snapshot) from the store and swap it in"""
+    global _index
+    rows = db.query(models.Station, models.PriceSnapshot).outerjoin(
+        models.PriceSnapshot, models.PriceSnapshot.station_id == models.Station.id
+    ).all()
+    stations = [_station_dict(station, price, 0.0) for station, price in rows]
+    _index = GridIndex(stations)
+    heatmap_tiles.update(stations, FUEL_TYPES)
+    return _index
+
+def index_size() -> int:
+    return len(_index) if _index is not None else 0
+
+def sort_stations(stations: List[dict], sort: str = "dist", fuel_type: Optional[str] = None) -> List[dict]:
+    """Order by distance, or by ``fuel_type`` price (missing prices last) then distance"""
+    if sort == "price" and fuel_type:
+        return sorted(stations, key=lambda s: (s.get(fuel_type) is None, s.get(fuel_type) or 0, s["dist"]))
+    return sorted(stations, key=lambda s: s["dist"])
+
+def query_stations(db: Session, lat: float, lng: float, radius: float,
+                   sort: str = "dist", fuel_type: Optional[str] = None) -> List[dict]:
+    """Stored stations within radius km, nearest (or cheapest) first"""
+    index = _index
+    if index is not None:
+        return index.query(lat, lng, radius, sort=sort, fuel_type=fuel_type)
+
+    # No index built yet in this process: bounding box on the (lat, lng) index
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius)
+    rows = db.query(models.Station, models.PriceSnapshot).outerjoin(
+        models.PriceSnapshot, models.PriceSnapshot.station_id == models.Station.id
+    ).filter(
+        models.Station.latitude.between(min_lat, max_lat),
+        models.Station.longitude.between(min_lng, max_lng)
+    ).all()
+
+    result = []
+    for station, price in rows:
+        dist = haversine_km(lat, lng, station.latitude, station.longitude)
+        if dist <= radius:
+            result.append(_station_dict(station, price, dist))
+    return sort_stations(result, sort, fuel_type)
+
+def display_price(prices: dict) -> Optional[float]:
+    """Price shown on the dashboard and compared to target_price: E10 -> E5 -> Diesel"""
+    return prices.get("e10") or prices.get("e5") or prices.get("diesel") or None
+
+def dashboard_station(s: dict) -> Optional[dict]:
+    """Map entry for the dashboard: open stations with their display price"""
+    if not s.get("isOpen", True):
+        return None
+    price = display_price(s)
+    # Skip if no price found (e.g. station doesn't sell standard fuels)
+    if not price:
+        return None
+    return {
+        "id": s.get("id"),
+        "name": f"{s.get('brand')} - {s.get('street')} {s.get('houseNumber', '')}",
+        "price": price,
+        "distance": s.get("dist"),
+        "lat": s.get("lat"),
+        "lng": s.get("lng"),
+        "updated_at": s["fetched_at"].isoformat() if s.get("fetched_at") else None
+    }
+
+def station_columns(rows: Iterable[Tuple[dict, float]]) -> dict:
+    """Compact (``format=compact``) form of (station, shown price) rows: parallel arrays
+
+    Brand, street and reading time repeat a lot, so they are sent once in
+    ``brands``/``streets``/``timestamps`` and referenced by index.
+    """
+    brands: Dict[Optional[str], int] = {}
+    streets: Dict[Optional[str], int] = {}
+    timestamps: Dict[Optional[datetime], int] = {}
+    columns = {key: [] for key in ("id", "lat", "lng", "price", "distance", "brand", "street", "house_number",
+                                   "updated_at")}
+    for s, price in rows:
+        columns["id"].append(s.get("id"))
+        columns["lat"].append(s.get("lat"))
+        columns["lng"].append(s.get("lng"))
+        columns["price"].append(price)
+        columns["distance"].append(s.get("dist"))
+        columns["brand"].append(brands.setdefault(s.get("brand"), len(brands)))
+        columns["street"].append(streets.setdefault(s.get("street"), len(streets)))
+        columns["house_number"].append(s.get("houseNumber"))
+        columns["updated_at"].append(timestamps.setdefault(s.get("fetched_at"), len(timestamps)))
+    return {
+        "count": len(columns["id"]),
+        **columns,
+        "brands": list(brands),
+        "streets": list(streets),
+        "timestamps": [at.isoformat() if at else None for at in timestamps],
+    }
+
+def dashboard_columns(stations: List[dict]) -> dict:
+    """``station_columns`` of the stations ``dashboard_station`` keeps"""
+    return station_columns((s, display_price(s)) for s in stations if s.get("isOpen", True) and display_price(s))
+
+def price_fingerprint(stations: List[dict]) -> tuple:
+    """Everything ``dashboard_station`` and ``freshness`` read, per station (ETag source of /check-prices)"""
+    return tuple(
+        (s.get("id"), s.get("e5"), s.get("e10"), s.get("diesel"), s.get("isOpen"), s.get("fetched_at"),
+         s.get("stale"), s.get("dist"), s.get("brand"), s.get("street"), s.get("houseNumber"), s.get("lat"), s.get("lng"))
+        for s in stations
+    )
+
+def oldest_reading(stations: List[dict]) -> Optional[datetime]:
+    readings = [s["fetched_at"] for s in stations if s.get("fetched_at")]
+    return min(readings) if readings else None
+
+def store_stations(db: Session, stations: List[dict], fetched_at: datetime) -> List[dict]:
+    """Upsert list.php stations and their prices; returns the price changes (see ``_apply_prices``)"""
+    by_id = {s["id"]: s for s in stations if s.get("id")}
+    if not by_id:
+        return []
+
+    existing = {
+        station.id: station for station in db.query(models.Station).filter(models.Station.id.in_(list(by_id)))
+    }
+    snapshots = {
+        snapshot.station_id: snapshot for snapshot in db.query(models.PriceSnapshot).filter(
+            models.PriceSnapshot.station_id.in_(list(by_id))
+        )
+    }
+
+    changes = []
+    for station_id, s in by_id.items():
+        station = existing.get(station_id)
+        if station is None:
+            station = models.Station(id=station_id)
+            db.add(station)
+        station.name = s.get("name")
+        station.brand = s.get("brand")
+        station.street = s.get("street")
+        station.house_number = s.get("houseNumber")
+        station.post_code = str(s.get("postCode")) if s.get("postCode") is not None else None
+        station.place = s.get("place")
+        station.latitude = s.get("lat")
+        station.longitude = s.get("lng")
+        station.listed_at = fetched_at
+
+        change = _apply_prices(db, snapshots.get(station_id), station, s, s.get("isOpen", True), fetched_at)
+        if change:
+            changes.append(change)
+
+    db.commit()
+    return changes
+
+def store_prices(db: Session, prices: Dict[str, dict], fetched_at: datetime) -> List[dict]:
+    """Merge a prices.php result into the stored snapshots; returns the price changes
+
+    Unknown station IDs are ignored (they are only created by a list.php run).
+    """
+    if not prices:
+        return []
+    stations = {
+        station.id: station for station in db.query(models.Station).filter(models.Station.id.in_(list(prices)))
+    }
+    snapshots = {
+        snapshot.station_id: snapshot for snapshot in db.query(models.PriceSnapshot).filter(
+            models.PriceSnapshot.station_id.in_(list(prices))
+        )
+    }
+
+    changes = []
+    for station_id, reading in prices.items():
+        station = stations.get(station_id)
+        if station is None:
+            continue
+        change = _apply_prices(db, snapshots.get(station_id), station, reading,
+                               reading.get("status") == "open", fetched_at)
+        if change:
+            changes.append(change)
+
+    db.commit()
+    return changes
+
+def _apply_prices(db: Session, snapshot: Optional[models.PriceSnapshot], station: models.Station,
+                  prices: dict, is_open: bool, fetched_at: datetime) -> Optional[dict]:
+    """Write one price reading into the snapshot row
+
+    Returns ``{"station_id", "name", "lat", "lng", "is_open", "old", "new"}`` if a
+    price changed (``old`` is None for a first reading), otherwise None. A closed
+    station (prices.php sends no prices then) keeps its last known prices and
+    yields no change, so reopening in the morning is not a price change.
+    """
+    new_prices = {fuel: (prices.get(fuel) or None) for fuel in FUEL_TYPES}
+    change = {
+        "station_id": station.id,
+        "name": f"{station.brand} - {station.street} {station.house_number or ''}",
+        "lat": station.latitude,
+        "lng": station.longitude,
+        "is_open": is_open,
+        "old": None,
+        "new": new_prices,
+    }
+    if snapshot is None:
+        db.add(models.PriceSnapshot(station_id=station.id, is_open=is_open,
+                                    fetched_at=fetched_at, changed_at=fetched_at, **new_prices))
+        return change if is_open else None
+    if not is_open:
+        snapshot.is_open = False
+        snapshot.fetched_at = fetched_at
+        return None
+
+    old_prices = {fuel: getattr(snapshot, fuel) for fuel in FUEL_TYPES}
+    for fuel, price in new_prices.items():
+        setattr(snapshot, fuel, price)
+    snapshot.is_open = is_open
+    snapshot.fetched_at = fetched_at
+    if old_prices == new_prices:
+        return None
+    snapshot.changed_at = fetched_at
+    change["old"] = old_prices
+    return change
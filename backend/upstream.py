@@ -0,0 +1,148 @@
+"""Pooled async client for the Tankerkoenig API
+
+One ``httpx.AsyncClient`` is shared by the whole app. It is opened in the
+startup hook and closed on shutdown, so every price endpoint reuses keep-alive
+connections instead of blocking the event loop with ``requests``.
+
+Every HTTP call passes through the upstream governor (rate limit + circuit
+breaker, see ``governor.py``). Transport errors, HTTP errors and ``ok=false``
+answers are all raised as ``UpstreamError``, but only the first two count as
+breaker failures: an ``ok=false`` answer means the API itself is up. Calls the
+governor refuses to send raise its subclass ``UpstreamUnavailable``. Every
+call is counted in ``upstream_requests_total`` by outcome: ok, http_<status>,
+timeout, transport_error, invalid_json, api_error, or circuit_open/throttled
+when it was not sent.
+"""
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from .governor import CircuitOpen, Rejected, UpstreamGovernor, upstream_governor
+from .metrics import UPSTREAM_DURATION, UPSTREAM_REQUESTS, UPSTREAM_STATIONS
+
+TANKERKOENIG_BASE_URL = os.getenv("TANKERKOENIG_BASE_URL", "https://creativecommons.tankerkoenig.de/json")
+
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "10"))  # seconds per call
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3"))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "10"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "5"))
+
+PRICES_BATCH_SIZE = 10  # prices.php accepts at most 10 station IDs per call
+
+class UpstreamError(Exception):
+    """Tankerkoenig failed or answered with ok=false"""
+
+class UpstreamUnavailable(UpstreamError):
+    """Not sent: circuit open or rate limit exhausted"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TankerkoenigClient:
+    """Thin async wrapper around the Tankerkoenig JSON endpoints"""
+
+    def __init__(self, base_url: str = TANKERKOENIG_BASE_URL, governor: UpstreamGovernor = upstream_governor):
+        self.base_url = base_url.rstrip("/")
+        self.governor = governor
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(UPSTREAM_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+            # max_connections caps in-flight upstream calls; extra calls wait for a slot
+            limits=httpx.Limits(
+                max_connections=UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            ),
+            headers={"User-Agent": "L8teFuel"},
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get(self, path: str, params: dict, timeout: Optional[float] = None,
+                   max_wait: Optional[float] = None) -> dict:
+        if self._client is None:
+            await self.start()
+        kwargs = {"params": params}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+
+        endpoint = path.strip("/")
+
+        async def call() -> dict:
+            started = time.perf_counter()
+            outcome = "ok"
+            try:
+                response = await self._client.get(path, **kwargs)
+                if response.status_code == 429 or response.status_code >= 500:
+                    outcome = f"http_{response.status_code}"
+                    raise UpstreamError(f"HTTP {response.status_code}")
+                data = response.json()
+            except httpx.TimeoutException as e:
+                outcome = "timeout"
+                raise UpstreamError(f"{type(e).__name__}: {e}") from e
+            except (httpx.HTTPError, ValueError) as e:
+                outcome = "invalid_json" if isinstance(e, ValueError) else "transport_error"
+                raise UpstreamError(f"{type(e).__name__}: {e}") from e
+            finally:
+                UPSTREAM_DURATION.observe(time.perf_counter() - started, endpoint=endpoint)
+                if outcome != "ok":
+                    UPSTREAM_REQUESTS.inc(endpoint=endpoint, outcome=outcome)
+            return data
+
+        try:
+            data = await self.governor.run(call, max_wait)
+        except Rejected as e:
+            UPSTREAM_REQUESTS.inc(endpoint=endpoint, outcome="circuit_open" if isinstance(e, CircuitOpen) else "throttled")
+            raise UpstreamUnavailable(str(e), e.retry_after) from e
+        # ok=false (bad key, bad parameters) is a valid answer: checked outside
+        # the governed call so it does not trip the breaker
+        if not data.get("ok"):
+            UPSTREAM_REQUESTS.inc(endpoint=endpoint, outcome="api_error")
+            raise UpstreamError(data.get("message", "Unknown API error"))
+        UPSTREAM_REQUESTS.inc(endpoint=endpoint, outcome="ok")
+        UPSTREAM_STATIONS.observe(len(data.get("stations") or data.get("prices") or ()), endpoint=endpoint)
+        return data
+
+    async def list_stations(self, lat: float, lng: float, radius: float, api_key: str,
+                            timeout: Optional[float] = None, max_wait: Optional[float] = None) -> List[dict]:
+        """list.php: all stations within radius (type=all is always sorted by distance)"""
+        params = {
+            "lat": lat,
+            "lng": lng,
+            "rad": radius,
+            "sort": "dist",
+            "type": "all",
+            "apikey": api_key
+        }
+        data = await self._get("/list.php", params, timeout, max_wait)
+        return data.get("stations", [])
+
+    async def prices(self, station_ids: List[str], api_key: str,
+                     timeout: Optional[float] = None, max_wait: Optional[float] = None) -> Dict[str, dict]:
+        """prices.php: current prices by station ID, batched 10 IDs per call
+
+        Returns ``{id: {"status": "open"|"closed"|"no prices", "e5": ..., ...}}``.
+        """
+        ids = list(dict.fromkeys(station_ids))
+        batches = [ids[i:i + PRICES_BATCH_SIZE] for i in range(0, len(ids), PRICES_BATCH_SIZE)]
+        results = await asyncio.gather(*(
+            self._get("/prices.php", {"ids": ",".join(batch), "apikey": api_key}, timeout, max_wait)
+            for batch in batches
+        ))
+        prices = {}
+        for data in results:
+            prices.update(data.get("prices", {}))
+        return prices
+
+tankerkoenig = TankerkoenigClient()
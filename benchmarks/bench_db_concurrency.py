@@ -0,0 +1,107 @@
+"""SQLite read/write throughput under concurrency: default engine vs. tuned (WAL)
+
+Reader threads page through fuel logs like ``GET /fuel-logs`` while writer
+threads insert fuel logs and commit, both on a fresh database file per run.
+Run from the repository root:
+
+    python benchmarks/bench_db_concurrency.py [--seconds 5] [--readers 8] [--writers 4]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from backend import models  # noqa: E402
+from backend.database import create_db_engine  # noqa: E402
+
+USERS = 50
+SEED_LOGS = 20_000
+
+def seed(session_factory):
+    db = session_factory()
+    db.add_all(models.User(username=f"user{i}", hashed_password="-") for i in range(USERS))
+    db.flush()
+    start = datetime(2020, 1, 1)
+    rng = random.Random(1)
+    db.bulk_insert_mappings(models.FuelLog, [{
+        "user_id": rng.randint(1, USERS), "station_name": "Aral", "liters": 40.0,
+        "price_per_liter": 1.7, "total_price": 68.0, "fuel_type": "diesel",
+        "date": start + timedelta(hours=i),
+    } for i in range(SEED_LOGS)])
+    db.commit()
+    db.close()
+
+def reader(session_factory, stop, counters, rng):
+    while not stop.is_set():
+        db = session_factory()
+        try:
+            db.query(models.FuelLog.id, models.FuelLog.date, models.FuelLog.liters).filter(
+                models.FuelLog.user_id == rng.randint(1, USERS)
+            ).order_by(models.FuelLog.date.desc(), models.FuelLog.id.desc()).limit(50).all()
+            counters["reads"] += 1
+        except OperationalError:
+            counters["errors"] += 1
+        finally:
+            db.close()
+
+def writer(session_factory, stop, counters, rng):
+    while not stop.is_set():
+        db = session_factory()
+        try:
+            db.add(models.FuelLog(user_id=rng.randint(1, USERS), station_name="Shell", liters=35.0,
+                                  price_per_liter=1.8, total_price=63.0, date=datetime.utcnow()))
+            db.commit()
+            counters["writes"] += 1
+        except OperationalError:
+            db.rollback()
+            counters["errors"] += 1
+        finally:
+            db.close()
+
+def run(tuned: bool, seconds: float, readers: int, writers: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{tmp}/bench.db", tuned=tuned)
+        models.Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        seed(session_factory)
+
+        stop = threading.Event()
+        counters = {"reads": 0, "writes": 0, "errors": 0}  # += under the GIL is good enough here
+        threads = [threading.Thread(target=reader, args=(session_factory, stop, counters, random.Random(i)))
+                   for i in range(readers)]
+        threads += [threading.Thread(target=writer, args=(session_factory, stop, counters, random.Random(-i)))
+                    for i in range(writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+    return {key: value / seconds for key, value in counters.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds:.0f} s per run")
+    print(f"{'engine':>8} {'reads/s':>9} {'writes/s':>9} {'errors/s':>9}")
+    for tuned in (False, True):
+        result = run(tuned, args.seconds, args.readers, args.writers)
+        print(f"{'tuned' if tuned else 'default':>8} {result['reads']:>9.0f} "
+              f"{result['writes']:>9.0f} {result['errors']:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Heatmap tile generation: cold render vs. cache hit at city and national zoom
+
+Run from the repository root:
+
+    python benchmarks/bench_heatmap.py [--stations 15000] [--tiles 50]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from backend.heatmap import HeatmapTiles, project, TILE_SIZE  # noqa: E402
+
+# Rough bounding box of Germany; a third of the stations cluster around a few cities
+LAT_RANGE = (47.3, 55.0)
+LNG_RANGE = (5.9, 15.0)
+CITIES = [(52.52, 13.40), (53.55, 9.99), (48.14, 11.58), (50.94, 6.96), (50.11, 8.68)]
+FUELS = ("e5", "e10", "diesel")
+
+def make_stations(count: int, rng: random.Random):
+    stations = []
+    for i in range(count):
+        if i % 3 == 0:
+            lat, lng = rng.choice(CITIES)
+            lat, lng = rng.gauss(lat, 0.08), rng.gauss(lng, 0.12)
+        else:
+            lat, lng = rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)
+        base = rng.uniform(1.62, 1.82)
+        stations.append({"id": f"station-{i}", "lat": lat, "lng": lng,
+                         "e5": round(base + 0.06, 3), "e10": round(base, 3), "diesel": round(base - 0.08, 3)})
+    return stations
+
+def tiles_at(z: int, count: int, rng: random.Random):
+    """Random tiles whose centre lies inside the bounding box"""
+    result = set()
+    for _ in range(count * 20):  # at low zoom the box holds fewer than ``count`` tiles
+        px, py = project(rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE), z)
+        result.add((z, int(px // TILE_SIZE), int(py // TILE_SIZE)))
+        if len(result) == count:
+            break
+    return sorted(result)
+
+def timed(tiles: HeatmapTiles, fuel: str, tile_list):
+    durations = []
+    for z, x, y in tile_list:
+        started = time.perf_counter()
+        png, _ = tiles.lookup(fuel, z, x, y)
+        if png is None:
+            tiles.render(fuel, z, x, y)
+        durations.append((time.perf_counter() - started) * 1000)
+    return np.percentile(durations, 50), np.percentile(durations, 95)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stations", type=int, default=15_000)
+    parser.add_argument("--tiles", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    stations = make_stations(args.stations, rng)
+    tiles = HeatmapTiles(max_entries=10_000)
+    started = time.perf_counter()
+    tiles.update(stations, FUELS)
+    print(f"snapshot of {len(stations)} stations: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    print("tile times in ms; last column: tiles re-rendered after one station's price changed")
+    print(f"{'zoom':>12} {'tiles':>6} {'cold p50':>9} {'cold p95':>9} {'hit p50':>8} {'hit p95':>8} {'re-rendered':>12}")
+    for label, z in (("national", 6), ("regional", 9), ("city", 12), ("street", 15)):
+        tile_list = tiles_at(z, args.tiles, rng)
+        cold = timed(tiles, "e10", tile_list)
+        hit = timed(tiles, "e10", tile_list)
+
+        # One station's price changes: only tiles whose neighbourhood contains it are re-rendered
+        changed = dict(stations[1], e10=stations[1]["e10"] + 0.01)
+        tiles.update([changed] + stations[:1] + stations[2:], FUELS)
+        rendered = tiles.rendered
+        timed(tiles, "e10", tile_list)
+        print(f"{label:>8} z{z:<2} {len(tile_list):>6} {cold[0]:>9.2f} {cold[1]:>9.2f} {hit[0]:>8.3f} "
+              f"{hit[1]:>8.3f} {tiles.rendered - rendered:>12}")
+        stations[1] = changed
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Route corridor search: covering and per-station geometry on long routes
+
+Run from the repository root:
+
+    python benchmarks/bench_route.py [--lengths 150 300 600] [--candidates 1000 5000 20000]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from backend.route import (Route, corridor_circles, decode_polyline, encode_polyline,  # noqa: E402
+                           haversine_np, rank_stations)
+
+def make_route(length_km: float, rng: random.Random, vertex_km: float = 0.1):
+    """Wiggly router-like polyline heading roughly south-west from Berlin, a vertex every 100 m"""
+    lat, lng, heading = 52.52, 13.40, math.radians(215)
+    points = [(lat, lng)]
+    for _ in range(int(length_km / vertex_km)):
+        heading += rng.gauss(0, 0.05)
+        lat += vertex_km * math.cos(heading) / 111.2
+        lng += vertex_km * math.sin(heading) / (111.2 * math.cos(math.radians(lat)))
+        points.append((lat, lng))
+    return points
+
+def make_candidates(circles, count: int, rng: random.Random):
+    """Stations spread over the query circles, as list.php would return them"""
+    stations = []
+    for i in range(count):
+        lat, lng, radius = circles[i % len(circles)]
+        r, angle = radius * math.sqrt(rng.random()), rng.uniform(0, 2 * math.pi)
+        stations.append({
+            "id": f"station-{i}", "brand": "B", "street": "S", "houseNumber": str(i),
+            "lat": lat + r * math.cos(angle) / 111.2,
+            "lng": lng + r * math.sin(angle) / (111.2 * math.cos(math.radians(lat))),
+            "diesel": round(rng.uniform(1.55, 1.80), 3), "isOpen": True,
+        })
+    return stations
+
+def timed(fn, *args, repeat: int = 5):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(*args)
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lengths", type=float, nargs="+", default=[150, 300, 600])
+    parser.add_argument("--candidates", type=int, nargs="+", default=[1_000, 5_000, 20_000])
+    parser.add_argument("--width", type=float, default=2.0)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'route km':>8} {'vertices':>8} {'decode ms':>9} {'route ms':>8} {'cover ms':>8} {'circles':>7} "
+          f"{'candidates':>10} {'rank ms':>8} {'matches':>7} {'max err m':>9}")
+    for length in args.lengths:
+        encoded = encode_polyline(make_route(length, rng))
+        decode_ms, points = timed(decode_polyline, encoded)
+        route_ms, trip = timed(Route, points)
+        cover_ms, circles = timed(corridor_circles, trip, args.width)
+
+        # Every route sample must be covered with its whole corridor cross-section
+        lat = np.array([c[0] for c in circles])
+        lng = np.array([c[1] for c in circles])
+        radius = np.array([c[2] for c in circles])
+        slack = [np.max(radius - haversine_np(la, ln, lat, lng)) for la, ln in zip(trip.lat, trip.lng)]
+        assert min(slack) >= args.width, "corridor not covered"
+
+        for count in args.candidates:
+            stations = make_candidates(circles, count, rng)
+            rank_ms, ranked = timed(rank_stations, stations, trip, args.width, "diesel", 40.0, 7.0)
+
+            # Reference: brute force over every polyline segment, in a local frame at each station
+            vertex_lat, vertex_lng = np.array([p[0] for p in points]), np.array([p[1] for p in points])
+            error = 0.0
+            for s in ranked[:200]:
+                kx = 111.2 * math.cos(math.radians(s["lat"]))
+                x, y = (vertex_lng - s["lng"]) * kx, (vertex_lat - s["lat"]) * 111.2
+                dx, dy = np.diff(x), np.diff(y)
+                t = np.clip(-(x[:-1] * dx + y[:-1] * dy) / np.maximum(dx * dx + dy * dy, 1e-12), 0, 1)
+                reference = np.hypot(x[:-1] + t * dx, y[:-1] + t * dy).min()
+                error = max(error, abs(reference - s["distance_to_route_km"]))
+            print(f"{trip.length_km:>8.0f} {len(points):>8} {decode_ms:>9.1f} {route_ms:>8.1f} {cover_ms:>8.1f} "
+                  f"{len(circles):>7} {count:>10} {rank_ms:>8.1f} {len(ranked):>7} {error * 1000:>9.0f}")
+
+if __name__ == "__main__":
+    main()
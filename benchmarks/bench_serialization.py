@@ -0,0 +1,94 @@
+"""/check-prices payload: build + JSON serialization time and size, per format and encoder
+
+For 50, 500 and 5000 stations (from the fake world) it compares:
+
+* ``full, jsonable_encoder``: the dicts through FastAPI's default path
+  (``jsonable_encoder`` + ``json.dumps``), as before;
+* ``full, response_model``: FastAPI's path when an endpoint returns dicts
+  under a ``response_model`` (pydantic validation + ``dump_json``);
+* ``full, json_response``: the dicts through ``fast_json`` (orjson);
+* ``compact, json_response``: ``format=compact`` through ``fast_json``.
+
+Sizes are raw and gzip-compressed (level 6, as ``CompressionMiddleware``).
+Run from the repository root:
+
+    python benchmarks/bench_serialization.py [--repeat 20]
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from backend.fake_world import FakeWorld  # noqa: E402
+from backend.fast_json import dumps, orjson  # noqa: E402
+from backend.schemas import CheckPricesResponse  # noqa: E402
+from backend.station_store import dashboard_columns, dashboard_station  # noqa: E402
+
+SIZES = (50, 500, 5000)
+
+def make_stations(world: FakeWorld, count: int):
+    stations = world.list_stations(51.0, 10.0, 400.0)[:count]
+    fetched_at = datetime(2026, 1, 1, 12, 0)
+    for i, station in enumerate(stations):
+        station["fetched_at"] = fetched_at + timedelta(minutes=i % 4)  # a few cache fills
+    return stations
+
+def envelope(listing: dict) -> dict:
+    return {"status": "active", **listing, "target_price": 1.7, "updated_at": "2026-01-01T12:00:00",
+            "age_seconds": 30, "stale": False}
+
+def full(stations):
+    return envelope({"all_stations": [entry for entry in map(dashboard_station, stations) if entry]})
+
+def compact(stations):
+    return envelope({"columns": dashboard_columns(stations)})
+
+def default_encoder(content) -> bytes:
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+adapter = TypeAdapter(CheckPricesResponse)
+
+def response_model(content) -> bytes:
+    return adapter.dump_json(adapter.validate_python(content), exclude_unset=True)
+
+VARIANTS = [
+    ("full, jsonable_encoder", full, default_encoder),
+    ("full, response_model", full, response_model),
+    ("full, json_response", full, dumps),
+    ("compact, json_response", compact, dumps),
+]
+
+def measure(stations, build, encode, repeat: int):
+    body = encode(build(stations))
+    started = time.perf_counter()
+    for _ in range(repeat):
+        encode(build(stations))
+    return (time.perf_counter() - started) / repeat * 1000, len(body), len(gzip.compress(body, 6))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"JSON encoder: {'orjson ' + orjson.__version__ if orjson else 'json (orjson not installed)'}")
+    world = FakeWorld(stations=20000)
+    print(f"{'stations':>8}  {'variant':<24}{'ms':>9}{'bytes':>10}{'gzip':>9}{'speedup':>9}")
+    for count in SIZES:
+        stations = make_stations(world, count)
+        baseline = None
+        for name, build, encode in VARIANTS:
+            ms, size, compressed = measure(stations, build, encode, args.repeat)
+            baseline = baseline or ms
+            print(f"{len(stations):>8}  {name:<24}{ms:>9.2f}{size:>10}{compressed:>9}{baseline / ms:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Radius query latency: grid index vs. naive linear scan
+
+Run from the repository root:
+
+    python benchmarks/bench_spatial.py [--queries 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.spatial import GridIndex, naive_query  # noqa: E402
+
+# Rough bounding box of Germany
+LAT_RANGE = (47.3, 55.0)
+LNG_RANGE = (5.9, 15.0)
+
+def make_stations(count: int, rng: random.Random):
+    return [{
+        "id": f"station-{i}",
+        "lat": rng.uniform(*LAT_RANGE),
+        "lng": rng.uniform(*LNG_RANGE),
+        "diesel": round(rng.uniform(1.45, 1.85), 3),
+    } for i in range(count)]
+
+def timed(fn, queries):
+    started = time.perf_counter()
+    results = [fn(*q) for q in queries]
+    return (time.perf_counter() - started) / len(queries) * 1000, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 15_000, 100_000])
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'stations':>9} {'radius':>6} {'build ms':>9} {'naive ms':>9} {'index ms':>9} {'speedup':>8} {'avg hits':>9}")
+    for size in args.sizes:
+        stations = make_stations(size, rng)
+        started = time.perf_counter()
+        index = GridIndex(stations)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        for radius in (5.0, 10.0, 25.0):
+            queries = [(rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE), radius) for _ in range(args.queries)]
+            naive_ms, expected = timed(lambda lat, lng, r: naive_query(stations, lat, lng, r), queries)
+            index_ms, actual = timed(index.query, queries)
+
+            for a, b in zip(expected, actual):
+                assert sorted(s["id"] for s in a) == sorted(s["id"] for s in b), "index result differs from naive scan"
+
+            hits = sum(len(r) for r in actual) / len(actual)
+            print(f"{size:>9} {radius:>6.0f} {build_ms:>9.1f} {naive_ms:>9.3f} {index_ms:>9.3f} "
+                  f"{naive_ms / index_ms:>7.1f}x {hits:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""Load test: many users logging in, polling prices, exploring and keeping a fuel log
+
+Every virtual user logs in, sets a home area near a German city and adds a
+favorite. It then repeats a weighted mix of actions with a think time in
+between until the run ends:
+
+    poll     GET /check-prices (with If-None-Match), /favorite-locations/prices
+    explore  GET /search-stations, /route/stations, /heatmap tiles
+    log      GET /fuel-logs (with If-None-Match), /fuel-logs/statistics, POST /fuel-logs
+    login    POST /token again (bcrypt)
+
+The report lists throughput, and per operation the count, errors (5xx and
+transport errors), 304s and the p50/p95/p99/max latency.
+
+``--spawn`` starts everything locally: the fake Tankerkoenig server
+(``backend.fake_tankerkoenig``) and the app on a fresh SQLite database, with
+the login rate limit raised. Run from the repository root:
+
+    python benchmarks/loadtest.py --spawn [--users 50] [--duration 60] [--latency-ms 80] [--error-rate 0.01]
+
+Without ``--spawn`` it targets a running app (``--base-url``, admin login via
+``--admin-user``/``--admin-password``).
+"""
+import argparse
+import asyncio
+import collections
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from backend.fake_world import CITIES  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "load-test-password"
+
+# (action, weight)
+MIX = [
+    ("check-prices", 30), ("favorite-prices", 8),
+    ("search-stations", 10), ("route", 3), ("heatmap", 6),
+    ("fuel-logs", 8), ("fuel-stats", 4), ("fuel-log-create", 2),
+    ("login", 1),
+]
+
+class Recorder:
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.statuses = collections.defaultdict(collections.Counter)
+
+    def add(self, operation: str, seconds: float, status: int):
+        self.latencies[operation].append(seconds)
+        self.statuses[operation][status] += 1
+
+    def report(self, elapsed: float) -> dict:
+        operations = {}
+        for operation in sorted(self.latencies):
+            values = sorted(self.latencies[operation])
+            statuses = self.statuses[operation]
+            operations[operation] = {
+                "count": len(values),
+                "errors": sum(n for status, n in statuses.items() if status == 0 or status >= 500),
+                "not_modified": statuses.get(304, 0),
+                **{f"p{q}_ms": round(percentile(values, q) * 1000, 1) for q in (50, 95, 99)},
+                "max_ms": round(values[-1] * 1000, 1),
+                "statuses": {str(status): n for status, n in sorted(statuses.items())},
+            }
+        total = sum(op["count"] for op in operations.values())
+        return {"elapsed_s": round(elapsed, 1), "requests": total, "throughput_rps": round(total / elapsed, 1),
+                "operations": operations}
+
+def percentile(values, q: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, username: str, rng: random.Random, think: float):
+        self.client = client
+        self.recorder = recorder
+        self.username = username
+        self.rng = rng
+        self.think = think
+        self.headers = {}
+        self.etags = {}
+        name, lat, lng, _ = rng.choice(CITIES)
+        self.city = name
+        self.lat = lat + rng.gauss(0, 0.05)
+        self.lng = lng + rng.gauss(0, 0.08)
+
+    async def request(self, operation: str, method: str, url: str, conditional: bool = False, **kwargs):
+        headers = dict(self.headers)
+        if conditional and url in self.etags:
+            headers["If-None-Match"] = self.etags[url]
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.add(operation, time.perf_counter() - started, 0)
+            return None
+        self.recorder.add(operation, time.perf_counter() - started, response.status_code)
+        if conditional and "etag" in response.headers:
+            self.etags[url] = response.headers["etag"]
+        return response
+
+    async def login(self, attempts: int = 1) -> bool:
+        """``attempts`` > 1 waits out 429/503 (busy password pool) like a patient client"""
+        for _ in range(attempts):
+            response = await self.request("login", "POST", "/token",
+                                          data={"username": self.username, "password": PASSWORD})
+            if response is not None and response.status_code in (429, 503):
+                await asyncio.sleep(float(response.headers.get("retry-after", "1")))
+                continue
+            if response is None or response.status_code != 200:
+                return False
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            return True
+        return False
+
+    async def setup(self) -> bool:
+        if not await self.login(attempts=20):
+            return False
+        await self.request("settings", "PUT", "/me/settings", params={
+            "latitude": self.lat, "longitude": self.lng, "radius": self.rng.choice([5, 10, 15]),
+            "target_price": round(self.rng.uniform(1.60, 1.80), 2), "is_active": True})
+        await self.request("favorite-create", "POST", "/favorite-locations", params={
+            "name": "Arbeit", "city": self.city, "latitude": self.lat + self.rng.gauss(0, 0.05),
+            "longitude": self.lng + self.rng.gauss(0, 0.05)})
+        return True
+
+    async def act(self, action: str):
+        rng = self.rng
+        if action == "check-prices":
+            await self.request(action, "GET", "/check-prices", conditional=True)
+        elif action == "favorite-prices":
+            await self.request(action, "GET", "/favorite-locations/prices")
+        elif action == "search-stations":
+            await self.request(action, "GET", "/search-stations", params={
+                "lat": self.lat + rng.gauss(0, 0.1), "lng": self.lng + rng.gauss(0, 0.15),
+                "radius": rng.choice([2, 5, 10]), "fuel_type": rng.choice(["e5", "e10", "diesel"]),
+                "sort": rng.choice(["dist", "price"])})
+        elif action == "route":
+            _, lat, lng, _ = rng.choice(CITIES)
+            await self.request(action, "GET", "/route/stations", params={
+                "start": f"{self.lat:.5f},{self.lng:.5f}", "end": f"{lat:.5f},{lng:.5f}",
+                "width": rng.choice([1, 2, 5]), "limit": 20})
+        elif action == "heatmap":
+            z = rng.choice([9, 10, 11, 12])
+            x = int((self.lng + 180) / 360 * (1 << z))
+            y = int((1 - math.asinh(math.tan(math.radians(self.lat))) / math.pi) / 2 * (1 << z))
+            await self.request(action, "GET", f"/heatmap/{z}/{x + rng.randint(-1, 1)}/{y + rng.randint(-1, 1)}")
+        elif action == "fuel-logs":
+            await self.request(action, "GET", "/fuel-logs", conditional=True)
+        elif action == "fuel-stats":
+            await self.request(action, "GET", "/fuel-logs/statistics", conditional=True)
+        elif action == "fuel-log-create":
+            await self.request(action, "POST", "/fuel-logs", params={
+                "station_name": "Load Test", "liters": round(rng.uniform(20, 60), 2),
+                "price_per_liter": round(rng.uniform(1.55, 1.90), 3), "fuel_type": "diesel", "city": self.city})
+        elif action == "login":
+            await self.login()
+
+    async def run(self, deadline: float):
+        actions, weights = zip(*MIX)
+        while time.monotonic() < deadline:
+            await self.act(self.rng.choices(actions, weights)[0])
+            await asyncio.sleep(self.rng.expovariate(1 / self.think) if self.think else 0)
+
+async def with_retry(call, attempts: int = 20):
+    """Retry 429/503 (login limit, busy password pool) as a patient client would"""
+    for _ in range(attempts):
+        response = await call()
+        if response.status_code not in (429, 503):
+            return response
+        await asyncio.sleep(float(response.headers.get("retry-after", "1")))
+    return response
+
+async def create_users(client: httpx.AsyncClient, args) -> list:
+    response = await with_retry(lambda: client.post(
+        "/token", data={"username": args.admin_user, "password": args.admin_password}))
+    response.raise_for_status()
+    admin = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    names = [f"load{i:04d}" for i in range(args.users)]
+    semaphore = asyncio.Semaphore(4)  # bcrypt pool: don't overrun its queue
+
+    async def create(name: str):
+        async with semaphore:
+            response = await with_retry(lambda: client.post(
+                "/admin/users", params={"username": name, "password": PASSWORD}, headers=admin))
+            if response.status_code == 400:  # exists from an earlier run: reset the password
+                response = await with_retry(lambda: client.put(
+                    f"/admin/users/{name}/reset-password", params={"new_password": PASSWORD}, headers=admin))
+            response.raise_for_status()
+
+    await asyncio.gather(*(create(name) for name in names))
+    return names
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.users + 10, max_keepalive_connections=args.users + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        names = await create_users(client, args)
+        users = [VirtualUser(client, Recorder(), name, random.Random(args.seed + i), args.think_ms / 1000)
+                 for i, name in enumerate(names)]
+        ready = await asyncio.gather(*(user.setup() for user in users))
+        users = [user for user, ok in zip(users, ready) if ok]
+        if not users:
+            raise SystemExit("No virtual user could log in")
+
+        recorder = Recorder()  # the setup phase is not part of the result
+        for user in users:
+            user.recorder = recorder
+        started = time.monotonic()
+        await asyncio.gather(*(user.run(started + args.duration) for user in users))
+        result = {"users": len(users), **recorder.report(time.monotonic() - started)}
+
+        response = await client.post("/token", data={"username": args.admin_user, "password": args.admin_password})
+        if response.status_code == 200:
+            admin = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            upstream = await client.get("/admin/upstream/stats", headers=admin)
+            if upstream.status_code == 200:
+                result["upstream"] = upstream.json()
+        if args.fake_url:
+            fake = await client.get(f"{args.fake_url}/stats")
+            if fake.status_code == 200:
+                result["fake_upstream"] = fake.json()
+        return result
+
+def print_report(result: dict):
+    print(f"{result['users']} users, {result['requests']} requests in {result['elapsed_s']} s: "
+          f"{result['throughput_rps']} req/s")
+    print(f"{'operation':<18}{'count':>8}{'errors':>8}{'304':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for name, op in result["operations"].items():
+        print(f"{name:<18}{op['count']:>8}{op['errors']:>8}{op['not_modified']:>7}"
+              f"{op['p50_ms']:>9}{op['p95_ms']:>9}{op['p99_ms']:>9}{op['max_ms']:>9}")
+    if "upstream" in result:
+        governor, flights = result["upstream"]["governor"], result["upstream"]["single_flight"]
+        print(f"upstream: circuit {governor['circuit']['state']} ({governor['circuit']['trips']} trips), "
+              f"throttled {governor['rate_limit']['throttled']}, {flights['upstream_calls']} calls "
+              f"for {flights['upstream_calls'] + flights['coalesced_callers']} lookups")
+    if "fake_upstream" in result:
+        print(f"fake upstream calls: {result['fake_upstream']['calls']}")
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f"{url} did not come up within {timeout:g} s")
+
+def spawn(args, tmp: str) -> list:
+    """Fake upstream + app on a fresh database; returns the processes"""
+    fake_port, app_port = args.port + 1, args.port
+    args.fake_url = f"http://127.0.0.1:{fake_port}"
+    args.base_url = f"http://127.0.0.1:{app_port}"
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{tmp}/loadtest.db",
+               TANKERKOENIG_BASE_URL=args.fake_url,
+               TANKERKOENIG_API_KEY="load-test",
+               PRICE_PROVIDER="tankerkoenig",
+               LOGIN_RATE_LIMIT="1000000",
+               UPSTREAM_RATE_PER_MINUTE=str(args.upstream_rate),
+               LOG_LEVEL="WARNING")
+    subprocess.run([sys.executable, "-m", "backend.migrate", "upgrade"], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    fake = subprocess.Popen([sys.executable, "-m", "backend.fake_tankerkoenig", "--port", str(fake_port),
+                             "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+                             "--error-rate", str(args.error_rate), "--seed", str(args.seed)], cwd=ROOT, env=env)
+    processes = [fake]
+    wait_until_up(f"{args.fake_url}/stats", fake)
+    app = subprocess.Popen([sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(app_port),
+                            "--log-level", "warning", "--no-access-log"], cwd=ROOT, env=env)
+    processes.append(app)
+    wait_until_up(f"{args.base_url}/metrics", app)
+    return processes
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test: login + poll + explore + fuel-log mix")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--fake-url", default=None, help="fake Tankerkoenig server, for its call counts")
+    parser.add_argument("--admin-user", default="admin")
+    parser.add_argument("--admin-password", default="admin123")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds")
+    parser.add_argument("--think-ms", type=float, default=500.0, help="mean pause between a user's actions")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    parser.add_argument("--spawn", action="store_true", help="start the fake upstream and the app locally")
+    parser.add_argument("--port", type=int, default=8700, help="--spawn: app port (fake upstream on port + 1)")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="--spawn: fake upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=40.0)
+    parser.add_argument("--error-rate", type=float, default=0.01, help="--spawn: fake upstream HTTP 503 share")
+    parser.add_argument("--upstream-rate", type=float, default=6000.0, help="--spawn: governor calls per minute")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        processes = spawn(args, tmp) if args.spawn else []
+        try:
+            result = asyncio.run(run(args))
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait(timeout=10)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+if __name__ == "__main__":
+    main()
@@ -298,9 +298,9 @@ async function initApp() {
 
             console.log('🔧 Debug Info:', debugData);
 
-            // Show warning if using test API key
-            if (debugData.api_config?.is_test_key) {
-                console.warn('⚠️ Using TEST API KEY - Only mock data will be returned!');
+            // Show warning if prices come from the simulated provider
+            if (debugData.api_config?.is_mock) {
+                console.warn('⚠️ No real API key - prices are simulated (mock data)!');
                 console.warn('   Get a real API key from: https://creativecommons.tankerkoenig.de');
             }
 
@@ -499,14 +499,97 @@ function startTracking() {
         { enableHighAccuracy: true, timeout: 5000, maximumAge: 0 }
     );
 
-    // Poll prices
+    // Initial prices, then live updates via SSE (falls back to 5 min polling)
     checkPrices();
-    window.priceInterval = setInterval(checkPrices, 1000 * 60 * 5); // 5 min
+    startPriceStream();
 }
 
 function stopTracking() {
     if (watchId) navigator.geolocation.clearWatch(watchId);
     if (window.priceInterval) clearInterval(window.priceInterval);
+    stopPriceStream();
+}
+
+function startPricePolling() {
+    if (window.priceInterval) return;
+    window.priceInterval = setInterval(checkPrices, 1000 * 60 * 5); // 5 min
+}
+
+let priceStreamAttempt = 0;
+
+async function startPriceStream() {
+    stopPriceStream();
+    if (!window.EventSource) {
+        startPricePolling();
+        return;
+    }
+
+    // The stream URL carries a short-lived ticket, never the bearer token
+    const attempt = ++priceStreamAttempt;
+    let ticket;
+    try {
+        const res = await fetch('/prices/stream/ticket', {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${token}` }
+        });
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        ticket = (await res.json()).ticket;
+        if (attempt !== priceStreamAttempt) return; // stopped or restarted meanwhile
+    } catch (e) {
+        console.warn('No stream ticket, falling back to polling', e);
+        startPricePolling();
+        return;
+    }
+
+    const source = new EventSource(`/prices/stream?ticket=${encodeURIComponent(ticket)}`);
+    window.priceStream = source;
+    let connected = false;
+
+    source.addEventListener('snapshot', (e) => {
+        connected = true;
+        const data = JSON.parse(e.data);
+        stations = data.stations || [];
+        stations.sort((a, b) => a.distance - b.distance);
+        if (data.target_price) window.targetPrice = data.target_price;
+        updateStationMarkers();
+    });
+
+    source.addEventListener('delta', (e) => {
+        const data = JSON.parse(e.data);
+        const byId = new Map(stations.map(s => [s.id, s]));
+        (data.removed || []).forEach(id => byId.delete(id));
+        (data.changed || []).forEach(s => byId.set(s.id, s));
+        stations = Array.from(byId.values()).sort((a, b) => a.distance - b.distance);
+        console.log(`📡 Price update: ${(data.changed || []).length} changed, ${(data.removed || []).length} removed`);
+        updateStationMarkers();
+    });
+
+    source.addEventListener('alert', (e) => {
+        const data = JSON.parse(e.data);
+        if (notificationPermissionGranted) notifyCheapStation(data.station);
+    });
+
+    source.onerror = () => {
+        // Reconnecting would reuse the expired ticket: reopen with a fresh one instead
+        source.close();
+        if (window.priceStream !== source) return;
+        window.priceStream = null;
+        if (connected) {
+            setTimeout(() => { if (attempt === priceStreamAttempt) startPriceStream(); }, 5000);
+        } else {
+            // Refused (no ingestion, area not ingested) -> poll instead
+            console.warn('Price stream unavailable, falling back to polling');
+            startPricePolling();
+        }
+    };
+}
+
+function stopPriceStream() {
+    priceStreamAttempt++;
+    if (window.priceStream) {
+        window.priceStream.close();
+        window.priceStream = null;
+    }
 }
 
 async function updateLocation(pos) {
@@ -527,11 +610,33 @@ async function updateLocation(pos) {
     } catch (e) { console.error("Loc update failed", e); }
 }
 
+// Expands a compact (format=compact) station payload into one object per station
+function expandStationColumns(columns, fuelType) {
+    if (!columns) return [];
+    const result = [];
+    for (let i = 0; i < columns.count; i++) {
+        const brand = columns.brands[columns.brand[i]];
+        const street = columns.streets[columns.street[i]];
+        const station = {
+            id: columns.id[i],
+            name: `${brand} - ${street} ${columns.house_number[i] ?? ''}`,
+            price: columns.price[i],
+            distance: columns.distance[i],
+            lat: columns.lat[i],
+            lng: columns.lng[i],
+            updated_at: columns.timestamps[columns.updated_at[i]]
+        };
+        if (fuelType) station.fuel_type = fuelType;
+        result.push(station);
+    }
+    return result;
+}
+
 async function checkPrices() {
     if (!isTracking) return;
 
     try {
-        const res = await fetch('/check-prices', {
+        const res = await fetch('/check-prices?format=compact', {
             headers: { 'Authorization': `Bearer ${token}` }
         });
         const data = await res.json();
@@ -539,7 +644,7 @@ async function checkPrices() {
         console.log('💰 Price Check Response:', data);
 
         if (data.status === 'active' || data.status === 'api_error') {
-            stations = data.all_stations || []; // ALL stations for map display
+            stations = data.columns ? expandStationColumns(data.columns) : (data.all_stations || []); // ALL stations for map display
             window.targetPrice = data.target_price || 999; // Store target price globally
 
             console.log(`📍 Found ${stations.length} stations in radius`);
@@ -558,40 +663,7 @@ async function checkPrices() {
             if (cheapStations.length > 0 && notificationPermissionGranted) {
                 // Sort by price to get the cheapest
                 cheapStations.sort((a, b) => a.price - b.price);
-                const cheapest = cheapStations[0];
-
-                // Create unique ID for this station
-                const stationId = `${cheapest.name}-${cheapest.price}`;
-
-                // Check if we should notify
-                if (shouldNotifyForStation(stationId, cheapest.price)) {
-                    console.log('🔔 Sending notification for cheap station:', cheapest.name);
-
-                    // Update tracking
-                    lastNotificationTime = Date.now();
-                    notifiedStations.add(stationId);
-
-                    // Clear old notifications after 30 minutes
-                    setTimeout(() => {
-                        notifiedStations.delete(stationId);
-                    }, 30 * 60 * 1000);
-
-                    // Find station index for click handler
-                    const stationIndex = stations.indexOf(cheapest);
-
-                    // Show notification
-                    showLocalNotification(
-                        `⛽ Günstiger Sprit gefunden!`,
-                        `${cheapest.name}\n${cheapest.price.toFixed(2)} € • ${cheapest.distance.toFixed(1)} km entfernt`,
-                        {
-                            action: 'open-station',
-                            stationIndex: stationIndex,
-                            station: cheapest
-                        }
-                    );
-
-                    console.log(`   💰 ${cheapest.name}: ${cheapest.price.toFixed(2)} € (${cheapest.distance.toFixed(1)} km)`);
-                }
+                notifyCheapStation(cheapStations[0]);
             }
         } else if (data.status === 'inactive') {
             console.log('⏸️  Tracking is inactive or no location data available');
@@ -601,6 +673,41 @@ async function checkPrices() {
     }
 }
 
+function notifyCheapStation(cheapest) {
+    // Create unique ID for this station
+    const stationId = `${cheapest.name}-${cheapest.price}`;
+
+    // Check if we should notify
+    if (shouldNotifyForStation(stationId, cheapest.price)) {
+        console.log('🔔 Sending notification for cheap station:', cheapest.name);
+
+        // Update tracking
+        lastNotificationTime = Date.now();
+        notifiedStations.add(stationId);
+
+        // Clear old notifications after 30 minutes
+        setTimeout(() => {
+            notifiedStations.delete(stationId);
+        }, 30 * 60 * 1000);
+
+        // Find station index for click handler
+        const stationIndex = stations.findIndex(s => s === cheapest || (cheapest.id && s.id === cheapest.id));
+
+        // Show notification
+        showLocalNotification(
+            `⛽ Günstiger Sprit gefunden!`,
+            `${cheapest.name}\n${cheapest.price.toFixed(2)} € • ${cheapest.distance.toFixed(1)} km entfernt`,
+            {
+                action: 'open-station',
+                stationIndex: stationIndex,
+                station: cheapest
+            }
+        );
+
+        console.log(`   💰 ${cheapest.name}: ${cheapest.price.toFixed(2)} € (${cheapest.distance.toFixed(1)} km)`);
+    }
+}
+
 // --- Map Markers & Explore List ---
 
 function updateStationMarkers() {
@@ -844,7 +951,8 @@ async function performExploreSearch() {
         const params = new URLSearchParams({
             radius: maxDist,
             max_price: maxPrice,
-            fuel_type: exploreFuelType
+            fuel_type: exploreFuelType,
+            format: 'compact'
         });
 
         const res = await fetch(`/search-stations?${params}`, {
@@ -860,7 +968,7 @@ async function performExploreSearch() {
         console.log('🔍 Explore Search Response:', data);
 
         if (data.status === 'active') {
-            exploreStations = data.stations || [];
+            exploreStations = data.columns ? expandStationColumns(data.columns, data.fuel_type) : (data.stations || []);
         } else if (data.status === 'no_location') {
             list.innerHTML = `
                 <div class="col-span-full glass p-8 rounded-3xl text-center">
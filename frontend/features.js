@@ -68,18 +68,18 @@ window.loadFavorites = async function () {
             return;
         }
 
-        // Load prices for all favorites
-        const favoritesWithPrices = await Promise.all(favorites.map(async (fav) => {
-            try {
-                const priceRes = await fetch(`/favorite-locations/${fav.id}/prices?fuel_type=${currentFuelType}`, {
-                    headers: { 'Authorization': `Bearer ${token}` }
-                });
-                const priceData = await priceRes.json();
-                return { ...fav, prices: priceData };
-            } catch {
-                return { ...fav, prices: null };
-            }
-        }));
+        // Load prices for all favorites in one batch request
+        let pricesById = {};
+        try {
+            const priceRes = await fetch(`/favorite-locations/prices?fuel_type=${currentFuelType}`, {
+                headers: { 'Authorization': `Bearer ${token}` }
+            });
+            const priceData = await priceRes.json();
+            (priceData.locations || []).forEach(p => { pricesById[p.location_id] = p; });
+        } catch (err) {
+            console.error(err);
+        }
+        const favoritesWithPrices = favorites.map(fav => ({ ...fav, prices: pricesById[fav.id] || null }));
 
         list.innerHTML = favoritesWithPrices.map(fav => {
             const homeIcon = fav.is_home ? '🏠 ' : '';
@@ -315,45 +315,19 @@ window.toggleHeatmap = async function (enabled) {
             headers: { 'Authorization': `Bearer ${token}` }
         });
 
-        if (enabled && stations.length > 0) {
-            // Create heatmap from stations
-            const heatData = stations.map(s => {
-                // Color based on price
-                let intensity = 0.5;
-                if (s.price < 1.50) intensity = 0.2; // Green
-                else if (s.price < 1.70) intensity = 0.4; // Yellow
-                else if (s.price < 2.00) intensity = 0.7; // Orange
-                else intensity = 1.0; // Red
-
-                return [s.lat, s.lng, intensity];
-            });
+        if (heatmapLayer) {
+            mapHome.removeLayer(heatmapLayer);
+            heatmapLayer = null;
+        }
 
-            if (heatmapLayer) {
-                mapHome.removeLayer(heatmapLayer);
-            }
-
-            // Simple circle-based heatmap (Leaflet doesn't have built-in heatmap)
-            // For production, use leaflet-heat plugin
-            heatmapLayer = L.layerGroup();
-            stations.forEach(s => {
-                let color = '#22c55e'; // green
-                if (s.price > 1.70) color = '#facc15'; // yellow
-                if (s.price > 1.85) color = '#fb923c'; // orange
-                if (s.price > 2.00) color = '#ef4444'; // red
-
-                L.circle([s.lat, s.lng], {
-                    radius: 200,
-                    color: color,
-                    fillColor: color,
-                    fillOpacity: 0.3,
-                    weight: 1
-                }).addTo(heatmapLayer);
+        if (enabled) {
+            // Server-side interpolated price tiles (green = cheap, red = expensive)
+            heatmapLayer = L.tileLayer(`/heatmap/{z}/{x}/{y}?fuel_type=${currentFuelType}`, {
+                opacity: 0.8,
+                maxZoom: 18,
+                zIndex: 10
             });
-
             heatmapLayer.addTo(mapHome);
-        } else if (heatmapLayer) {
-            mapHome.removeLayer(heatmapLayer);
-            heatmapLayer = null;
         }
 
     } catch (err) {
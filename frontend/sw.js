@@ -50,6 +50,7 @@ self.addEventListener('fetch', event => {
         url.pathname.startsWith('/me') ||
         url.pathname.startsWith('/check-prices') ||
         url.pathname.startsWith('/search-stations') ||
+        url.pathname.startsWith('/fuel-logs') ||
         url.pathname.startsWith('/admin')) {
         event.respondWith(
             fetch(event.request).catch(() => {
@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Importing backend.database must not open the development database: the app
+# tests share one throwaway file, simulated prices and no ingestion worker
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='l8tefuel-tests-')}/app.db")
+os.environ.setdefault("PRICE_PROVIDER", "fake")
+os.environ.setdefault("INGEST_ENABLED", "0")
+
+from sqlalchemy.orm import Session  # noqa: E402
+
+from backend import migrate, models  # noqa: E402
+from backend.database import create_db_engine  # noqa: E402
+
+@pytest.fixture
+def engine(tmp_path):
+    """Empty SQLite database file, tuned like production"""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def db(engine):
+    """Session on a migrated database with one user"""
+    migrate.upgrade(engine)
+    with Session(engine) as session:
+        session.add(models.User(username="driver", hashed_password="x"))
+        session.commit()
+        yield session
+
+@pytest.fixture(scope="session")
+def app_client():
+    """The app on the shared test database, started once (creates admin / admin123)"""
+    from fastapi.testclient import TestClient
+
+    from backend import database
+    from backend.main import app
+    migrate.upgrade(database.engine)
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def client(app_client, monkeypatch):
+    """``app_client`` with a cold principal cache and no login rate limit"""
+    from backend.login_guard import login_limiter
+    from backend.principal_cache import principal_cache
+    monkeypatch.setattr(login_limiter, "limit", 10_000)
+    principal_cache.clear()
+    return app_client
+
+def login(client, username: str, password: str) -> dict:
+    """Authorization header for ``username``"""
+    response = client.post("/token", data={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+def admin_headers(client) -> dict:
+    return login(client, "admin", "admin123")
+
+@pytest.fixture
+def new_user(client, admin_headers):
+    """(username, headers) of a new non-admin user, a fresh one per test"""
+    username = f"user{os.urandom(4).hex()}"
+    response = client.post("/admin/users", params={"username": username, "password": "secret1"}, headers=admin_headers)
+    assert response.status_code == 201, response.text
+    return username, login(client, username, "secret1")
@@ -0,0 +1,124 @@
+"""Incremental consumption updates (after_insert/after_update/after_delete) must match a full rebuild"""
+from datetime import datetime
+
+import pytest
+
+from backend import consumption, fuel_stats, models
+
+def add(db, day: int, liters: float = 40.0, odometer=None, fuel_type: str = "diesel") -> models.FuelLog:
+    user = db.query(models.User).one()
+    log = models.FuelLog(user_id=user.id, station_name="Test", liters=liters, price_per_liter=1.7,
+                         total_price=liters * 1.7, fuel_type=fuel_type, odometer=odometer,
+                         date=datetime(2026, 3, day, 12, 0))
+    db.add(log)
+    db.flush()
+    consumption.after_insert(db, log)
+    db.commit()
+    return log
+
+def update(db, log: models.FuelLog, **changes):
+    before = consumption.snapshot(log)
+    for field, value in changes.items():
+        setattr(log, field, value)
+    log.total_price = log.liters * log.price_per_liter
+    db.flush()
+    consumption.after_update(db, log, before)
+    db.commit()
+
+def delete(db, log: models.FuelLog):
+    before = consumption.snapshot(log)
+    db.delete(log)
+    db.flush()
+    consumption.after_delete(db, before)
+    db.commit()
+
+def derived(db) -> dict:
+    return {log.id: (log.kilometers_driven, log.consumption) for log in db.query(models.FuelLog)}
+
+def statistics(db) -> dict:
+    return fuel_stats.get_statistics(db, db.query(models.User.id).scalar())
+
+def assert_matches_rebuild(db):
+    """A full rebuild changes nothing: neither the logs nor the statistics rollups"""
+    incremental, stats = derived(db), statistics(db)
+    user_id = db.query(models.User.id).scalar()
+    assert consumption.rebuild(db, user_id) == 0
+    db.commit()
+    db.expire_all()
+    assert derived(db) == incremental
+    fuel_stats.rebuild(db, user_id)
+    assert statistics(db) == stats
+
+def test_in_order_logs(db):
+    add(db, 1, odometer=10000)
+    second = add(db, 5, liters=30, odometer=10500)
+    add(db, 9, liters=35, odometer=11000)
+    assert (second.kilometers_driven, second.consumption) == (500, pytest.approx(6.0))
+    assert_matches_rebuild(db)
+
+def test_back_dated_insert_moves_the_follower_baseline(db):
+    add(db, 1, odometer=10000)
+    later = add(db, 10, liters=50, odometer=11000)
+    assert later.kilometers_driven == 1000
+
+    middle = add(db, 5, liters=25, odometer=10400)
+    db.refresh(later)
+    assert middle.kilometers_driven == 400
+    assert later.kilometers_driven == 600
+    assert_matches_rebuild(db)
+
+def test_same_date_logs_are_ordered_by_id(db):
+    add(db, 1, odometer=10000)
+    first = add(db, 5, liters=20, odometer=10300)
+    second = add(db, 5, liters=10, odometer=10450)
+    assert first.date == second.date and first.id < second.id
+    assert first.kilometers_driven == 300
+    assert second.kilometers_driven == 150
+    assert_matches_rebuild(db)
+
+    delete(db, first)
+    db.refresh(second)
+    assert second.kilometers_driven == 450
+    assert_matches_rebuild(db)
+
+def test_logs_without_odometer_are_skipped_as_baseline(db):
+    add(db, 1, odometer=10000)
+    gap = add(db, 3, liters=15)
+    zero = add(db, 4, liters=15, odometer=0)
+    after = add(db, 6, liters=30, odometer=10600)
+    assert (gap.kilometers_driven, gap.consumption) == (None, None)
+    assert (zero.kilometers_driven, zero.consumption) == (None, None)
+    assert after.kilometers_driven == 600
+    assert_matches_rebuild(db)
+
+    # Giving the gap an odometer makes it the follower's new baseline
+    update(db, gap, odometer=10200)
+    db.refresh(after)
+    assert gap.kilometers_driven == 200
+    assert after.kilometers_driven == 400
+    assert_matches_rebuild(db)
+
+def test_moving_a_log_to_another_date(db):
+    add(db, 1, odometer=10000)
+    moved = add(db, 4, liters=20, odometer=10300)
+    add(db, 8, liters=30, odometer=10700)
+    last = add(db, 12, liters=40, odometer=11200)
+
+    # Back-dating the last log: it now sits between day 4 and day 8 with an odometer that goes backwards there
+    update(db, last, date=datetime(2026, 3, 6, 12, 0))
+    assert_matches_rebuild(db)
+
+    update(db, moved, date=datetime(2026, 3, 20, 12, 0), fuel_type="e10")
+    assert_matches_rebuild(db)
+
+def test_delete_changes_only_the_follower(db):
+    add(db, 1, odometer=10000)
+    middle = add(db, 5, liters=25, odometer=10400)
+    last = add(db, 9, liters=30, odometer=10900)
+    delete(db, middle)
+    db.refresh(last)
+    assert last.kilometers_driven == 900
+    assert_matches_rebuild(db)
+
+    delete(db, last)
+    assert_matches_rebuild(db)
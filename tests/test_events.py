@@ -0,0 +1,50 @@
+"""SSE fan-out: deltas per area and alerts only when a price drops through the target"""
+import asyncio
+
+from backend.events import PriceBroadcaster
+
+def station(station_id: str, e10: float, is_open: bool = True) -> dict:
+    return {"id": station_id, "brand": "Aral", "street": "Hauptstr.", "e10": e10, "isOpen": is_open}
+
+def publish(broadcaster: PriceBroadcaster, stations):
+    asyncio.run(broadcaster.publish(lambda lat, lng, radius: stations))
+
+def events(subscription) -> list:
+    sent = []
+    while not subscription.queue.empty():
+        sent.append(subscription.queue.get_nowait())
+    return sent
+
+def alerts(subscription) -> list:
+    return [data["station"]["id"] for event, data in events(subscription) if event == "alert"]
+
+def subscribe(stations, target_price=1.70):
+    broadcaster = PriceBroadcaster()
+    return broadcaster, broadcaster.subscribe(52.5, 13.4, 5, target_price, stations)
+
+def test_alert_when_price_drops_through_target():
+    broadcaster, subscription = subscribe([station("a", 1.75), station("b", 1.72)])
+    publish(broadcaster, [station("a", 1.69), station("b", 1.71)])
+    assert alerts(subscription) == ["a"]
+
+def test_no_alert_for_station_without_previous_price():
+    broadcaster, subscription = subscribe([station("a", 1.75), station("b", 1.60, is_open=False)])
+    publish(broadcaster, [station("a", 1.75), station("b", 1.60), station("c", 1.55)])
+    sent = events(subscription)
+    assert [event for event, _ in sent] == ["delta"]
+    assert {entry["id"] for entry in sent[0][1]["changed"]} == {"b", "c"}
+
+def test_no_alert_when_already_below_or_rising():
+    broadcaster, subscription = subscribe([station("a", 1.65), station("b", 1.60)])
+    publish(broadcaster, [station("a", 1.62), station("b", 1.69)])
+    assert alerts(subscription) == []
+
+def test_alert_at_exactly_the_target():
+    broadcaster, subscription = subscribe([station("a", 1.75)])
+    publish(broadcaster, [station("a", 1.70)])
+    assert alerts(subscription) == ["a"]
+
+def test_no_alert_without_target():
+    broadcaster, subscription = subscribe([station("a", 1.75)], target_price=None)
+    publish(broadcaster, [station("a", 1.50)])
+    assert alerts(subscription) == []
@@ -0,0 +1,83 @@
+"""Bulk import: derived values and statistics must match a full rebuild, also after a failed import"""
+import io
+
+import pytest
+
+from backend import fuel_io, fuel_stats, models
+
+from test_consumption import assert_matches_rebuild, derived, statistics
+
+CSV = """date;station_name;fuel_type;liters;price_per_liter;odometer
+01.03.2026;Aral;diesel;40,0;1,70;10000
+05.03.2026;Shell;diesel;30,0;1,72;10500
+09.03.2026;Jet;e5;35,0;1,80;11000
+not a date;Esso;diesel;20;1.7;
+12.03.2026;Esso;diesel;-1;1.7;
+15.03.2026;Total;diesel;25,0;1,69;11400
+20.03.2026;Aral;diesel;33,0;1,75;11900
+"""
+
+def upload(text: str) -> io.BytesIO:
+    return io.BytesIO(text.encode())
+
+def user_id(db) -> int:
+    return db.query(models.User.id).scalar()
+
+def test_import_derives_consumption_and_statistics(db):
+    version = fuel_stats.log_version(db, user_id(db))
+    result = fuel_io.import_logs(db, user_id(db), upload(CSV), batch_size=2)
+
+    assert (result["imported"], result["skipped"]) == (5, 2)
+    assert [error["line"] for error in result["errors"]] == [5, 6]
+    assert result["consumption_updated"] == 4  # every log after the first has a baseline
+    assert fuel_stats.log_version(db, user_id(db)) > version
+    assert statistics(db)["total_liters"] == pytest.approx(163.0)
+    assert sorted(km for km, _ in derived(db).values() if km) == [400, 500, 500, 500]
+    assert_matches_rebuild(db)
+
+def test_ndjson_import(db):
+    rows = ('{"date": "2026-03-01T08:00:00", "liters": 40, "price_per_liter": 1.7, "odometer": 10000}\n'
+            '[1, 2]\n'
+            '{"date": "2026-03-05", "liters": 30, "price_per_liter": 1.7, "odometer": 10600}\n')
+    result = fuel_io.import_logs(db, user_id(db), upload(rows), fmt="ndjson")
+    assert (result["imported"], result["skipped"]) == (2, 1)
+    assert 600 in {km for km, _ in derived(db).values()}
+    assert_matches_rebuild(db)
+
+def test_failure_partway_keeps_committed_batches_consistent(db, monkeypatch):
+    validate_row = fuel_io.validate_row
+    calls = []
+
+    def failing(raw, uid):
+        calls.append(raw)
+        if len(calls) == 5:
+            raise RuntimeError("upload connection lost")
+        return validate_row(raw, uid)
+    monkeypatch.setattr(fuel_io, "validate_row", failing)
+
+    version = fuel_stats.log_version(db, user_id(db))
+    with pytest.raises(RuntimeError):
+        fuel_io.import_logs(db, user_id(db), upload(CSV), batch_size=2)
+
+    # Two full batches were committed; the third (one row) was pending and is gone
+    db.expire_all()
+    assert db.query(models.FuelLog).count() == 2
+    assert fuel_stats.log_version(db, user_id(db)) > version
+    assert statistics(db)["total_liters"] == pytest.approx(70.0)
+    assert sorted(km for km, _ in derived(db).values() if km) == [500]
+    assert_matches_rebuild(db)
+
+def test_failure_before_first_batch_changes_nothing(db, monkeypatch):
+    def failing(raw, uid):
+        raise RuntimeError("upload connection lost")
+    monkeypatch.setattr(fuel_io, "validate_row", failing)
+
+    version = fuel_stats.log_version(db, user_id(db))
+    with pytest.raises(RuntimeError):
+        fuel_io.import_logs(db, user_id(db), upload(CSV))
+    assert db.query(models.FuelLog).count() == 0
+    assert fuel_stats.log_version(db, user_id(db)) == version
+
+def test_unknown_format(db):
+    with pytest.raises(ValueError):
+        fuel_io.import_logs(db, user_id(db), upload(CSV), fmt="xlsx")
@@ -0,0 +1,73 @@
+"""Keyset pagination of /fuel-logs: the pages joined must equal the full history, newest first"""
+import math
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import models
+from backend.database import SessionLocal
+from backend.main import encode_log_cursor
+
+START = datetime(2026, 3, 1, 12, 0)
+
+def add_logs(client, headers, days):
+    for day in days:
+        response = client.post("/fuel-logs", params={
+            "station_name": "Test", "liters": 30, "price_per_liter": 1.7,
+            "date": (START + timedelta(days=day)).isoformat()}, headers=headers)
+        assert response.status_code == 200, response.text
+
+def expected_ids(username: str) -> list:
+    """Recompute the order from the database: (date, id) descending"""
+    with SessionLocal() as db:
+        rows = db.query(models.FuelLog.id, models.FuelLog.date).join(models.User).filter(
+            models.User.username == username).all()
+    return [log_id for log_id, _ in sorted(rows, key=lambda row: (row.date, row.id), reverse=True)]
+
+def pages(client, headers, limit: int) -> list:
+    result, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/fuel-logs", params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        assert len(response.json()) <= limit
+        result.append([log["id"] for log in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return result
+
+@pytest.mark.parametrize("limit", [1, 3, 4, 11, 50])
+def test_pages_cover_history_once_in_order(client, new_user, limit):
+    username, headers = new_user
+    # Same-day logs tie on date and are ordered by id; back-dated ones arrive out of order
+    days = [3, 0, 5, 5, 5, 1, 8, 3, 2, 9, 0]
+    add_logs(client, headers, days)
+
+    result = pages(client, headers, limit)
+    assert [log_id for page in result for log_id in page] == expected_ids(username)
+    assert len(result) == math.ceil(len(days) / limit)  # no empty last page
+
+def test_new_logs_do_not_shift_later_pages(client, new_user):
+    """Unlike offsets, a cursor is a position: logs added meanwhile never repeat or skip rows"""
+    username, headers = new_user
+    add_logs(client, headers, range(6))
+    before = expected_ids(username)
+
+    first = client.get("/fuel-logs", params={"limit": 2}, headers=headers)
+    add_logs(client, headers, [10, 11])
+    rest = client.get("/fuel-logs", params={"limit": 50, "cursor": first.headers["X-Next-Cursor"]},
+                      headers=headers)
+    assert [log["id"] for log in first.json() + rest.json()] == before
+
+def test_cursor_between_logs(client, new_user):
+    username, headers = new_user
+    add_logs(client, headers, range(4))
+    ids = expected_ids(username)
+    # A cursor on a date no log has starts right after that position
+    cursor = encode_log_cursor(START + timedelta(days=1, hours=6), 0)
+    response = client.get("/fuel-logs", params={"cursor": cursor}, headers=headers)
+    assert [log["id"] for log in response.json()] == ids[-2:]
+
+def test_invalid_cursor(client, new_user):
+    _, headers = new_user
+    assert client.get("/fuel-logs", params={"cursor": "not-a-cursor"}, headers=headers).status_code == 400
@@ -0,0 +1,100 @@
+"""Incrementally maintained statistics rollups must match a rebuild and a recompute from the logs"""
+from datetime import datetime
+
+import pytest
+
+from backend import fuel_stats, models
+
+from test_consumption import add, delete, statistics, update
+
+def rollups(db) -> dict:
+    """Counters of every non-empty FuelStats row, keyed by (fuel type, period)
+
+    Emptied rows may stay behind incrementally, a rebuild drops them.
+    """
+    return {
+        (row.fuel_type, row.period): {counter: getattr(row, counter) for counter in fuel_stats._COUNTERS}
+        for row in db.query(models.FuelStats) if row.log_count
+    }
+
+def assert_rollups_match_rebuild(db):
+    incremental = rollups(db)
+    fuel_stats.rebuild(db, db.query(models.User.id).scalar())
+    rebuilt = rollups(db)
+    assert incremental.keys() == rebuilt.keys()
+    for key, counters in rebuilt.items():
+        assert incremental[key] == pytest.approx(counters), key
+
+def recompute(db, fuel_type=None, period=None) -> dict:
+    """Totals straight from the fuel logs, independent of the rollups"""
+    logs = [log for log in db.query(models.FuelLog)
+            if fuel_type in (None, log.fuel_type) and (period is None or log.date.isoformat().startswith(period))]
+    return {
+        "total_logs": len(logs),
+        "total_liters": round(sum(log.liters for log in logs), 2),
+        "total_cost": round(sum(log.total_price for log in logs), 2),
+        "average_price_per_liter": round(sum(log.price_per_liter for log in logs) / len(logs), 3),
+    }
+
+def summary(entry: dict) -> dict:
+    return {key: entry[key] for key in ("total_logs", "total_liters", "total_cost", "average_price_per_liter")}
+
+def history(db):
+    add(db, 1, odometer=10000)
+    add(db, 5, liters=30, odometer=10500, fuel_type="e10")
+    add(db, 9, liters=35, odometer=11000)
+    add(db, 20, liters=45, fuel_type="e5")
+
+def test_empty_history(db):
+    assert statistics(db) == {"total_logs": 0}
+
+def test_statistics_match_logs(db):
+    history(db)
+    last_year = add(db, 1, liters=50, odometer=9000)
+    update(db, last_year, date=datetime(2025, 12, 30, 12, 0))
+
+    stats = statistics(db)
+    assert summary(stats) == recompute(db)
+    assert {fuel: summary(entry) for fuel, entry in stats["by_fuel_type"].items()} == {
+        fuel: recompute(db, fuel_type=fuel) for fuel in ("diesel", "e10", "e5")}
+    assert [entry["period"] for entry in stats["yearly"]] == ["2026", "2025"]
+    assert [entry["period"] for entry in stats["monthly"]] == ["2026-03", "2025-12"]
+    for entry in stats["yearly"] + stats["monthly"]:
+        assert summary(entry) == recompute(db, period=entry["period"])
+    assert_rollups_match_rebuild(db)
+
+def test_edits_move_values_between_rollups(db):
+    history(db)
+    logs = db.query(models.FuelLog).order_by(models.FuelLog.date).all()
+    update(db, logs[1], fuel_type="diesel", liters=32)
+    update(db, logs[3], date=datetime(2026, 4, 2, 12, 0), price_per_liter=1.8)
+    assert_rollups_match_rebuild(db)
+
+    delete(db, logs[2])
+    assert_rollups_match_rebuild(db)
+    assert summary(statistics(db)) == recompute(db)
+
+def test_deleting_everything_leaves_empty_rollups(db):
+    history(db)
+    for log in db.query(models.FuelLog).all():
+        delete(db, log)
+    assert statistics(db) == {"total_logs": 0}
+    assert_rollups_match_rebuild(db)
+
+def test_every_change_bumps_log_version(db):
+    user_id = db.query(models.User.id).scalar()
+    versions = [fuel_stats.log_version(db, user_id)]
+    log = add(db, 1, odometer=10000)
+    versions.append(fuel_stats.log_version(db, user_id))
+    update(db, log, liters=41)
+    versions.append(fuel_stats.log_version(db, user_id))
+    delete(db, log)
+    versions.append(fuel_stats.log_version(db, user_id))
+    assert versions == sorted(set(versions))
+
+def test_missing_rollups_are_backfilled(db):
+    history(db)
+    expected = statistics(db)
+    db.query(models.FuelStats).delete()
+    db.commit()
+    assert statistics(db) == expected
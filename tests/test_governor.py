@@ -0,0 +1,166 @@
+"""Upstream governor: token bucket, circuit breaker transitions and which answers count as failures"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from backend import governor as governor_module
+from backend.governor import CircuitBreaker, CircuitOpen, Throttled, TokenBucket, UpstreamGovernor
+from backend.upstream import TankerkoenigClient, UpstreamError, UpstreamUnavailable
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable ``time.monotonic`` of the governor module"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(governor_module, "time", SimpleNamespace(monotonic=lambda: now.value, time=time.time))
+    return now
+
+# --- TokenBucket ---
+
+def test_bucket_grants_burst_then_throttles(clock):
+    bucket = TokenBucket(rate=1.0, burst=2)
+    asyncio.run(bucket.acquire(0))
+    asyncio.run(bucket.acquire(0))
+    with pytest.raises(Throttled) as exc:
+        asyncio.run(bucket.acquire(0.5))
+    assert exc.value.retry_after == pytest.approx(1.0)
+    assert (bucket.granted, bucket.throttled) == (2, 1)
+
+    clock.value += 1.0
+    asyncio.run(bucket.acquire(0))
+    assert bucket.granted == 3
+
+def test_bucket_refill_is_capped_at_burst(clock):
+    bucket = TokenBucket(rate=1.0, burst=2)
+    clock.value += 3600
+    assert bucket.tokens == 2
+
+def test_bucket_waiters_reserve_their_token(clock, monkeypatch):
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+    monkeypatch.setattr(governor_module.asyncio, "sleep", sleep)
+
+    bucket = TokenBucket(rate=2.0, burst=1)
+    for _ in range(3):
+        asyncio.run(bucket.acquire(5))
+    # Second caller waits half a second, the third a full second behind the first
+    assert slept == [pytest.approx(0.5), pytest.approx(1.0)]
+    assert (bucket.granted, bucket.delayed) == (3, 2)
+
+def test_bucket_without_rate_never_throttles(clock):
+    bucket = TokenBucket(rate=0, burst=0)
+    for _ in range(100):
+        asyncio.run(bucket.acquire(0))
+    assert bucket.throttled == 0
+
+# --- CircuitBreaker ---
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=10, max_cooldown=40)
+    for _ in range(2):
+        breaker.allow()
+        breaker.failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.allow()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert 5 <= breaker.open_until - clock.value <= 10
+
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    assert breaker.rejected == 1
+
+def test_success_resets_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=10, max_cooldown=40)
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_half_open_lets_one_probe_through_and_closes_on_success(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10, max_cooldown=40)
+    breaker.allow()
+    breaker.failure()
+    clock.value = breaker.open_until
+
+    breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.allow()  # probe in flight
+    breaker.success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.allow()
+
+def test_failed_probe_reopens_for_longer(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10, max_cooldown=40)
+    breaker.allow()
+    breaker.failure()
+    clock.value = breaker.open_until
+
+    breaker.allow()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert 10 <= breaker.open_until - clock.value <= 20
+    assert breaker.trips == 2
+
+def test_released_probe_frees_the_slot(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10, max_cooldown=40)
+    breaker.allow()
+    breaker.failure()
+    clock.value = breaker.open_until
+    breaker.allow()
+    breaker.release()
+    breaker.allow()
+
+# --- Which upstream answers trip the breaker ---
+
+def client_answering(*responses) -> TankerkoenigClient:
+    """Client whose governor trips on the first failure and never throttles"""
+    answers = iter(responses)
+
+    def handler(request):
+        answer = next(answers)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    client = TankerkoenigClient(
+        "https://tk.test", UpstreamGovernor(TokenBucket(0, 0), CircuitBreaker(1, cooldown=10, max_cooldown=40)))
+    client._client = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+    return client
+
+def list_stations(client: TankerkoenigClient):
+    return asyncio.run(client.list_stations(52.5, 13.4, 5, "key"))
+
+def test_api_error_does_not_trip_breaker(clock):
+    client = client_answering(
+        httpx.Response(200, json={"ok": False, "message": "apikey nicht gefunden"}),
+        httpx.Response(200, json={"ok": True, "stations": [{"id": "a"}]}),
+    )
+    with pytest.raises(UpstreamError, match="apikey") as exc:
+        list_stations(client)
+    assert not isinstance(exc.value, UpstreamUnavailable)
+    assert client.governor.breaker.state == CircuitBreaker.CLOSED
+    assert client.governor.failures == 0
+    assert list_stations(client) == [{"id": "a"}]
+
+@pytest.mark.parametrize("answer", [
+    httpx.Response(503),
+    httpx.Response(429),
+    httpx.Response(200, text="<html>"),
+    httpx.ReadTimeout("slow"),
+    httpx.ConnectError("refused"),
+], ids=["5xx", "429", "invalid_json", "timeout", "transport"])
+def test_upstream_failures_trip_breaker(clock, answer):
+    client = client_answering(answer)
+    with pytest.raises(UpstreamError) as exc:
+        list_stations(client)
+    assert not isinstance(exc.value, UpstreamUnavailable)
+    assert client.governor.breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(UpstreamUnavailable):
+        list_stations(client)  # not sent: the handler has no answer left
@@ -0,0 +1,89 @@
+"""Conditional GET: ETags follow the data version, a match gets a bodiless 304"""
+from datetime import datetime, timedelta
+
+from backend import fuel_stats, models
+from backend.database import SessionLocal
+from backend.http_cache import make_etag, weak
+
+IDENTITY = {"Accept-Encoding": "identity"}
+
+def add_logs(client, headers, count: int):
+    for day in range(count):
+        response = client.post("/fuel-logs", params={
+            "station_name": "Tankstelle mit einem recht langen Namen", "liters": 30 + day, "price_per_liter": 1.7,
+            "odometer": 10000 + 500 * day, "date": (datetime(2026, 3, 1) + timedelta(days=day)).isoformat()},
+            headers=headers)
+        assert response.status_code == 200, response.text
+
+def recompute(username: str):
+    """The statistics ETag and body, straight from the database"""
+    with SessionLocal() as db:
+        user_id = db.query(models.User.id).filter(models.User.username == username).scalar()
+        body = fuel_stats.get_statistics(db, user_id)  # may backfill the rollups, which bumps the version
+        return make_etag("fuel-stats", user_id, fuel_stats.log_version(db, user_id)), body
+
+def get(client, url: str, headers: dict, etag=None):
+    return client.get(url, headers={**headers, **IDENTITY, **({"If-None-Match": etag} if etag else {})})
+
+def test_statistics_etag_follows_the_log_version(client, new_user):
+    username, headers = new_user
+    add_logs(client, headers, 3)
+
+    response = get(client, "/fuel-logs/statistics", headers)
+    etag, body = recompute(username)
+    assert response.headers["ETag"] == etag
+    assert response.json() == body
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    cached = get(client, "/fuel-logs/statistics", headers, etag)
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+
+    add_logs(client, headers, 4)
+    changed = get(client, "/fuel-logs/statistics", headers, etag)
+    assert changed.status_code == 200
+    assert (changed.headers["ETag"], changed.json()) == recompute(username)
+    assert changed.headers["ETag"] != etag
+
+def test_fuel_log_pages_have_their_own_etags(client, new_user):
+    _, headers = new_user
+    add_logs(client, headers, 5)
+    first = get(client, "/fuel-logs?limit=2", headers)
+    second = get(client, f"/fuel-logs?limit=2&cursor={first.headers['X-Next-Cursor']}", headers)
+    assert first.headers["ETag"] != second.headers["ETag"]
+
+    assert get(client, "/fuel-logs?limit=2", headers, first.headers["ETag"]).status_code == 304
+    assert get(client, "/fuel-logs?limit=3", headers, first.headers["ETag"]).status_code == 200
+    # Settings are not part of the version; a new log is
+    client.put("/me/settings", params={"radius": 6}, headers=headers)
+    assert get(client, "/fuel-logs?limit=2", headers, first.headers["ETag"]).status_code == 304
+    add_logs(client, headers, 1)
+    assert get(client, "/fuel-logs?limit=2", headers, first.headers["ETag"]).status_code == 200
+
+def test_compressed_responses_get_the_weak_etag(client, new_user):
+    _, headers = new_user
+    add_logs(client, headers, 12)  # a page well above COMPRESS_MIN_BYTES
+    plain = get(client, "/fuel-logs", headers)
+    etag = plain.headers["ETag"]
+    assert not etag.startswith("W/")
+
+    gzip = {"Accept-Encoding": "gzip"}
+    response = client.get("/fuel-logs", headers={**headers, **gzip})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] == weak(etag)
+    assert response.json() == plain.json()
+
+    # Either form revalidates, whatever encoding the client asks for now
+    for tag in (weak(etag), etag):
+        assert get(client, "/fuel-logs", headers, tag).status_code == 304
+        cached = client.get("/fuel-logs", headers={**headers, **gzip, "If-None-Match": tag})
+        assert cached.status_code == 304
+        assert cached.headers["ETag"] == weak(etag)
+
+def test_if_none_match_lists_and_wildcard(client, new_user):
+    username, headers = new_user
+    etag, _ = recompute(username)
+    assert get(client, "/fuel-logs/statistics", headers, f'"other", {etag}').status_code == 304
+    assert get(client, "/fuel-logs/statistics", headers, "*").status_code == 304
+    assert get(client, "/fuel-logs/statistics", headers, '"other"').status_code == 200
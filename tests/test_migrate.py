@@ -0,0 +1,39 @@
+"""Migrations on a fresh SQLite database and the plan check of the hot queries"""
+import pytest
+from sqlalchemy import text
+
+from backend import database, migrate
+
+@pytest.fixture
+def cli_engine(engine, monkeypatch):
+    """Point the CLI (``from .database import engine``) at the test database"""
+    monkeypatch.setattr(database, "engine", engine)
+    return engine
+
+def test_upgrade_reaches_head_and_is_idempotent(engine):
+    assert migrate.upgrade(engine) == [version for version, _, _ in migrate.MIGRATIONS]
+    assert migrate.current_version(engine) == migrate.HEAD
+    assert migrate.upgrade(engine) == []
+    migrate.ensure_current(engine)
+
+def test_hot_queries_use_indexes(engine):
+    migrate.upgrade(engine)
+    assert migrate.check_plans(engine) == []
+
+def test_missing_index_is_reported(engine):
+    migrate.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_fuel_logs_user_date_id"))
+        conn.execute(text("DROP INDEX ix_fuel_logs_user_odometer"))
+    assert "fuel logs first page" in migrate.check_plans(engine)
+
+def test_ensure_current_refuses_unmigrated_schema(engine):
+    with pytest.raises(RuntimeError):
+        migrate.ensure_current(engine)
+
+def test_cli_exit_codes(cli_engine):
+    assert migrate.main(["current"]) == 1
+    assert migrate.main(["check"]) == 1
+    assert migrate.main(["upgrade"]) == 0
+    assert migrate.main(["current"]) == 0
+    assert migrate.main(["check"]) == 0
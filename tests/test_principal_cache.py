@@ -0,0 +1,141 @@
+"""Per-username principal cache: hits, invalidation, TTL expiry and the shorter admin TTL"""
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
+
+from backend import models
+from backend import principal_cache as principal_cache_module
+from backend.principal_cache import PrincipalCache, principal_cache
+
+from conftest import login
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable ``time.monotonic`` of the cache module"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(principal_cache_module, "time", SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+def load(db, username: str) -> models.User:
+    return db.query(models.User).options(joinedload(models.User.settings)).filter(
+        models.User.username == username).one()
+
+@pytest.fixture
+def driver(db) -> models.User:
+    user = db.query(models.User).filter(models.User.username == "driver").one()
+    db.add(models.UserSettings(user_id=user.id, radius=7.0))
+    db.commit()
+    return load(db, "driver")
+
+def count_queries(engine):
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    return queries
+
+# --- PrincipalCache ---
+
+def test_hit_returns_detached_copy_without_sql(engine, db, driver, clock):
+    cache = PrincipalCache(ttl=60, admin_ttl=10)
+    cache.put(driver, cache.version("driver"))
+    queries = count_queries(engine)
+
+    cached = cache.get("driver")
+    assert cached is not driver
+    assert (cached.username, cached.settings.radius) == ("driver", 7.0)
+    assert queries == []
+    assert cached not in db
+    assert cache.stats()["hits"] == 1
+
+def test_invalidate_drops_entry_and_rejects_older_loads(db, driver, clock):
+    cache = PrincipalCache(ttl=60, admin_ttl=10)
+    version = cache.version("driver")
+    cache.put(driver, version)
+    cache.invalidate("driver")
+    assert cache.get("driver") is None
+
+    # A load that started before the invalidation must not be stored
+    cache.put(driver, version)
+    assert cache.get("driver") is None
+    cache.put(driver, cache.version("driver"))
+    assert cache.get("driver") is not None
+
+def test_ttl_expiry(db, driver, clock):
+    cache = PrincipalCache(ttl=60, admin_ttl=10)
+    cache.put(driver, cache.version("driver"))
+    clock.value += 59
+    assert cache.get("driver") is not None
+    clock.value += 2
+    assert cache.get("driver") is None
+    assert cache.stats()["entries"] == 0
+
+def test_admins_expire_after_admin_ttl(db, driver, clock):
+    cache = PrincipalCache(ttl=60, admin_ttl=10)
+    driver.is_admin = True
+    db.commit()
+    cache.put(load(db, "driver"), cache.version("driver"))
+    clock.value += 9
+    assert cache.get("driver") is not None
+    clock.value += 2
+    assert cache.get("driver") is None
+
+def test_admin_ttl_never_exceeds_ttl():
+    assert PrincipalCache(ttl=5, admin_ttl=10).admin_ttl == 5
+
+def test_disabled_cache_stores_nothing(db, driver):
+    cache = PrincipalCache(ttl=0)
+    cache.put(driver, cache.version("driver"))
+    assert cache.get("driver") is None
+
+# --- Endpoints with a warm cache ---
+
+def test_admin_users_after_cache_hit(client, admin_headers):
+    """Regression: a cached admin merged into the session made /admin/users recurse through user.settings"""
+    assert client.get("/me", headers=admin_headers).status_code == 200
+    assert principal_cache.get("admin") is not None
+
+    response = client.get("/admin/users", headers=admin_headers)
+    assert response.status_code == 200, response.text
+    users = response.json()
+    assert {"username": "admin", "is_admin": True} in users
+    assert all(set(user) == {"username", "is_admin"} for user in users)
+
+def test_update_settings_is_not_served_stale(client, new_user):
+    username, headers = new_user
+    assert client.get("/me", headers=headers).json()["settings"]["radius"] == 5.0
+    assert principal_cache.get(username) is not None
+
+    assert client.put("/me/settings", params={"radius": 12, "target_price": 1.65}, headers=headers).status_code == 200
+    assert principal_cache.get(username) is None
+    settings = client.get("/me", headers=headers).json()["settings"]
+    assert (settings["radius"], settings["target_price"]) == (12.0, 1.65)
+
+def test_toggle_heatmap_is_not_served_stale(client, new_user):
+    username, headers = new_user
+    client.get("/me", headers=headers)
+    assert client.put("/me/settings/heatmap", params={"show_heatmap": True}, headers=headers).status_code == 200
+    assert principal_cache.get(username) is None
+    client.get("/me", headers=headers)
+    assert principal_cache.get(username).settings.show_heatmap is True
+
+def test_change_password_is_not_served_stale(client, new_user):
+    username, headers = new_user
+    client.get("/me", headers=headers)
+    assert client.put("/me/password", params={"new_password": "secret2"}, headers=headers).status_code == 200
+    assert principal_cache.get(username) is None
+
+    assert client.post("/token", data={"username": username, "password": "secret1"}).status_code == 401
+    login(client, username, "secret2")
+    assert client.get("/me", headers=headers).status_code == 200  # the token itself stays valid
+
+def test_reset_password_invalidates(client, admin_headers, new_user):
+    username, headers = new_user
+    client.get("/me", headers=headers)
+    assert principal_cache.get(username) is not None
+
+    response = client.put(f"/admin/users/{username}/reset-password", params={"new_password": "secret3"},
+                          headers=admin_headers)
+    assert response.status_code == 200
+    assert principal_cache.get(username) is None
+    login(client, username, "secret3")